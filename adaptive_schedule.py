@@ -0,0 +1,273 @@
+"""
+自适应调度
+==========
+固定间隔对每天才变化一次的页面和正在出错的页面一视同仁。自适应调度为每个URL维护自己的间隔：
+- 第一次成功的检查只建立基准（没有可比较的上次内容），保持初始间隔
+- 内容没有变化：间隔逐步放大（backoff），最多到max_interval
+- 内容开始变化：间隔缩小（tighten）；发现告警时直接缩到min_interval
+- 学习每个URL的平均变化间隔（指数滑动平均），放大时不超过它的一半
+- 服务器给出 Retry-After 时不早于该时间；Cache-Control: max-age / Expires 作为下限（告警时除外）
+- 支持按URL覆盖 interval / min_interval / max_interval
+
+到期时间放在一个按下一次检查时间排序的堆（heapq）里，由单个调度协程分发。
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from async_scheduler import AsyncMonitorScheduler
+
+logger = logging.getLogger(__name__)
+
+Observation = namedtuple('Observation', [
+    'changed',          # 内容与上次相比是否变化
+    'alert',            # 是否发现告警
+    'error',            # 获取或分析是否出错
+    'retry_after',      # 服务器要求的最短重试时间（秒），没有则为None
+    'max_age',          # 缓存头给出的内容有效期（秒），没有则为None
+])
+
+def _parse_seconds_or_date(value, now=None):
+    value = (value or '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (now or time.time()))
+
+
+def header_hints(headers):
+    """从响应头中解析 (retry_after, max_age)，单位为秒"""
+    retry_after = _parse_seconds_or_date(headers.get('Retry-After'))
+    max_age = None
+    cache_control = headers.get('Cache-Control') or ''
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        name = name.lower()
+        if name in ('no-cache', 'no-store'):
+            max_age = 0.0
+            break
+        if name in ('s-maxage', 'max-age') and value.strip('"').isdigit():
+            max_age = float(value.strip('"'))
+            if name == 's-maxage':
+                break
+    if max_age is None and headers.get('Expires'):
+        max_age = _parse_seconds_or_date(headers.get('Expires'))
+    return retry_after, max_age
+
+
+class IntervalPolicy:
+    """间隔调整参数"""
+
+    def __init__(self, interval=60, min_interval=15, max_interval=1800, backoff=1.5, tighten=0.5,
+                 smoothing=0.3):
+        if not 0 < min_interval <= interval <= max_interval:
+            raise ValueError(f"需要 0 < min_interval({min_interval}) <= interval({interval}) <= max_interval({max_interval})")
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.tighten = tighten
+        self.smoothing = smoothing
+
+    def derive(self, **overrides):
+        """按URL覆盖部分参数"""
+        options = dict(self.__dict__)
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        # 只覆盖了interval时，上下限随之放宽
+        options['min_interval'] = min(options['min_interval'], options['interval'])
+        options['max_interval'] = max(options['max_interval'], options['interval'])
+        return IntervalPolicy(**options)
+
+
+class UrlState:
+    """单个URL的调度状态"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.interval = policy.interval
+        self.last_change = None
+        self.change_interval = None  # 平均变化间隔（秒）
+        self.errors = 0
+        self.checks = 0
+        self.changes = 0
+        self.alert = False
+        self.baselined = False
+
+    def update(self, observation, now=None):
+        """根据本次检查的结果计算下一次检查前的等待时间"""
+        now = time.monotonic() if now is None else now
+        policy = self.policy
+        self.checks += 1
+
+        if observation.error:
+            # 出错时先快速复查，连续出错则指数退避，不超过基础间隔
+            self.errors += 1
+            self.interval = min(policy.interval, policy.min_interval * 2 ** (self.errors - 1))
+        else:
+            self.errors = 0
+            self.alert = observation.alert
+            # 第一次成功的检查总是“重新分析过”，但没有上次的内容可比，不算变化
+            baseline = not self.baselined
+            self.baselined = True
+            changed = observation.changed and not baseline
+            if changed:
+                self.changes += 1
+                if self.last_change is not None:
+                    elapsed = now - self.last_change
+                    if self.change_interval is None:
+                        self.change_interval = elapsed
+                    else:
+                        self.change_interval += policy.smoothing * (elapsed - self.change_interval)
+                self.last_change = now
+            if observation.alert:
+                self.interval = policy.min_interval
+            elif changed:
+                self.interval = self.interval * policy.tighten
+                if self.change_interval is not None:
+                    self.interval = min(self.interval, self.change_interval / 2)
+            elif not baseline:
+                cap = policy.max_interval
+                if self.change_interval is not None:
+                    # 距离上次变化已经很久时，平均变化间隔的估计也随之变长
+                    since_change = now - self.last_change
+                    cap = min(cap, max(self.change_interval, since_change) / 2)
+                self.interval = min(self.interval * policy.backoff, max(cap, self.interval))
+            self.interval = max(policy.min_interval, min(policy.max_interval, self.interval))
+
+        delay = self.interval
+        if observation.max_age is not None and not observation.alert and not observation.error:
+            delay = max(delay, min(observation.max_age, policy.max_interval))
+        if observation.retry_after is not None:
+            delay = max(delay, observation.retry_after)
+        return delay
+
+
+class AdaptiveScheduler(AsyncMonitorScheduler):
+    """按URL自适应间隔的并发调度器
+
+    observe_func(url, result) 返回本次检查的 Observation；返回None时视为内容未变化。
+    """
+
+    def __init__(self, check_func, observe_func, policy=None, overrides=None, max_concurrency=20,
+                 per_host_limit=2, jitter=0.1, executor=None):
+        self.policy = policy or IntervalPolicy()
+        super().__init__(check_func, interval=self.policy.interval, max_concurrency=max_concurrency,
+                         per_host_limit=per_host_limit, jitter=jitter, executor=executor)
+        self.observe_func = observe_func
+        self.overrides = overrides or {}
+        self.states = {}
+        self._heap = []
+        self._seq = 0
+        self._wakeup = None
+
+    def state_for(self, url):
+        state = self.states.get(url)
+        if state is None:
+            override = self.overrides.get(url)
+            policy = self.policy.derive(**override) if override else self.policy
+            state = self.states[url] = UrlState(policy)
+        return state
+
+    def _push(self, url, due):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, url))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _jittered(self, delay):
+        if not self.jitter:
+            return delay
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _check_and_reschedule(self, url):
+        result = await self._run_check(url)
+        state = self.state_for(url)
+        try:
+            observation = self.observe_func(url, result)
+        except Exception as e:
+            logger.warning("获取检查结果状态失败 %s: %s", url, e)
+            observation = None
+        if observation is None:
+            observation = Observation(False, False, result is None, None, None)
+        delay = state.update(observation)
+        logger.debug("%s 下一次检查在%.0f秒后（变化=%s 告警=%s 出错=%s）",
+                     url, delay, observation.changed, observation.alert, observation.error)
+        if not self._stop_event.is_set():
+            self._push(url, time.monotonic() + self._jittered(delay))
+
+    async def run(self, urls, run_immediately=True, duration=None):
+        """开始调度，duration为None时一直运行直到stop()"""
+        self._global_sem = asyncio.Semaphore(self.max_concurrency)
+        self._host_sems = {}
+        self._running = {}
+        self._stop_event = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._heap = []
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        now = time.monotonic()
+        for url in dict.fromkeys(urls):
+            state = self.state_for(url)
+            self._push(url, now if run_immediately else now + random.uniform(0, state.interval))
+        deadline = None if duration is None else now + duration
+
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                if self._heap and self._heap[0][0] <= now:
+                    _, _, url = heapq.heappop(self._heap)
+                    self._running[url] = asyncio.ensure_future(self._check_and_reschedule(url))
+                    continue
+                timeout = self._heap[0][0] - now if self._heap else None
+                if deadline is not None:
+                    timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stop_event.set()
+            pending = [t for t in self._running.values() if not t.done()]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if self._own_executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        return self.stats
+
+    def stop(self):
+        """停止调度"""
+        super().stop()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def report(self):
+        """每个URL当前的间隔、平均变化间隔和检查次数"""
+        return {
+            url: {
+                'interval': round(state.interval, 1),
+                'change_interval': round(state.change_interval, 1) if state.change_interval else None,
+                'checks': state.checks,
+                'changes': state.changes,
+                'errors': state.errors,
+                'alert': state.alert,
+            }
+            for url, state in self.states.items()
+        }
@@ -1,287 +1,1097 @@
 import configparser
+import hashlib
+import logging
+import threading
 import time
-import schedule
-import requests
-from bs4 import BeautifulSoup
-from PIL import Image
-import io
 import os
-# 导入Pyppeteer
-from pyppeteer import launch
 import asyncio
+from async_scheduler import AsyncMonitorScheduler
+from result_cache import ResultCache
+from fetcher import HttpFetcher
+from html_classify import get_backend
+from analysis_service import AnalysisService
+from prefilter import PreFilter
+from condense import Condenser, TokenCounter
+from metrics import Metrics, setup_logging
+from history import HistoryStore
+from adaptive_schedule import AdaptiveScheduler, IntervalPolicy, Observation, header_hints
+from alerts import JSON_FORMAT_INSTRUCTION, parse_analysis
+from targets import load_targets, target_intervals
+from resilience import ALLOW, PROBE, REJECT, CircuitBreakers, Deadline
+from dom_capture import DomConfig, DomTracker, extract_dom, snapshot_text
+from memory import MB, MemoryGuard
+
+# 浏览器（pyppeteer）、图像处理（PIL/numpy）、模型客户端（openai/httpx）和通知渠道在第一次用到时才导入，
+# 只检查静态页面的短时任务不需要加载它们
+
+logger = logging.getLogger(__name__)
+
+TEXT_SYSTEM_PROMPT = "你是一个专业的系统监控分析助手，善于从文本中识别告警信息。"
+TEXT_INSTRUCTION = """请分析以下网页内容，重点关注是否存在告警、错误等异常信息。
+如果发现异常，请生成详细的告警报告，包括：
+1. 告警级别（严重/警告/信息）
+2. 告警内容
+3. 可能的原因
+4. 建议的处理措施
+
+如果没有发现异常，请说明页面正常。""" + JSON_FORMAT_INSTRUCTION
+
+IMAGE_INSTRUCTION = "请分析以下网页截图，重点关注是否存在告警、错误等异常信息。如果发现异常，请生成详细的告警报告，包括：1. 告警级别（严重/警告/信息）2. 告警内容 3. 可能的原因 4. 建议的处理措施。如果没有发现异常，请说明页面正常。" + JSON_FORMAT_INSTRUCTION
+REGION_NOTE = "（以下图片只包含页面中与上次检查相比发生变化的区域及少量上下文。）"
+DOM_TEXT_NOTE = "（截图只包含页面中的图表、状态指示灯等视觉元素，页面中提取到的文字如下：）\n"
+
+LOCAL_NORMAL_RESULT = """【本地预筛结果】
+页面正常，未发现告警关键词，内容与上次分析相比无明显变化。"""
+
+# analyze_text/analyze_image 出错时返回的结果前缀
+ANALYSIS_ERROR_PREFIXES = ('分析文本时出错', '分析图像时出错')
+
+
+def _config_list(config, section, option):
+    """读取多行配置（每行一项），不存在时返回空列表"""
+    value = config.get(section, option, raw=True, fallback='')
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
 
 class WebMonitorAgent:
-    def __init__(self, config_file='secret.cfg'):
+    def __init__(self, config_file='secret.cfg', targets=None):
+        """targets 为目标文件路径或Target列表，未指定时使用配置文件[targets]节的FILE"""
         self.config = configparser.ConfigParser()
         self.config.read(config_file, encoding='utf-8')
         self.alert_keywords = ['告警', '错误', '严重', '警告', 'error', 'warning', 'critical', 'alert']
+        self.browser_pool = None
+        self._browser_pool_lock = threading.Lock()
+        self._readiness = {}
+        self._dom = {}
+        # 复杂网页提取的DOM快照；截图时提取到的文字暂存在_dom_context中，随截图一起分析
+        self.dom_tracker = DomTracker()
+        self._dom_context = {}
+        self.setup_targets(targets)
+        # 每个URL最近一次检查的响应头提示和结果状态，供自适应调度使用
+        self._header_hints = {}
+        # 每个URL上一次的网页类型（text/image）：只有简单网页才用条件请求，外壳HTML的304说明不了渲染后的内容
+        self._page_kinds = {}
+        self._observations = {}
+        self._check_records = {}
+        self.scheduler = None
+        self._monitor_loop = None
+        self.setup_metrics()
+        self.setup_memory()
         self.setup_clients()
+        self.setup_cache()
+        self.setup_fetcher()
+        self.setup_resilience()
+        self.setup_prefilter()
+        self.setup_condenser()
+        self.setup_visual_diff()
+        self.setup_history()
+        self.setup_notifier()
+    
+    def setup_metrics(self):
+        """设置指标和事件日志，参数来自配置文件的[metrics]节"""
+        get = lambda option: self.config.get('metrics', option, fallback='').strip('"')
+        self.metrics = Metrics(event_log=get('EVENT_LOG') or None)
+        self.metrics_file = get('PROMETHEUS_FILE') or None
+        self.metrics_interval = self.config.getfloat('metrics', 'WRITE_INTERVAL', fallback=15)
+        self._metrics_written = 0.0
+        port = self.config.getint('metrics', 'PORT', fallback=0)
+        if port:
+            self.metrics.serve(port, host=get('HOST') or '0.0.0.0')
+    
+    def setup_memory(self):
+        """设置内存预算，参数来自配置文件的[memory]节（上限为0表示不限制，只采样写入指标）"""
+        get = lambda option, default: self.config.getfloat('memory', option, fallback=default)
+        self.max_screenshot_height = self.config.getint('memory', 'MAX_SCREENSHOT_HEIGHT', fallback=16384)
+        self._memory_stopped = False
+        self.memory_guard = MemoryGuard(
+            max_rss=int(get('MAX_RSS_MB', 0) * MB),
+            browser_max_rss=int(get('BROWSER_MAX_RSS_MB', 0) * MB),
+            check_interval=get('CHECK_INTERVAL', 30),
+            browser_pids=lambda: self.browser_pool.browser_pids() if self.browser_pool is not None else [],
+            recycle_browsers=lambda: self.browser_pool.recycle() if self.browser_pool is not None else None,
+            metrics=self.metrics,
+        )
+    
+    @property
+    def memory_exceeded(self):
+        """回收后进程内存仍超过MAX_RSS_MB，应当退出并由上级重启"""
+        return self.memory_guard.exceeded
+    
+    def check_memory(self):
+        """按间隔采样内存并按需回收；超限时停止正在运行的监控循环"""
+        status = self.memory_guard.check()
+        if status is None or not status.exceeded or self._memory_stopped:
+            return
+        self._memory_stopped = True
+        logger.error("进程内存%.0fMB超过上限，停止监控，等待重启", (status.rss or 0) / MB)
+        if self.scheduler is not None and self._monitor_loop is not None:
+            self._monitor_loop.call_soon_threadsafe(self.scheduler.stop)
+    
+    def setup_targets(self, targets=None):
+        """读取并校验监控目标文件；每个目标的间隔、模式、就绪策略、ROI和关键词覆盖配置文件中的同类设置"""
+        self.targets = {}
+        if targets is None:
+            targets = self.config.get('targets', 'FILE', fallback='').strip('"') or None
+        if targets is None:
+            return
+        if isinstance(targets, str):
+            targets = load_targets(targets)
+        self.targets = {target.url: target for target in targets}
+        logger.info("监控目标: %d个", len(self.targets))
+    
+    def target_urls(self):
+        """目标文件中的URL，按文件中的顺序"""
+        return list(self.targets)
     
     def setup_clients(self):
-        """设置AI模型客户端"""
-        try:
-            print("正在设置AI模型客户端...")
-            print(f"Silicon Flow API Key: {self.config.get('silicon-flow', 'API_KEY')[:10]}...")
-            print(f"Silicon Flow Base URL: {self.config.get('silicon-flow', 'BASE_URL')}")
-            print(f"推理模型: {self.config.get('silicon-flow', 'REASONING_MODEL')}")
-            print(f"视觉模型: {self.config.get('silicon-flow', 'VISUAL_MODEL')}")
-            
-            # 尝试导入OpenAI
+        """读取AI模型参数；客户端在第一次分析时才创建（见get_ai_client）"""
+        # JSON_MODE要求接口只返回JSON（response_format），此时文本页面不再打包
+        self.json_mode = self.config.getboolean('llm', 'JSON_MODE', fallback=False)
+        self.ai_client = None
+        self._ai_client_lock = threading.Lock()
+        self._ai_client_failed = False
+        if not self.config.has_option('silicon-flow', 'API_KEY'):
+            logger.warning("配置文件中没有[silicon-flow]节的API_KEY，将使用模拟分析结果")
+            self._ai_client_failed = True
+            return
+        logger.info("Silicon Flow Base URL: %s", self.config.get('silicon-flow', 'BASE_URL', fallback=''))
+        logger.info("推理模型: %s", self.config.get('silicon-flow', 'REASONING_MODEL', fallback=''))
+        logger.info("视觉模型: %s", self.config.get('silicon-flow', 'VISUAL_MODEL', fallback=''))
+    
+    def get_ai_client(self):
+        """获取（必要时创建）AI分析服务；初始化失败时返回None，使用模拟分析结果"""
+        if self.ai_client is not None or self._ai_client_failed:
+            return self.ai_client
+        with self._ai_client_lock:
+            if self.ai_client is not None or self._ai_client_failed:
+                return self.ai_client
+            # 创建异步分析服务（限流、重试、请求合并、可选的多页面打包）
             try:
-                from openai import OpenAI
-                import httpx
-                
-                # 创建HTTP客户端
-                http_client = httpx.Client(
-                    timeout=30.0,
-                    follow_redirects=True,
-                    verify=False,  # 禁用SSL证书验证
-                )
-                
                 # 处理API密钥和URL
                 api_key = self.config.get('silicon-flow', 'API_KEY').strip('"')
                 base_url = self.config.get('silicon-flow', 'BASE_URL').strip('"')
                 
-                print(f"处理后的API Key: {api_key[:20]}...")
-                print(f"处理后的Base URL: {base_url}")
-                
-                # 设置AI客户端（同时用于文本和图像分析）
-                self.ai_client = OpenAI(
+                # 设置AI客户端（同时用于文本和图像分析），参数来自配置文件的[llm]节
+                ai_client = AnalysisService(
                     api_key=api_key,
                     base_url=base_url,
-                    http_client=http_client
+                    rpm=self.config.getint('llm', 'RPM', fallback=60),
+                    tpm=self.config.getint('llm', 'TPM', fallback=100000),
+                    max_in_flight=self.config.getint('llm', 'MAX_IN_FLIGHT', fallback=8),
+                    max_retries=self.config.getint('llm', 'MAX_RETRIES', fallback=5),
+                    timeout=self.config.getfloat('llm', 'TIMEOUT', fallback=30.0),
+                    verify=False,  # 禁用SSL证书验证
+                    batch_window=self.config.getfloat('llm', 'BATCH_WINDOW', fallback=0.0),
+                    batch_max_items=self.config.getint('llm', 'BATCH_MAX_ITEMS', fallback=4),
+                    batch_max_chars=self.config.getint('llm', 'BATCH_MAX_CHARS', fallback=6000),
+                    metrics=self.metrics,
                 )
-                print("AI客户端设置完成")
+                ai_client.start()
+                self.ai_client = ai_client
+                logger.info("AI客户端设置完成")
             except Exception as e:
-                print(f"初始化OpenAI客户端失败: {e}")
-                print("将使用模拟分析结果")
-                self.ai_client = None
-        except Exception as e:
-            print(f"设置AI模型客户端时出错: {e}")
-            self.ai_client = None
+                logger.error("初始化OpenAI客户端失败: %s，将使用模拟分析结果", e)
+                self._ai_client_failed = True
+        return self.ai_client
+    
+    def setup_cache(self):
+        """设置分析结果缓存，参数来自配置文件的[cache]节"""
+        self.result_cache = None
+        if not self.config.getboolean('cache', 'ENABLED', fallback=True):
+            logger.info("分析结果缓存已禁用")
+            return
+        self.result_cache = ResultCache(
+            max_entries=self.config.getint('cache', 'MAX_ENTRIES', fallback=1024),
+            ttl=self.config.getfloat('cache', 'TTL', fallback=3600),
+            path=self.config.get('cache', 'PATH', fallback='').strip('"') or None,
+            # 每行一条正则，未配置时使用默认规则
+            volatile_patterns=_config_list(self.config, 'cache', 'VOLATILE_PATTERNS') or None,
+            phash_threshold=self.config.getint('cache', 'PHASH_THRESHOLD', fallback=4),
+        )
     
-    def get_webpage(self, url):
-        """获取网页内容，判断是简单网页还是复杂网页"""
+    def setup_fetcher(self):
+        """设置共享连接池的HTTP获取器，参数来自配置文件的[http]节"""
+        self.fetcher = HttpFetcher(
+            timeout=self.config.getfloat('http', 'TIMEOUT', fallback=10),
+            verify=self.config.getboolean('http', 'VERIFY', fallback=False),
+            pool_maxsize=self.config.getint('http', 'POOL_MAXSIZE', fallback=20),
+            # 响应体上限，超出部分丢弃
+            max_bytes=self.config.getint('http', 'MAX_BODY_BYTES', fallback=10 * 1024 * 1024),
+        )
+        # HTML解析后端：auto/selectolax/lxml/stream
+        self.html_backend = get_backend(self.config.get('http', 'PARSER', fallback='auto').strip('"'))
+    
+    def setup_resilience(self):
+        """设置按主机的熔断器和每次检查的截止时间，参数来自配置文件的[resilience]节"""
+        get = lambda option, default: self.config.getfloat('resilience', option, fallback=default)
+        self.check_deadline = get('CHECK_DEADLINE', 120) or None
+        self.min_render_budget = get('MIN_RENDER_BUDGET', 5)
+        self.probe_timeout = get('PROBE_TIMEOUT', 3)
+        self.breakers = self.render_breakers = None
+        if not self.config.getboolean('resilience', 'ENABLED', fallback=True):
+            return
+        options = dict(reset_timeout=get('RESET_TIMEOUT', 30), max_reset_timeout=get('MAX_RESET_TIMEOUT', 600))
+        # 获取失败（超时、连接错误、5xx）和截图失败分别熔断：截图熔断时仍可以做文本分析
+        self.breakers = CircuitBreakers(
+            '获取', failure_threshold=self.config.getint('resilience', 'FAILURE_THRESHOLD', fallback=3), **options)
+        self.render_breakers = CircuitBreakers(
+            '截图', failure_threshold=self.config.getint('resilience', 'RENDER_FAILURE_THRESHOLD', fallback=2),
+            **options)
+    
+    def setup_prefilter(self):
+        """设置本地预筛，参数来自配置文件的[prefilter]节和[prefilter:<URL>]节"""
+        self.prefilter = None
+        if not self.config.getboolean('prefilter', 'ENABLED', fallback=True):
+            return
+        keywords = self.alert_keywords + _config_list(self.config, 'prefilter', 'KEYWORDS')
+        self.prefilter = PreFilter(
+            keywords,
+            regexes=_config_list(self.config, 'prefilter', 'REGEXES'),
+            min_change_ratio=self.config.getfloat('prefilter', 'MIN_CHANGE_RATIO', fallback=0.05),
+            volatile_patterns=self.result_cache.patterns if self.result_cache is not None else None,
+        )
+        # 按URL的规则
+        for section in self.config.sections():
+            if not section.startswith('prefilter:'):
+                continue
+            self.prefilter.set_rule(
+                section[len('prefilter:'):],
+                keywords=_config_list(self.config, section, 'KEYWORDS'),
+                regexes=_config_list(self.config, section, 'REGEXES'),
+                min_change_ratio=self.config.getfloat(section, 'MIN_CHANGE_RATIO', fallback=None),
+            )
+        # 目标文件中的关键词和正则追加在该URL已有的规则上
+        for url, target in self.targets.items():
+            if not (target.keywords or target.regexes):
+                continue
+            section = f'prefilter:{url}'
+            self.prefilter.set_rule(
+                url,
+                keywords=_config_list(self.config, section, 'KEYWORDS') + target.keywords,
+                regexes=_config_list(self.config, section, 'REGEXES') + target.regexes,
+                min_change_ratio=self.config.getfloat(section, 'MIN_CHANGE_RATIO', fallback=None),
+            )
+    
+    def setup_condenser(self):
+        """设置长页面文本压缩，参数来自配置文件的[condense]节；禁用时按原来的方式截取前3000字"""
+        self.condenser = None
+        if not self.config.getboolean('condense', 'ENABLED', fallback=True):
+            return
+        self.condenser = Condenser(
+            token_budget=self.config.getint('condense', 'TOKEN_BUDGET', fallback=1500),
+            keywords=self.alert_keywords + _config_list(self.config, 'prefilter', 'KEYWORDS'),
+            regexes=_config_list(self.config, 'prefilter', 'REGEXES'),
+            boilerplate_checks=self.config.getint('condense', 'BOILERPLATE_CHECKS', fallback=3),
+            context_lines=self.config.getint('condense', 'CONTEXT_LINES', fallback=1),
+            counter=TokenCounter(self.config.get('condense', 'ENCODING', fallback='cl100k_base').strip('"')),
+        )
+    
+    def condense_text(self, text, url=None):
+        """按token预算压缩要发送给模型的页面文本"""
+        if self.condenser is None:
+            return text[:3000]  # 限制文本长度
+        with self.metrics.span('condense', url):
+            condensed = self.condenser.condense(url or '', text)
+        self.metrics.incr('condense_tokens_total', condensed.original_tokens, kind='input')
+        self.metrics.incr('condense_tokens_total', condensed.tokens, kind='output')
+        if condensed.tokens < condensed.original_tokens:
+            logger.debug("文本压缩 %s: %d -> %d tokens，保留%d/%d行（框架%d行，相似行%d行）",
+                         url, condensed.original_tokens, condensed.tokens, condensed.lines,
+                         condensed.total_lines, condensed.boilerplate, condensed.duplicates)
+        return condensed.text
+    
+    def setup_visual_diff(self):
+        """读取截图差异检测参数（[visual_diff]节）；检测器在第一次处理截图时才创建（见get_visual_diff）"""
+        self.visual_diff = None
+        self.visual_diff_max_regions = self.config.getint('visual_diff', 'MAX_REGIONS', fallback=4)
+        self.visual_diff_max_ratio = self.config.getfloat('visual_diff', 'MAX_CHANGED_RATIO', fallback=0.5)
+        self._visual_diff_enabled = self.config.getboolean('visual_diff', 'ENABLED', fallback=True)
+    
+    def get_visual_diff(self):
+        """获取（必要时创建）截图差异检测器，忽略区域在[visual_diff:<URL>]节；不可用时返回None"""
+        if self.visual_diff is not None or not self._visual_diff_enabled:
+            return self.visual_diff
+        self._visual_diff_enabled = False
+        try:
+            from visual_diff import VisualDiff
+            from image_pipeline import parse_roi
+        except ImportError as e:
+            logger.warning("截图差异检测不可用（需要numpy）: %s", e)
+            return None
+        visual_diff = VisualDiff(
+            block_size=self.config.getint('visual_diff', 'BLOCK_SIZE', fallback=16),
+            tolerance=self.config.getfloat('visual_diff', 'TOLERANCE', fallback=2.0),
+            padding=self.config.getint('visual_diff', 'PADDING', fallback=24),
+        )
+        for section in self.config.sections():
+            if section.startswith('visual_diff:'):
+                masks = [parse_roi(line) for line in _config_list(self.config, section, 'MASKS')]
+                visual_diff.set_masks(section[len('visual_diff:'):], masks)
+        self.visual_diff = visual_diff
+        return visual_diff
+    
+    def setup_history(self):
+        """设置检查历史存储，参数来自配置文件的[history]节"""
+        self.history = None
+        if not self.config.getboolean('history', 'ENABLED', fallback=True):
+            return
+        self.history = HistoryStore(
+            self.config.get('history', 'PATH', fallback='check_history.db').strip('"'),
+            batch_size=self.config.getint('history', 'BATCH_SIZE', fallback=200),
+            flush_interval=self.config.getfloat('history', 'FLUSH_INTERVAL', fallback=1.0),
+            retention_days=self.config.getfloat('history', 'RETENTION_DAYS', fallback=30),
+            max_rows_per_url=self.config.getint('history', 'MAX_ROWS_PER_URL', fallback=10000),
+        ).start()
+    
+    def setup_notifier(self):
+        """设置告警通知，参数来自配置文件的[notify]节；未配置SINKS时不发送通知"""
+        self.notifier = None
+        get = lambda option, fallback='': self.config.get('notify', option, fallback=fallback).strip().strip('"')
+        names = [name.strip() for name in get('SINKS').split(',') if name.strip()]
+        if not names:
+            return
+        from notifier import FileSink, MemorySink, SmtpSink, WebhookSink
+        sinks = []
+        for name in names:
+            if name == 'file':
+                sinks.append(FileSink(get('FILE_PATH', 'alerts.jsonl')))
+            elif name == 'webhook':
+                sinks.append(WebhookSink(get('WEBHOOK_URL'),
+                                         timeout=self.config.getfloat('notify', 'WEBHOOK_TIMEOUT', fallback=10)))
+            elif name == 'smtp':
+                sinks.append(SmtpSink(
+                    get('SMTP_HOST'),
+                    self.config.getint('notify', 'SMTP_PORT', fallback=587),
+                    get('SMTP_SENDER'),
+                    _config_list(self.config, 'notify', 'SMTP_RECIPIENTS'),
+                    username=get('SMTP_USERNAME') or None,
+                    password=get('SMTP_PASSWORD') or None,
+                    use_tls=self.config.getboolean('notify', 'SMTP_TLS', fallback=True),
+                ))
+            elif name == 'memory':
+                sinks.append(MemorySink())
+            else:
+                logger.warning("未知的通知渠道: %s", name)
+        if not sinks:
+            return
+        from notifier import Notifier
+        self.notifier = Notifier(
+            sinks,
+            dedup_window=self.config.getfloat('notify', 'DEDUP_WINDOW', fallback=3600),
+            digest_window=self.config.getfloat('notify', 'DIGEST_WINDOW', fallback=30),
+            digest_max=self.config.getint('notify', 'DIGEST_MAX', fallback=50),
+            min_severity=get('MIN_SEVERITY', '信息'),
+        ).start()
+        logger.info("告警通知渠道: %s", ', '.join(sink.name for sink in sinks))
+    
+    def get_webpage(self, url, conditional=True, deadline=None):
+        """获取网页内容，判断是简单网页还是复杂网页
+
+        目标文件中mode为text/dom/image时不再自动判断；简单网页服务器返回304，或渲染后的DOM快照与上次相同时
+        返回 ('unchanged', None)。复杂网页默认提取渲染后的文字（见capture_dom），只有配置了
+        视觉信号时才截图。deadline 为本次检查的截止时间，获取和截图的超时都不超过剩余时间，
+        获取的超时同时不超过[http] TIMEOUT。
+        """
+        target = self.targets.get(url)
+        mode = target.mode if target is not None else 'auto'
+        kind = {'text': 'text', 'dom': 'image', 'image': 'image'}.get(mode, self._page_kinds.get(url))
         try:
-            # 先尝试用requests获取
-            response = requests.get(url, timeout=10, verify=False)
+            # 先尝试用共享会话获取；已知是简单网页时带上ETag/Last-Modified条件头，
+            # 需要渲染的网页外壳不变时脚本渲染出来的内容仍可能变化，总是完整获取
+            try:
+                with self.metrics.span('fetch', url):
+                    # 单次请求仍以[http] TIMEOUT为上限，只在剩余时间更短时缩短
+                    timeout = deadline.timeout(self.fetcher.timeout) if deadline is not None else None
+                    response = self.fetcher.fetch(url, conditional=conditional and kind == 'text',
+                                                  timeout=timeout)
+            except Exception:
+                self._record_host(self.breakers, url, False)
+                raise
+            self._record_host(self.breakers, url, response.status_code < 500)
+            self._header_hints[url] = header_hints(response.headers)
+            if response.status_code == 304:
+                self.metrics.incr('http_not_modified_total')
+                return 'unchanged', None
             response.raise_for_status()
             
-            # 检查是否是静态内容
-            soup = BeautifulSoup(response.text, 'html.parser')
-            static_content = soup.get_text(separator='\n', strip=True)
+            # 流式分类：判断是否为简单网页（字符数小于10000，且没有大量脚本），
+            # 超过阈值立即停止解析；简单网页同时得到去掉script/style的文本
+            html = response.text
+            # 原始字节不再需要，不在截图期间占用内存；解析树只存在于分类/提取函数内部，返回后即释放
+            del response
+            with self.metrics.span('parse', url):
+                if mode == 'text':
+                    kind, static_content = 'text', self.html_backend.extract_text(html)
+                elif mode in ('dom', 'image'):
+                    kind, static_content = 'image', None
+                else:
+                    kind, static_content = self.html_backend.classify(html)
+            self._page_kinds[url] = kind
             
-            # 判断是否为简单网页（字符数小于10000，且没有大量脚本）
-            script_tags = soup.find_all('script')
-            script_count = len(script_tags)
-            
-            if len(static_content) < 10000 and script_count < 10:
+            if kind == 'text':
                 return 'text', static_content
-            else:
-                # 复杂网页，尝试使用Pyppeteer截图
+            # 复杂网页，使用Pyppeteer渲染后提取文字或截图
+            dom = self.dom_for(url)
+            capture = {'image': 'screenshot', 'dom': 'dom'}.get(mode, dom.capture)
+            skip = self._render_skip_reason(url, deadline)
+            if skip is None:
                 try:
-                    print("尝试使用Pyppeteer获取网页截图...")
-                    screenshot = self.capture_screenshot(url)
-                    return 'image', screenshot
+                    timeout = deadline.timeout() if deadline is not None else None
+                    with self.metrics.span('render', url):
+                        if capture == 'dom':
+                            rendered = self.capture_dom(url, dom, conditional, timeout)
+                        else:
+                            rendered = 'image', self.capture_screenshot(url, timeout=timeout)
+                    self._record_host(self.render_breakers, url, True)
+                    return rendered
                 except Exception as e:
-                    print(f"截图失败，降级到文本分析: {e}")
-                    # 截图失败，降级到文本分析
-                    return 'text', static_content
+                    self._record_host(self.render_breakers, url, False)
+                    logger.warning("渲染失败，降级到文本分析: %s", e or type(e).__name__)
+            else:
+                self.metrics.incr('render_skipped_total', reason=skip)
+                logger.info("跳过截图（%s），降级到文本分析: %s", skip, url)
+            # 截图失败或跳过时降级到文本分析；文本没有变化时后面会直接复用缓存的分析结果
+            return 'text', self.html_backend.extract_text(html)
         except Exception as e:
-            print(f"获取网页失败: {e}")
+            logger.warning("获取网页失败 %s: %s", url, e)
             return 'error', str(e)
     
+    @staticmethod
+    def _record_host(breakers, url, ok):
+        if breakers is not None:
+            breakers.record(url, ok)
+    
+    def _render_skip_reason(self, url, deadline):
+        """不值得截图的原因：剩余时间不够，或该主机的截图熔断中；可以截图时返回None"""
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and remaining < self.min_render_budget:
+            return 'deadline'
+        if self.render_breakers is not None and self.render_breakers.acquire(url) == REJECT:
+            return 'circuit_open'
+        return None
+    
+    def _circuit_allows(self, url):
+        """熔断检查：熔断中的主机直接跳过；冷却结束时先用廉价探测确认恢复"""
+        if self.breakers is None:
+            return True
+        decision = self.breakers.acquire(url)
+        if decision == ALLOW:
+            return True
+        if decision == PROBE:
+            with self.metrics.span('probe', url):
+                ok = self.fetcher.probe(url, timeout=self.probe_timeout)
+            self._record_host(self.breakers, url, ok)
+            if ok:
+                return True
+        retry_in = self.breakers.retry_in(url)
+        # 自适应调度在下一次探测之前不再安排检查
+        self._header_hints[url] = (retry_in, None)
+        self.metrics.incr('checks_total', outcome='circuit_open')
+        self._observe(url, 'circuit_open')
+        self.metrics.event('check', url=url, outcome='circuit_open', retry_in=round(retry_in, 1))
+        logger.info("主机熔断中，跳过 %s（%.0f秒后探测）", url, retry_in)
+        return False
+    
     async def capture_screenshot_pyppeteer(self, url):
-        """使用Pyppeteer获取网页截图（异步方法）"""
+        """使用Pyppeteer获取网页截图（异步方法，需在浏览器池的事件循环中运行）"""
         try:
-            # 启动Pyppeteer浏览器
-            browser = await launch(
-                headless=True,
-                args=[
-                    '--window-size=1920,1080',
-                    '--ignore-certificate-errors',
-                    '--allow-running-insecure-content',
-                    '--disable-extensions',
-                    '--disable-popup-blocking',
-                    '--disable-default-apps',
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu'
-                ],
-                executablePath=r'C:\Program Files\Google\Chrome\Application\chrome.exe'  # 手动指定Chrome路径
-            )
-            
-            # 创建新页面
-            page = await browser.newPage()
-            
-            # 设置视图大小
-            await page.setViewport({'width': 1920, 'height': 1080})
-            
-            # 导航到URL（忽略SSL错误）
-            await page.goto(url, {'waitUntil': 'networkidle0', 'timeout': 30000})
-            
-            # 等待页面加载完成 - 使用sleep代替waitForTimeout
-            await asyncio.sleep(3)
-            
-            # 截取整个页面的截图
-            screenshot = await page.screenshot({'fullPage': True, 'type': 'png'})
-            
-            # 关闭浏览器
-            await browser.close()
+            # 从常驻浏览器池借一个页面，用完归还
+            from readiness import load_page
+            async with self.get_browser_pool().page() as page:
+                # 按该URL的就绪策略导航并等待页面就绪（可屏蔽字体、广告等重资源）
+                await load_page(page, url, self.readiness_for(url))
+                
+                # 截取整个页面的截图
+                screenshot = await self._full_page_screenshot(page, url)
             
             return screenshot
         except Exception as e:
-            print(f"Pyppeteer截图出错: {e}")
+            logger.debug("Pyppeteer截图出错: %s", e)
             raise
     
-    def capture_screenshot(self, url):
-        """直接使用Pyppeteer获取网页截图"""
+    async def capture_dom_pyppeteer(self, url, dom, screenshot_needed):
+        """渲染页面并提取DOM快照（异步方法，需在浏览器池的事件循环中运行）
+
+        screenshot_needed(snapshot) 返回True时在同一个页面中截取视觉信号元素所在的区域。
+        返回 (DomSnapshot, 截图或None)。
+        """
+        from readiness import load_page
+        async with self.get_browser_pool().page() as page:
+            await load_page(page, url, self.readiness_for(url))
+            snapshot = await extract_dom(page, dom)
+            screenshot = None
+            if screenshot_needed(snapshot):
+                if snapshot.clip is not None:
+                    screenshot = await page.screenshot({'type': 'png', 'clip': snapshot.clip})
+                else:
+                    screenshot = await self._full_page_screenshot(page, url)
+        return snapshot, screenshot
+    
+    async def _full_page_screenshot(self, page, url):
+        """整页截图；页面高于MAX_SCREENSHOT_HEIGHT时只截取上面部分，限制截图解码后占用的内存"""
+        limit = self.max_screenshot_height
+        if limit:
+            height = await page.evaluate(
+                '() => Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)')
+            if height > limit:
+                self.metrics.incr('screenshot_truncated_total')
+                logger.info("页面高度%dpx超过上限%dpx，只截取上面部分: %s", height, limit, url)
+                viewport = dict(page.viewport or self.get_browser_pool().viewport)
+                await page.setViewport(dict(viewport, height=limit))
+                try:
+                    return await page.screenshot({'type': 'png'})
+                finally:
+                    # 页面会被浏览器池复用
+                    await page.setViewport(viewport)
+        return await page.screenshot({'fullPage': True, 'type': 'png'})
+    
+    def capture_dom(self, url, dom, conditional=True, timeout=None):
+        """渲染页面并提取文字，返回 (content_type, content)
+
+        - 没有配置视觉信号：返回 ('text', 提取的文字)，之后与静态页面一样走缓存、预筛和文本分析
+        - 配置了视觉信号：文字和视觉信号都没有变化、且有上次的分析结果时返回 ('unchanged', None)；
+          否则截取视觉元素所在区域，返回 ('image', 截图)，提取的文字暂存在_dom_context中一起分析
+        """
+        has_last = conditional and self._last_result(url) is not None
+        changes = {}
+
+        def screenshot_needed(snapshot):
+            changes['text'], changes['visual'] = self.dom_tracker.update(url, snapshot)
+            return dom.visual and not (has_last and not changes['text'] and not changes['visual'])
+
+        logger.debug("使用Pyppeteer提取页面文字: %s", url)
+        snapshot, screenshot = self.get_browser_pool().run(
+            self.capture_dom_pyppeteer(url, dom, screenshot_needed), timeout)
+        text = snapshot_text(snapshot)
+        self.metrics.incr('dom_captures_total', kind='screenshot' if screenshot is not None else 'text')
+        logger.debug("DOM快照 %s: %d段文字，%d个元素未找到，观察期间变化%d次",
+                     url, len(snapshot.texts), len(snapshot.missing), snapshot.mutations)
+        if not dom.visual:
+            return 'text', text
+        if screenshot is None:
+            logger.info("页面文字和视觉信号都没有变化: %s", url)
+            return 'unchanged', None
+        self._dom_context[url] = text
+        return 'image', screenshot
+    
+    def dom_for(self, url):
+        """复杂网页的获取方式和提取范围：[dom]节为默认值，[dom:<URL>]节和目标文件可以覆盖"""
+        dom = self._dom.get(url)
+        if dom is not None:
+            return dom
+        options = {}
+        for section in ('dom', f'dom:{url}'):
+            if not self.config.has_section(section):
+                continue
+            if self.config.has_option(section, 'CAPTURE'):
+                options['capture'] = self.config.get(section, 'CAPTURE').strip().strip('"')
+            for option, key in (('SELECTORS', 'selectors'), ('XPATHS', 'xpaths'),
+                                ('VISUAL_SELECTORS', 'visual_selectors')):
+                if self.config.has_option(section, option):
+                    options[key] = _config_list(self.config, section, option)
+            for option, key in (('OBSERVE_MS', 'observe_ms'), ('QUIET_MS', 'quiet_ms'), ('MAX_CHARS', 'max_chars')):
+                if self.config.has_option(section, option):
+                    options[key] = self.config.getint(section, option)
+        target = self.targets.get(url)
+        if target is not None:
+            if target.capture:
+                options['capture'] = target.capture
+            for key in ('selectors', 'xpaths', 'visual_selectors'):
+                if getattr(target, key):
+                    options[key] = getattr(target, key)
+        dom = DomConfig(**options)
+        self._dom[url] = dom
+        return dom
+    
+    def readiness_for(self, url):
+        """页面就绪策略：[readiness]节为默认值，[readiness:<URL>]节可以覆盖"""
+        readiness = self._readiness.get(url)
+        if readiness is not None:
+            return readiness
+        from readiness import ReadinessConfig
+        options = {}
+        for section in ('readiness', f'readiness:{url}'):
+            if not self.config.has_section(section):
+                continue
+            get = lambda option: self.config.get(section, option, raw=True).strip().strip('"')
+            for option, key, convert in (
+                ('STRATEGY', 'strategy', str),
+                ('SELECTOR', 'selector', str),
+                ('PREDICATE', 'predicate', str),
+                ('QUIET_MS', 'quiet_ms', int),
+                ('SETTLE_MS', 'settle_ms', int),
+                ('TIMEOUT_MS', 'timeout_ms', int),
+                # 留空时为None：不覆盖，使用上一级配置或内置列表
+                ('BLOCK_TYPES', 'block_types', lambda v: [t.strip() for t in v.split(',') if t.strip()] or None),
+                ('BLOCK_HOSTS', 'block_hosts', lambda v: v.split() or None),
+            ):
+                if self.config.has_option(section, option):
+                    value = convert(get(option))
+                    if value is not None:
+                        options[key] = value
+        target = self.targets.get(url)
+        if target is not None:
+            options.update(target.readiness)
+        readiness = ReadinessConfig(**options)
+        self._readiness[url] = readiness
+        return readiness
+    
+    def get_browser_pool(self):
+        """获取（必要时创建）常驻浏览器池，参数来自配置文件的[browser]节
+
+        并发调用时只创建一个浏览器池（双重检查加锁，同get_ai_client）。
+        """
+        if self.browser_pool is not None:
+            return self.browser_pool
+        with self._browser_pool_lock:
+            if self.browser_pool is None:
+                from browser_pool import BrowserPool
+                browser_pool = BrowserPool(
+                    size=self.config.getint('browser', 'POOL_SIZE', fallback=2),
+                    pages_per_browser=self.config.getint('browser', 'PAGES_PER_BROWSER', fallback=4),
+                    max_pages_per_browser=self.config.getint('browser', 'MAX_PAGES_PER_BROWSER', fallback=200),
+                    executable_path=self.config.get('browser', 'CHROME_PATH', fallback='').strip('"') or None,
+                )
+                logger.info("浏览器路径: %s", browser_pool.executable_path or 'pyppeteer自带Chromium')
+                self.browser_pool = browser_pool
+            return self.browser_pool
+    
+    def capture_screenshot(self, url, timeout=None):
+        """直接使用Pyppeteer获取网页截图；超过timeout秒时取消截图并归还页面"""
         try:
-            print("使用Pyppeteer获取网页截图...")
-            
-            # 检查当前是否有已运行的事件循环
-            try:
-                loop = asyncio.get_running_loop()
-                # 如果有已运行的事件循环，使用create_task或run_coroutine_threadsafe
-                print("检测到已运行的事件循环，使用现有的事件循环...")
-                # 在当前事件循环中运行协程
-                screenshot = loop.run_until_complete(self.capture_screenshot_pyppeteer(url))
-            except RuntimeError:
-                # 没有已运行的事件循环，使用asyncio.run
-                print("创建新的事件循环...")
-                screenshot = asyncio.run(self.capture_screenshot_pyppeteer(url))
-                
-            return screenshot
+            logger.debug("使用Pyppeteer获取网页截图: %s", url)
+            # 浏览器池运行在自己的事件循环线程中，无论调用方是否已有事件循环都可以同步等待
+            return self.get_browser_pool().run(self.capture_screenshot_pyppeteer(url), timeout)
         except Exception as e:
-            print(f"Pyppeteer截图失败: {e}")
+            logger.debug("Pyppeteer截图失败: %s", e)
             raise
     
-    def analyze_text(self, text):
-        """使用AI推理模型分析文本内容"""
+    def close(self):
+        """释放浏览器池、缓存和HTTP连接池等常驻资源"""
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
+        if self.result_cache is not None:
+            self.result_cache.close()
+        if self.ai_client is not None:
+            self.ai_client.close()
+        if self.notifier is not None:
+            self.notifier.close()
+        if self.history is not None:
+            self.history.close()
+        self.fetcher.close()
+        self.export_metrics(force=True)
+        self.metrics.close()
+    
+    def analyze_text(self, text, url=None, deadline=None):
+        """使用AI推理模型分析文本内容，最多等到本次检查的截止时间"""
         try:
-            if not self.ai_client:
+            ai_client = self.get_ai_client()
+            if not ai_client:
                 # AI模型未初始化，返回模拟结果
                 return """【模拟分析结果】
 页面正常，未发现告警信息。
 
 此为模拟结果，实际使用时将调用AI模型进行分析。"""
             
-            prompt = f"""请分析以下网页内容，重点关注是否存在告警、错误等异常信息。
-如果发现异常，请生成详细的告警报告，包括：
-1. 告警级别（严重/警告/信息）
-2. 告警内容
-3. 可能的原因
-4. 建议的处理措施
-
-如果没有发现异常，请说明页面正常。
-
-网页内容：
-{text[:3000]}  # 限制文本长度
-"""
-            
             # 获取模型名称和温度参数
             model_name = self.config.get('silicon-flow', 'REASONING_MODEL').strip('"')
             temperature = float(self.config.get('silicon-flow', 'temperature', fallback='0.7'))
-            print(f"正在使用AI模型: {model_name}")
-            print(f"温度参数: {temperature}")
+            logger.debug("正在使用AI模型: %s，温度参数: %s", model_name, temperature)
             
-            response = self.ai_client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "你是一个专业的系统监控分析助手，善于从文本中识别告警信息。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature
+            # 同一时间窗口内的小页面会被打包成一次请求（需在[llm]中设置BATCH_WINDOW）
+            reply = ai_client.complete_batched_sync(
+                model_name,
+                TEXT_SYSTEM_PROMPT,
+                TEXT_INSTRUCTION,
+                url or '网页',
+                self.condense_text(text, url),
+                temperature,
+                timeout=self._analyze_timeout(deadline),
+                **self._json_extra(),
             )
-            
-            return response.choices[0].message.content
+            # 统一整理成固定格式的报告，缓存和历史中保存的都是这份文本
+            return parse_analysis(reply).to_text()
         except Exception as e:
-            return f"分析文本时出错: {e}\n\n此为错误信息，实际使用时将调用AI模型进行分析。"
+            return f"分析文本时出错: {e or type(e).__name__}\n\n此为错误信息，实际使用时将调用AI模型进行分析。"
     
-    def analyze_image(self, image_data):
-        """使用AI视觉模型分析截图"""
+    def image_options(self, url=None):
+        """截图处理参数：[image]节为默认值，[image:<URL>]节和目标文件中的roi可以覆盖"""
+        from image_pipeline import parse_roi
+        options = {}
+        for section in ('image', f'image:{url}' if url else None):
+            if not section or not self.config.has_section(section):
+                continue
+            get = self.config.get
+            if self.config.has_option(section, 'ROI'):
+                options['roi'] = parse_roi(get(section, 'ROI').strip('"'))
+            for option, key, convert in (
+                ('MAX_WIDTH', 'max_width', int),
+                ('TILE_HEIGHT', 'tile_height', int),
+                ('MAX_TILES', 'max_tiles', int),
+                ('FORMAT', 'format', lambda v: v.strip('"').upper()),
+                ('QUALITY', 'quality', int),
+                ('MIN_QUALITY', 'min_quality', int),
+                ('MAX_BYTES', 'max_bytes', int),
+            ):
+                if self.config.has_option(section, option):
+                    options[key] = convert(get(section, option))
+        target = self.targets.get(url)
+        if target is not None and target.roi is not None:
+            options['roi'] = target.roi
+        return options
+    
+    def analyze_image(self, image_data, url=None, regions=None, deadline=None, dom_text=None):
+        """使用AI视觉模型分析截图；regions不为空时只发送这些变化区域 [(x, y, w, h)]
+
+        dom_text 为同一页面中提取到的文字（截图只包含视觉信号元素时），压缩后附在说明之后。
+        """
         try:
-            if not self.ai_client:
+            ai_client = self.get_ai_client()
+            if not ai_client:
                 # AI模型未初始化，返回模拟结果
                 return """【模拟分析结果】
 页面正常，未发现告警信息。
 
 此为模拟结果，实际使用时将调用AI模型进行分析。"""
             
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 保存为临时文件
-            temp_path = 'temp_screenshot.png'
-            image.save(temp_path)
+            # 在内存中裁剪、缩放、切块并重新编码，不写临时文件
+            from image_pipeline import image_message_parts, region_message_parts
+            instruction = IMAGE_INSTRUCTION
+            options = self.image_options(url)
+            if dom_text is not None:
+                # 只截了视觉元素所在区域，按整页坐标配置的ROI不再适用
+                options.pop('roi', None)
+            with self.metrics.span('encode', url):
+                if regions:
+                    image_parts = region_message_parts(image_data, regions, **options)
+                    instruction += REGION_NOTE
+                else:
+                    image_parts = image_message_parts(image_data, **options)
+            if dom_text:
+                instruction += DOM_TEXT_NOTE + self.condense_text(dom_text, url)
             
             # 获取模型名称和温度参数
             model_name = self.config.get('silicon-flow', 'VISUAL_MODEL').strip('"')
             temperature = float(self.config.get('silicon-flow', 'temperature', fallback='0.7'))
-            print(f"正在使用AI视觉模型: {model_name}")
-            print(f"温度参数: {temperature}")
-            
-            with open(temp_path, 'rb') as f:
-                response = self.ai_client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": "你是一个专业的系统监控分析助手，善于从截图中识别告警信息。"},
-                        {"role": "user", "content": [
-                            {"type": "text", "text": "请分析以下网页截图，重点关注是否存在告警、错误等异常信息。如果发现异常，请生成详细的告警报告，包括：1. 告警级别（严重/警告/信息）2. 告警内容 3. 可能的原因 4. 建议的处理措施。如果没有发现异常，请说明页面正常。"},
-                            {"type": "image", "image": f}
-                        ]}
-                    ],
-                    temperature=temperature
-                )
+            logger.debug("正在使用AI视觉模型: %s，温度参数: %s，截图分为%d块发送",
+                         model_name, temperature, len(image_parts))
             
-            return response.choices[0].message.content
+            reply = ai_client.complete_sync(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": "你是一个专业的系统监控分析助手，善于从截图中识别告警信息。"},
+                    {"role": "user", "content": [
+                        {"type": "text", "text": instruction},
+                        *image_parts
+                    ]}
+                ],
+                temperature=temperature,
+                timeout=self._analyze_timeout(deadline),
+                **self._json_extra(),
+            )
+            return parse_analysis(reply).to_text()
         except Exception as e:
-            return f"分析图像时出错: {e}\n\n此为错误信息，实际使用时将调用AI模型进行分析。"
+            return f"分析图像时出错: {e or type(e).__name__}\n\n此为错误信息，实际使用时将调用AI模型进行分析。"
+    
+    @staticmethod
+    def _analyze_timeout(deadline):
+        """分析最多等待的秒数；截止时间已过时直接报错"""
+        if deadline is None:
+            return None
+        if deadline.expired():
+            raise TimeoutError("超过本次检查的截止时间")
+        return deadline.remaining()
+    
+    def _json_extra(self):
+        """JSON_MODE开启时附加的请求参数"""
+        return {'response_format': {'type': 'json_object'}} if self.json_mode else {}
+    
+    def _last_result(self, url):
+        """该URL最近一次缓存的分析结果"""
+        return self.result_cache.last_result(url) if self.result_cache is not None else None
+    
+    def _report(self, url, result, outcome, content_key=None):
+        """输出分析结果，并按结果来源计数（analyzed/cache_hit/not_modified/...）"""
+        self.metrics.incr('checks_total', outcome=outcome)
+        self.metrics.event('check', url=url, outcome=outcome)
+        analysis = self._observe(url, outcome, result, content_key)
+        if analysis is not None and self.notifier is not None:
+            self.notifier.submit(url, analysis)
+        logger.info("分析结果 %s（%s）:\n%s", url, outcome, result)
+        self.export_metrics()
+        return result
+    
+    def _observe(self, url, outcome, result=None, content_key=None):
+        """记录本次检查的状态：只有重新分析过才算内容变化
+
+        返回解析后的AnalysisResult，出错时返回None。
+        """
+        retry_after, max_age = self._header_hints.pop(url, (None, None))
+        error = outcome in ('fetch_error', 'model_error', 'circuit_open')
+        analysis = None if error else parse_analysis(result)
+        if analysis is not None and analysis.unparsed and outcome == 'analyzed':
+            logger.warning("无法解析模型回复，不作为告警: %s", url)
+        observation = Observation(
+            changed=outcome == 'analyzed',
+            alert=analysis is not None and analysis.is_alert,
+            error=error,
+            retry_after=retry_after,
+            max_age=max_age,
+        )
+        self._observations[url] = observation
+        self._check_records[url] = (outcome, result, content_key, analysis)
+        return analysis
+    
+    @staticmethod
+    def _content_key(content_type, content):
+        """写入历史的内容哈希"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        return f"{content_type}:{hashlib.sha1(data).hexdigest()}"
+    
+    def _record_history(self, url, timings):
+        """把本次检查提交给历史存储的后台写入线程"""
+        record = self._check_records.pop(url, None)
+        if self.history is None or record is None:
+            return
+        outcome, result, content_key, analysis = record
+        if analysis is None:
+            verdict, severity = 'error', None
+        elif analysis.is_alert:
+            verdict, severity = 'alert', analysis.severity
+        elif analysis.unparsed:
+            verdict, severity = 'unparsed', None
+        else:
+            verdict, severity = 'normal', None
+        self.history.record(
+            url, outcome, report=result, content_hash=content_key, verdict=verdict, severity=severity,
+            elapsed_ms=timings.get('check'), timings=timings,
+        )
+    
+    def last_observation(self, url, result=None):
+        """最近一次检查的状态（AdaptiveScheduler的observe_func）"""
+        return self._observations.get(url)
+    
+    def export_metrics(self, force=False):
+        """按WRITE_INTERVAL把指标写入Prometheus文本文件（未配置时跳过）"""
+        if not self.metrics_file:
+            return
+        now = time.monotonic()
+        if not force and now - self._metrics_written < self.metrics_interval:
+            return
+        self._metrics_written = now
+        try:
+            self.metrics.write_prometheus(self.metrics_file)
+        except OSError as e:
+            logger.warning("写入指标文件失败: %s", e)
     
     def check_website(self, url):
         """检查单个网站"""
-        print(f"\n开始检查网站: {url}")
-        content_type, content = self.get_webpage(url)
+        # 清掉上一次检查的状态：本次检查中途抛出异常时，调度器不会误用上一次的结果
+        self._observations.pop(url, None)
+        self._check_records.pop(url, None)
+        self._header_hints.pop(url, None)
+        with self.metrics.trace() as timings:
+            with self.metrics.span('check', url):
+                result = self._check_website(url)
+        self._record_history(url, timings)
+        self.check_memory()
+        return result
+    
+    def _check_website(self, url):
+        logger.info("开始检查网站: %s", url)
+        if not self._circuit_allows(url):
+            return None
+        # 获取、截图和分析共用同一个截止时间
+        deadline = Deadline(self.check_deadline)
+        content_type, content = self.get_webpage(url, deadline=deadline)
+        
+        # 304未修改：直接复用上次的分析结果，跳过解析和分析
+        if content_type == 'unchanged':
+            cached = self._last_result(url)
+            if cached is not None:
+                logger.info("页面未修改，复用上次分析结果")
+                return self._report(url, cached, 'not_modified')
+            # 没有可复用的结果时重新完整获取
+            content_type, content = self.get_webpage(url, conditional=False, deadline=deadline)
+        # 与截图一起分析的页面文字；DOM快照已经确认页面有变化，不再用截图判断是否变化
+        dom_text = self._dom_context.pop(url, None)
         
         if content_type == 'error':
-            print(f"获取网页失败: {content}")
-            return
+            self.metrics.incr('checks_total', outcome='fetch_error')
+            self._observe(url, 'fetch_error', content)
+            self.metrics.event('check', url=url, outcome='fetch_error', error=content)
+            return None
+        content_key = self._content_key(content_type, content) if self.history is not None else None
+        
+        # 截图差异检测：与上次分析过的截图相比没有变化时跳过，只有局部变化时只分析变化区域
+        regions = None
+        diff = diff_candidate = None
+        visual_diff = self.get_visual_diff() if content_type == 'image' and dom_text is None else None
+        if visual_diff is not None:
+            # 只比较ROI内的部分，ROI之外的变化不触发分析
+            with self.metrics.span('diff', url):
+                diff, diff_candidate = visual_diff.compare(url, content, roi=self.image_options(url).get('roi'))
+            last = self._last_result(url)
+            if diff.status in ('identical', 'unchanged') and last is not None:
+                logger.info("截图与上次相比没有变化，复用上次分析结果")
+                return self._report(url, last, 'visual_unchanged', content_key)
+            if (diff.status == 'changed' and last is not None
+                    and len(diff.boxes) <= self.visual_diff_max_regions
+                    and diff.changed_ratio <= self.visual_diff_max_ratio):
+                regions = diff.boxes
+                self.metrics.incr('visual_partial_total')
+                logger.info("截图有%d个区域发生变化（%.1f%%），只分析变化区域", len(regions), diff.changed_ratio * 100)
+        
+        # 内容没有变化时复用上一次的分析结果，不调用AI模型
+        cache_key = None
+        if self.result_cache is not None:
+            if content_type == 'text':
+                cache_key, cached = self.result_cache.lookup_text(url, content)
+            else:
+                # 差异检测已经确认截图有变化时不再按感知哈希复用结果，否则会漏掉状态灯变色这样的小面积变化
+                cache_key, cached = self.result_cache.lookup_image(
+                    url, content, reuse=diff is None or diff.status != 'changed')
+                if dom_text is not None:
+                    cached = None
+            if cached is not None:
+                logger.info("页面内容未变化，复用上次分析结果")
+                self.metrics.incr('cache_hits_total', kind=content_type)
+                return self._report(url, cached, 'cache_hit', content_key)
+            self.metrics.incr('cache_misses_total', kind=content_type)
+        
+        # 本地预筛：未命中告警关键词且内容没有明显变化时不调用AI模型
+        if content_type == 'text' and self.prefilter is not None:
+            with self.metrics.span('prefilter', url):
+                verdict = self.prefilter.triage(url, content)
+            logger.info("本地预筛: %s（%.2fms）", verdict.reason, verdict.elapsed_ms)
+            if not verdict.escalate:
+                result = self._last_result(url) or LOCAL_NORMAL_RESULT
+                return self._report(url, result, 'prefilter_local', content_key)
+            self.metrics.incr('prefilter_escalations_total')
         
         # 根据内容类型选择分析方法
-        if content_type == 'text':
-            print("使用文本分析...")
-            result = self.analyze_text(content)
-        else:
-            print("使用图像分析...")
-            result = self.analyze_image(content)
+        with self.metrics.span('analyze', url):
+            if content_type == 'text':
+                result = self.analyze_text(content, url, deadline=deadline)
+            else:
+                result = self.analyze_image(content, url, regions, deadline=deadline, dom_text=dom_text)
         
-        print("\n分析结果:")
-        print(result)
-        print("-" * 80)
-    
-    def start_monitoring(self, urls, interval=60):
-        """开始监控任务"""
-        print(f"启动网站监控，每{interval}秒检查一次")
-        print(f"监控网站列表: {urls}")
-        print(f"告警关键词: {self.alert_keywords}")
-        print("-" * 80)
+        # 出错的结果不缓存，下次重新分析
+        if result.startswith(ANALYSIS_ERROR_PREFIXES):
+            # 这次的内容没有分析结果，下次不能凭304或DOM快照没变化而复用更早的结果
+            self.fetcher.validators.forget(url)
+            self.dom_tracker.forget(url)
+            if self.prefilter is not None:
+                self.prefilter.forget(url)
+            return self._report(url, result, 'model_error', content_key)
+        if cache_key is not None:
+            self.result_cache.store(url, cache_key, result)
+        if diff_candidate is not None:
+            visual_diff.accept(url, diff_candidate)
+        return self._report(url, result, 'analyzed', content_key)
+    
+    def start_monitoring(self, urls, interval=60, mode='serial', **scheduler_options):
+        """开始监控任务
+
+        mode='serial' 为原有的逐个检查；mode='async' 使用并发调度器；
+        mode='adaptive' 使用按URL自适应间隔的并发调度器（参数来自[schedule]节），
+        scheduler_options 透传给调度器（max_concurrency、per_host_limit、jitter）
+        """
+        logger.info("启动网站监控，每%s秒检查一次", interval)
+        logger.info("监控网站列表: %s", urls)
+        logger.info("告警关键词: %s", self.alert_keywords)
+        
+        if mode == 'async':
+            return asyncio.run(self.start_monitoring_async(urls, interval, **scheduler_options))
+        if mode == 'adaptive':
+            return asyncio.run(self.start_monitoring_adaptive(urls, interval, **scheduler_options))
         
         # 立即执行一次检查
         for url in urls:
             self.check_website(url)
         
-        # 设置定时任务
-        def job():
-            for url in urls:
+        import schedule
+        
+        # 设置定时任务：目标文件中间隔相同的网站共用一个任务
+        def job(group):
+            for url in group:
                 self.check_website(url)
+            logger.info("HTTP统计: %s", self.fetcher.report())
         
-        schedule.every(interval).seconds.do(job)
+        groups = {}
+        for url, url_interval in target_intervals(self.targets.values(), urls, interval).items():
+            groups.setdefault(url_interval, []).append(url)
+        for url_interval, group in groups.items():
+            schedule.every(url_interval).seconds.do(job, group)
         
-        # 运行调度器
-        while True:
+        # 运行调度器，内存超限时退出
+        while not self.memory_exceeded:
             schedule.run_pending()
             time.sleep(1)
+    
+    async def start_monitoring_async(self, urls, interval=60, max_concurrency=20,
+                                     per_host_limit=2, jitter=0.1, duration=None):
+        """并发监控：多个网站的获取、渲染和分析同时进行"""
+        self.scheduler = AsyncMonitorScheduler(
+            self.check_website,
+            interval=interval,
+            intervals=target_intervals(self.targets.values(), urls, interval),
+            max_concurrency=max_concurrency,
+            per_host_limit=per_host_limit,
+            jitter=jitter,
+        )
+        logger.info("并发模式: 全局并发%d，每个主机并发%d", max_concurrency, per_host_limit)
+        self._monitor_loop = asyncio.get_running_loop()
+        return await self.scheduler.run(urls, duration=duration)
+    
+    def schedule_policy(self, interval=60):
+        """自适应调度参数：[schedule]节为默认值，[schedule:<URL>]节按URL覆盖"""
+        get = lambda section, option, default: self.config.getfloat(section, option, fallback=default)
+        policy = IntervalPolicy(
+            interval=interval,
+            min_interval=get('schedule', 'MIN_INTERVAL', min(15, interval)),
+            max_interval=get('schedule', 'MAX_INTERVAL', max(1800, interval)),
+            backoff=get('schedule', 'BACKOFF', 1.5),
+            tighten=get('schedule', 'TIGHTEN', 0.5),
+        )
+        overrides = {}
+        for section in self.config.sections():
+            if section.startswith('schedule:'):
+                overrides[section[len('schedule:'):]] = {
+                    key: get(section, option, None)
+                    for option, key in (('INTERVAL', 'interval'), ('MIN_INTERVAL', 'min_interval'),
+                                        ('MAX_INTERVAL', 'max_interval'))
+                }
+        # 目标文件中的间隔
+        for url, target in self.targets.items():
+            if target.interval is not None:
+                overrides.setdefault(url, {})['interval'] = target.interval
+        return policy, overrides
+    
+    async def start_monitoring_adaptive(self, urls, interval=60, max_concurrency=20,
+                                        per_host_limit=2, jitter=0.1, duration=None):
+        """自适应监控：稳定的页面逐步降低频率，变化或告警的页面提高频率"""
+        policy, overrides = self.schedule_policy(interval)
+        self.scheduler = AdaptiveScheduler(
+            self.check_website,
+            self.last_observation,
+            policy=policy,
+            overrides=overrides,
+            max_concurrency=max_concurrency,
+            per_host_limit=per_host_limit,
+            jitter=jitter,
+        )
+        logger.info("自适应模式: 间隔%s~%s秒，全局并发%d，每个主机并发%d",
+                    policy.min_interval, policy.max_interval, max_concurrency, per_host_limit)
+        self._monitor_loop = asyncio.get_running_loop()
+        try:
+            return await self.scheduler.run(urls, duration=duration)
+        finally:
+            logger.info("各网站的检查间隔: %s", self.scheduler.report())
 
 if __name__ == "__main__":
+    setup_logging()
     # 示例用法
     agent = WebMonitorAgent()
     
@@ -314,4 +1124,6 @@ if __name__ == "__main__":
         
         print("\n截图功能测试完成！")
     except Exception as e:
-        print(f"测试时出错: {e}")
\ No newline at end of file
+        print(f"测试时出错: {e}")
+    finally:
+        agent.close()
\ No newline at end of file
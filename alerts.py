@@ -0,0 +1,202 @@
+"""
+结构化分析结果
+==============
+要求模型按JSON返回分析结果：
+    {"status": "正常" 或 "异常",
+     "alerts": [{"severity": "严重/警告/信息", "content": "...", "cause": "...", "action": "..."}]}
+解析时尽量宽容：去掉代码块标记、找出第一段JSON、接受中英文键名；
+模型没有按JSON回复时，再按“告警级别：…/告警内容：…”这样的文字格式解析。
+
+解析后的结果统一整理成固定格式的文本（to_text），缓存、历史和日志都使用这份文本，
+需要结构时再用 parse_analysis 解析回来。无法解析的回复标记为unparsed，不产生告警。
+"""
+
+import json
+import re
+from collections import namedtuple
+
+SEVERITIES = ('严重', '警告', '信息')
+SEVERITY_RANK = {level: rank for rank, level in enumerate(reversed(SEVERITIES), 1)}
+
+# 模型回复中表示页面正常的说法
+NORMAL_MARKERS = ('页面正常', '未发现告警', '未发现异常', '没有发现异常', '没有发现告警')
+
+NORMAL_TEXT = '页面正常，未发现告警信息。'
+
+# 既不是JSON、也没有告警字段和正常说法的回复：保留原文，但不当作告警
+UNPARSED_PREFIX = '【未能解析的分析结果】'
+
+JSON_FORMAT_INSTRUCTION = """
+分析结果请只用一个JSON对象表示，不要输出其它说明文字，格式如下：
+{"status": "正常" 或 "异常", "alerts": [{"severity": "严重/警告/信息", "content": "告警内容", "cause": "可能的原因", "action": "建议的处理措施"}]}
+页面正常时 alerts 为空列表。"""
+
+Alert = namedtuple('Alert', ['severity', 'content', 'cause', 'action'])
+
+# 各字段可以接受的键名
+_FIELD_KEYS = {
+    'severity': ('severity', 'level', '告警级别', '级别'),
+    'content': ('content', 'message', 'summary', '告警内容', '内容'),
+    'cause': ('cause', 'reason', '可能的原因', '原因'),
+    'action': ('action', 'suggestion', 'recommendation', '建议的处理措施', '处理措施', '建议'),
+}
+
+_TEXT_FIELD_RE = re.compile(
+    r'^\s*(?:\d+[.、)]\s*)?(?:\*\*)?(告警级别|告警内容|可能的原因|建议的处理措施|处理措施|原因)(?:\*\*)?\s*[:：]\s*(.*)$',
+    re.MULTILINE,
+)
+_TEXT_FIELDS = {'告警级别': 'severity', '告警内容': 'content', '可能的原因': 'cause', '原因': 'cause',
+                '建议的处理措施': 'action', '处理措施': 'action'}
+
+
+def normalize_severity(value):
+    """把各种写法统一为 严重/警告/信息"""
+    value = str(value or '').strip().lower()
+    for level in SEVERITIES:
+        if level in value:
+            return level
+    if value in ('critical', 'high', 'fatal', 'error'):
+        return '严重'
+    if value in ('warning', 'warn', 'medium'):
+        return '警告'
+    if value in ('info', 'low', 'notice'):
+        return '信息'
+    return '警告'
+
+
+class AnalysisResult:
+    """一次分析的结构化结果"""
+
+    def __init__(self, alerts=(), raw=None, unparsed=False):
+        self.alerts = list(alerts)
+        self.raw = raw
+        self.unparsed = unparsed
+
+    @property
+    def is_alert(self):
+        return bool(self.alerts)
+
+    @property
+    def severity(self):
+        """最高的告警级别，正常时为None"""
+        if not self.alerts:
+            return None
+        return max((a.severity for a in self.alerts), key=lambda s: SEVERITY_RANK.get(s, 0))
+
+    def to_text(self):
+        """固定格式的文本报告（可以被parse_analysis原样解析回来）"""
+        if self.unparsed:
+            raw = self.raw or ''
+            return raw if raw.startswith(UNPARSED_PREFIX) else f"{UNPARSED_PREFIX}\n{raw[:2000]}"
+        if not self.alerts:
+            return NORMAL_TEXT
+        blocks = []
+        for alert in self.alerts:
+            lines = [f"告警级别：{alert.severity}", f"告警内容：{alert.content}"]
+            if alert.cause:
+                lines.append(f"可能的原因：{alert.cause}")
+            if alert.action:
+                lines.append(f"建议的处理措施：{alert.action}")
+            blocks.append('\n'.join(lines))
+        return '\n\n'.join(blocks)
+
+    def to_dict(self):
+        return {
+            'status': '未知' if self.unparsed else '异常' if self.alerts else '正常',
+            'severity': self.severity,
+            'alerts': [alert._asdict() for alert in self.alerts],
+        }
+
+
+def _extract_json(text):
+    """从回复中找出第一段完整的JSON对象"""
+    text = re.sub(r'```(?:json)?', '', text)
+    start = text.find('{')
+    while start != -1:
+        depth = 0
+        in_string = escaped = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:index + 1])
+                    except ValueError:
+                        break
+        start = text.find('{', start + 1)
+    return None
+
+
+def _field(item, name):
+    for key in _FIELD_KEYS[name]:
+        value = item.get(key)
+        if value:
+            return str(value).strip()
+    return ''
+
+
+def _from_json(data):
+    items = data.get('alerts') or data.get('告警') or []
+    status = str(data.get('status') or data.get('状态') or '')
+    if isinstance(items, dict):
+        items = [items]
+    # 没有alerts列表、直接把字段放在顶层的回复
+    if not items and _field(data, 'content') and '正常' not in status:
+        items = [data]
+    alerts = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        content = _field(item, 'content')
+        if not content:
+            continue
+        alerts.append(Alert(normalize_severity(_field(item, 'severity')), content,
+                            _field(item, 'cause'), _field(item, 'action')))
+    return alerts
+
+
+def _from_text(text):
+    """解析“告警级别：…/告警内容：…”格式，每遇到新的告警级别开始一条新告警"""
+    alerts = []
+    current = None
+    for match in _TEXT_FIELD_RE.finditer(text):
+        field = _TEXT_FIELDS[match.group(1)]
+        value = match.group(2).strip()
+        if field == 'severity' or current is None:
+            if current is not None and current.get('content'):
+                alerts.append(current)
+            current = {}
+        current[field] = value
+    if current is not None and current.get('content'):
+        alerts.append(current)
+    return [Alert(normalize_severity(a.get('severity')), a['content'], a.get('cause', ''), a.get('action', ''))
+            for a in alerts]
+
+
+def parse_analysis(reply):
+    """把模型回复（或to_text生成的报告）解析为AnalysisResult"""
+    reply = (reply or '').strip()
+    if reply.startswith(UNPARSED_PREFIX):
+        return AnalysisResult(raw=reply, unparsed=True)
+    data = _extract_json(reply) if '{' in reply else None
+    if data is not None:
+        return AnalysisResult(_from_json(data), raw=reply)
+    alerts = _from_text(reply)
+    if alerts:
+        return AnalysisResult(alerts, raw=reply)
+    if not reply or any(marker in reply for marker in NORMAL_MARKERS):
+        return AnalysisResult(raw=reply)
+    # 无法解析的自由文本：不能确定页面有异常，不作为告警，保留原文供人工查看
+    return AnalysisResult(raw=reply, unparsed=True)
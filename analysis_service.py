@@ -0,0 +1,427 @@
+"""
+异步AI分析服务
+==============
+替代每个URL一次阻塞的 chat.completions.create 调用：
+- 有界的待处理队列 + 固定数量的并发请求
+- 令牌桶限流，同时满足服务商的RPM（每分钟请求数）和TPM（每分钟token数）配额
+- 429/5xx/网络错误按指数退避重试，优先使用服务器给出的Retry-After
+- 相同的并发请求合并为一次调用
+- 可选：把多个小页面打包成一个多段提示词，要求按部分编号返回JSON，再按段拆分结果
+
+服务运行在自己的事件循环线程上，同步代码通过 *_sync 方法调用。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from loop_thread import LoopThread
+from metrics import TOKEN_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# 429和5xx之外需要重试的网络类错误名
+_RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError')
+
+_SECTION_RE = re.compile(r'^\s*=+\s*第\s*(\d+)\s*部分.*?=+\s*$', re.MULTILINE)
+
+
+def estimate_text_tokens(text):
+    """粗略估算文本的token数：中文约1字1个token，ASCII约4字符1个token"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def estimate_tokens(messages):
+    """粗略估算请求的token数，图片按固定值计"""
+    total = 0
+    for message in messages:
+        content = message.get('content')
+        parts = content if isinstance(content, list) else [{'type': 'text', 'text': content or ''}]
+        for part in parts:
+            if part.get('type') == 'text':
+                total += estimate_text_tokens(part.get('text', ''))
+            else:
+                total += 1000
+    return total + 4 * len(messages)
+
+
+class TokenBucket:
+    """令牌桶：rate_per_minute 为每分钟补充的数量，capacity 为桶容量"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount=1):
+        """取出amount个令牌，不够时等待；超过容量的请求按容量计"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def adjust(self, delta):
+        """按实际用量修正（delta为正表示多用了，可以使桶暂时为负）"""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+class _Request:
+    def __init__(self, model, messages, temperature, extra=None):
+        self.model = model
+        self.messages = messages
+        self.temperature = temperature
+        self.extra = extra or {}
+        self.key = hashlib.sha256(
+            json.dumps([model, messages, temperature, self.extra], sort_keys=True, ensure_ascii=False,
+                       default=str).encode('utf-8')
+        ).hexdigest()
+        self.tokens = estimate_tokens(messages)
+
+
+class AnalysisService:
+    """异步AI分析服务（OpenAI兼容接口）"""
+
+    def __init__(self, api_key, base_url, rpm=60, tpm=100000, max_in_flight=8, max_queue=1000,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0, timeout=30.0, verify=False,
+                 batch_window=0.0, batch_max_items=4, batch_max_chars=6000, metrics=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.verify = verify
+        self.batch_window = batch_window
+        self.batch_max_items = batch_max_items
+        self.batch_max_chars = batch_max_chars
+        self.metrics = metrics
+        self.stats = {
+            'requests': 0, 'api_calls': 0, 'coalesced': 0, 'retries': 0,
+            'failures': 0, 'batches': 0, 'batched_items': 0, 'tokens': 0,
+        }
+
+        self._loop_thread = LoopThread('analysis-service')
+        self._client = None
+        self._queue = None
+        self._workers = []
+        self._in_flight = {}
+        self._rpm_bucket = None
+        self._tpm_bucket = None
+        self._batch = []
+        self._batch_timer = None
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._loop_thread.start():
+            self._loop_thread.run(self._setup())
+
+    async def _setup(self):
+        from openai import AsyncOpenAI
+        import httpx
+
+        self._client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            # 重试由本服务统一处理
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                verify=self.verify,
+                limits=httpx.Limits(max_connections=self.max_in_flight * 2),
+            ),
+        )
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._rpm_bucket = TokenBucket(self.rpm)
+        self._tpm_bucket = TokenBucket(self.tpm)
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.max_in_flight)]
+
+    async def _shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._client.close()
+
+    def close(self):
+        if not self._loop_thread.running:
+            return
+        try:
+            self._loop_thread.run(self._shutdown(), timeout=30)
+        finally:
+            self._loop_thread.stop()
+
+    # ---------- 请求执行 ----------
+
+    async def _worker(self):
+        while True:
+            request, future = await self._queue.get()
+            try:
+                result = await self._call_with_retry(request)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _retry_delay(self, attempt, error):
+        """指数退避（带抖动），服务器给出Retry-After时以其为准"""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _is_retryable(error):
+        status = getattr(error, 'status_code', None)
+        if status is not None:
+            return status == 429 or status >= 500
+        return type(error).__name__ in _RETRYABLE_ERRORS
+
+    async def _call_with_retry(self, request):
+        attempt = 0
+        while True:
+            await self._rpm_bucket.acquire(1)
+            await self._tpm_bucket.acquire(request.tokens)
+            started = time.perf_counter()
+            try:
+                self.stats['api_calls'] += 1
+                response = await self._client.chat.completions.create(
+                    model=request.model,
+                    messages=request.messages,
+                    temperature=request.temperature,
+                    **request.extra
+                )
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.incr('model_errors_total', model=request.model, error=type(e).__name__)
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self.stats['failures'] += 1
+                    raise
+                delay = self._retry_delay(attempt, e)
+                attempt += 1
+                self.stats['retries'] += 1
+                logger.warning("AI接口调用失败(%s)，%.1f秒后第%d次重试", e, delay, attempt)
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None and getattr(usage, 'total_tokens', None):
+                self.stats['tokens'] += usage.total_tokens
+                self._tpm_bucket.adjust(usage.total_tokens - request.tokens)
+            self._record_call(request.model, time.perf_counter() - started, usage)
+            return response.choices[0].message.content
+
+    def _record_call(self, model, elapsed, usage):
+        """记录模型调用耗时和token用量"""
+        if self.metrics is None:
+            return
+        self.metrics.observe('model_call_seconds', elapsed, model=model)
+        self.metrics.incr('model_calls_total', model=model)
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            value = getattr(usage, kind, None) if usage is not None else None
+            if value:
+                self.metrics.observe('model_tokens', value, buckets=TOKEN_BUCKETS, model=model, kind=kind.split('_')[0])
+                self.metrics.incr('model_tokens_total', value, model=model, kind=kind.split('_')[0])
+        self.metrics.event('model_call', model=model, ms=round(elapsed * 1000, 2),
+                           tokens=getattr(usage, 'total_tokens', None) if usage is not None else None)
+
+    async def _submit(self, request):
+        """提交请求；相同的请求正在进行时直接等待它的结果"""
+        self.stats['requests'] += 1
+        future = self._in_flight.get(request.key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[request.key] = future
+        future.add_done_callback(lambda _: self._forget_in_flight(request.key, future))
+        # 队列满时在这里等待，形成背压
+        try:
+            await self._queue.put((request, future))
+        except BaseException:
+            # 排队时被取消（调用方超时）：请求没有进入队列，不会有worker完成它，
+            # 取消后相同的请求不再合并到这个永远不会完成的future上
+            self._forget_in_flight(request.key, future)
+            future.cancel()
+            raise
+        return await asyncio.shield(future)
+
+    def _forget_in_flight(self, key, future):
+        # 同一个key可能已经换成了新的请求，只删除自己的
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def complete(self, model, messages, temperature=0.7, **extra):
+        """发送一次对话请求，返回回复文本"""
+        return await self._submit(_Request(model, messages, temperature, extra))
+
+    # ---------- 多页面打包 ----------
+
+    async def complete_batched(self, model, system_prompt, instruction, label, content, temperature=0.7,
+                               **extra):
+        """把小页面加入打包队列，与同一时间窗口内的其它页面合并成一次请求
+
+        content 超过打包上限、未开启打包或带有额外参数（如 response_format）时单独请求。
+        """
+        if self.batch_window <= 0 or len(content) > self.batch_max_chars or extra:
+            return await self.complete(model, self._single_messages(system_prompt, instruction, content),
+                                       temperature, **extra)
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append({
+            'model': model, 'system': system_prompt, 'instruction': instruction,
+            'label': label, 'content': content, 'temperature': temperature, 'future': future,
+        })
+        if (len(self._batch) >= self.batch_max_items
+                or sum(len(item['content']) for item in self._batch) >= self.batch_max_chars):
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush_batch)
+        return await future
+
+    @staticmethod
+    def _single_messages(system_prompt, instruction, content):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{instruction}\n\n网页内容：\n{content}"},
+        ]
+
+    def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        items, self._batch = self._batch, []
+        # 模型、系统提示、温度都相同的页面才能合并
+        groups = {}
+        for item in items:
+            groups.setdefault((item['model'], item['system'], item['instruction'], item['temperature']), []).append(item)
+        for group in groups.values():
+            asyncio.ensure_future(self._run_batch(group))
+
+    async def _run_batch(self, items):
+        first = items[0]
+        if len(items) == 1:
+            await self._resolve_single(first)
+            return
+
+        sections = '\n\n'.join(
+            f"=== 第{i}部分: {item['label']} ===\n{item['content']}" for i, item in enumerate(items, 1)
+        )
+        # 单页的指令可能要求“只输出一个JSON对象”，与按段标记分隔的回复互相矛盾；
+        # 打包时统一要求一个以部分编号为键的JSON对象，每个值是该网页按原指令得到的结果
+        prompt = (
+            f"{first['instruction']}\n\n"
+            f"以下共有{len(items)}个网页，每个网页以“=== 第N部分: 网址 ===”开头。"
+            f"请分别分析每个网页，只输出一个JSON对象，不要输出其它说明文字：键为部分编号N（\"1\"到\"{len(items)}\"，"
+            f"与输入一致，不要遗漏），值为该网页按上述要求得到的分析结果（要求JSON时为JSON对象，否则为字符串）。\n\n"
+            f"{sections}"
+        )
+        messages = [{"role": "system", "content": first['system']}, {"role": "user", "content": prompt}]
+        self.stats['batches'] += 1
+        self.stats['batched_items'] += len(items)
+        try:
+            reply = await self.complete(first['model'], messages, first['temperature'])
+        except Exception as e:
+            for item in items:
+                if not item['future'].done():
+                    item['future'].set_exception(e)
+            return
+
+        parts = split_batch_reply(reply, len(items))
+        for item, part in zip(items, parts):
+            if part:
+                if not item['future'].done():
+                    item['future'].set_result(part)
+            else:
+                # 模型漏掉了某一部分，单独补发
+                asyncio.ensure_future(self._resolve_single(item))
+
+    async def _resolve_single(self, item):
+        try:
+            result = await self.complete(
+                item['model'], self._single_messages(item['system'], item['instruction'], item['content']),
+                item['temperature'],
+            )
+            if not item['future'].done():
+                item['future'].set_result(result)
+        except Exception as e:
+            if not item['future'].done():
+                item['future'].set_exception(e)
+
+    # ---------- 同步接口 ----------
+
+    def complete_sync(self, model, messages, temperature=0.7, timeout=None, **extra):
+        """同步等待回复；timeout为调用方最多等待的秒数（含排队和重试）"""
+        self.start()
+        return self._loop_thread.run(self.complete(model, messages, temperature, **extra), timeout)
+
+    def complete_batched_sync(self, model, system_prompt, instruction, label, content, temperature=0.7,
+                              timeout=None, **extra):
+        self.start()
+        return self._loop_thread.run(
+            self.complete_batched(model, system_prompt, instruction, label, content, temperature, **extra),
+            timeout,
+        )
+
+
+def split_batch_reply(reply, count):
+    """拆分打包请求的回复：按部分编号为键的JSON对象，模型没有按JSON回复时按段标记拆分；缺失的部分为None"""
+    text = re.sub(r'```(?:json)?', '', reply)
+    start, end = text.find('{'), text.rfind('}')
+    try:
+        data = json.loads(text[start:end + 1]) if 0 <= start < end else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or not any(re.search(r'\d', str(key)) for key in data):
+        return split_sections(reply, count)
+    parts = [None] * count
+    for key, value in data.items():
+        match = re.search(r'\d+', str(key))
+        index = int(match.group()) - 1 if match else -1
+        if not 0 <= index < count or value in (None, '', {}, []):
+            continue
+        parts[index] = value.strip() if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return parts
+
+
+def split_sections(reply, count):
+    """按“=== 第N部分 ===”标记拆分打包请求的回复，缺失的部分为None"""
+    parts = [None] * count
+    matches = list(_SECTION_RE.finditer(reply))
+    for i, match in enumerate(matches):
+        index = int(match.group(1)) - 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(reply)
+        text = reply[match.end():end].strip()
+        if 0 <= index < count and text:
+            parts[index] = text
+    return parts
@@ -0,0 +1,141 @@
+"""
+异步并发监控调度器
+==================
+用asyncio同时检查多个网站，替代逐个串行检查的schedule循环：
+- 全局并发上限 + 按主机的并发上限
+- 每个URL独立的抖动间隔（可以按URL指定间隔），避免所有检查同一时刻触发
+- 上一次检查仍在运行时跳过本轮，慢页面不会自我堆积
+"""
+
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMonitorScheduler:
+    """基于asyncio的并发调度器"""
+
+    def __init__(self, check_func, interval=60, max_concurrency=20,
+                 per_host_limit=2, jitter=0.1, executor=None, intervals=None):
+        # check_func 可以是普通函数（放到线程池执行）或协程函数；intervals 为按URL指定的间隔 {url: 秒}
+        self.check_func = check_func
+        self.interval = interval
+        self.intervals = dict(intervals or {})
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.jitter = jitter
+        self.executor = executor
+        self._own_executor = executor is None
+        self._global_sem = None
+        self._host_sems = {}
+        self._running = {}
+        self._stop_event = None
+        self.stats = {'started': 0, 'finished': 0, 'skipped': 0, 'errors': 0, 'total_seconds': 0.0}
+
+    def _host_semaphore(self, url):
+        """获取（必要时创建）某个主机的信号量"""
+        host = urlsplit(url).netloc.lower()
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host_limit)
+            self._host_sems[host] = sem
+        return sem
+
+    def _interval(self, url):
+        return self.intervals.get(url, self.interval)
+
+    def _next_delay(self, url):
+        """带抖动的下一次检查间隔"""
+        interval = self._interval(url)
+        if not self.jitter:
+            return interval
+        spread = interval * self.jitter
+        return max(0.0, interval + random.uniform(-spread, spread))
+
+    async def _run_check(self, url):
+        """在全局和主机并发限制下执行一次检查"""
+        async with self._global_sem:
+            async with self._host_semaphore(url):
+                self.stats['started'] += 1
+                start = time.monotonic()
+                try:
+                    if asyncio.iscoroutinefunction(self.check_func):
+                        return await self.check_func(url)
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self.executor, self.check_func, url)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.exception("检查网站出错 %s: %s", url, e)
+                finally:
+                    self.stats['finished'] += 1
+                    self.stats['total_seconds'] += time.monotonic() - start
+
+    def _dispatch(self, url):
+        """触发一次检查；上一次仍在运行（或排队）时跳过"""
+        task = self._running.get(url)
+        if task is not None and not task.done():
+            self.stats['skipped'] += 1
+            logger.info("上一次检查仍在进行，跳过本轮: %s", url)
+            return
+        self._running[url] = asyncio.ensure_future(self._run_check(url))
+
+    async def _url_loop(self, url, first_delay):
+        """单个URL的定时循环"""
+        delay = first_delay
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+                break
+            except asyncio.TimeoutError:
+                pass
+            self._dispatch(url)
+            delay = self._next_delay(url)
+
+    async def run(self, urls, run_immediately=True, duration=None):
+        """开始调度，duration为None时一直运行直到stop()"""
+        self._global_sem = asyncio.Semaphore(self.max_concurrency)
+        self._host_sems = {}
+        self._running = {}
+        self._stop_event = asyncio.Event()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        # 首轮立即检查，之后在一个间隔内随机错开
+        if run_immediately:
+            for url in urls:
+                self._dispatch(url)
+        loops = [
+            asyncio.ensure_future(self._url_loop(url, random.uniform(0, self._interval(url))))
+            for url in urls
+        ]
+
+        try:
+            if duration is None:
+                await self._stop_event.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=duration)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stop_event.set()
+            for task in loops:
+                task.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+            pending = [t for t in self._running.values() if not t.done()]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if self._own_executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        return self.stats
+
+    def stop(self):
+        """停止调度"""
+        if self._stop_event is not None:
+            self._stop_event.set()
@@ -0,0 +1,269 @@
+"""
+端到端基准测试
+==============
+在独立子进程中启动假网站和假模型服务（见 fake_servers.py），然后用真实的
+WebMonitorAgent 逐轮检查所有网站，统计：
+- 吞吐量（checks/sec）
+- 每个阶段耗时的 p50/p95/p99（来自指标事件日志）
+- 检查结果来源、模型调用和HTTP统计
+- CPU时间和内存（RSS）
+
+结果保存为JSON，可与之前版本的结果对比：
+    python benchmarks/bench_end_to_end.py --rounds 5 --concurrency 8 --output results/new.json
+    python benchmarks/bench_end_to_end.py --compare results/old.json
+可以用 --config 叠加一个配置文件（例如调整[cache]、[prefilter]、[llm]）。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeLLMServer, FakeSiteFarm, farm_urls  # noqa: E402
+
+# 对比时关注的指标：(路径, 越大越好)
+COMPARE_KEYS = [
+    (('throughput', 'checks_per_sec'), True),
+    (('stages', 'check', 'p50'), False),
+    (('stages', 'check', 'p95'), False),
+    (('stages', 'check', 'p99'), False),
+    (('model', 'api_calls'), False),
+    (('resources', 'cpu_seconds'), False),
+    (('resources', 'rss_peak_mb'), False),
+]
+
+
+def _serve(queue, options):
+    """子进程：运行假服务，把地址发回父进程"""
+    site = FakeSiteFarm(flaky_rate=options['flaky_rate'], period=options['period']).start()
+    llm = FakeLLMServer(latency=options['latency'], jitter=options['jitter'],
+                        rate_429=options['rate_429']).start()
+    queue.put((site.base_url, llm.base_url))
+    while True:
+        time.sleep(3600)
+
+
+def percentile(values, q):
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3) if values else None,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_config(path, llm_url, event_log, history):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""[silicon-flow]
+API_KEY = "benchmark"
+BASE_URL = "{llm_url}"
+REASONING_MODEL = "fake-text"
+VISUAL_MODEL = "fake-vision"
+temperature = 0.2
+
+[metrics]
+EVENT_LOG = {event_log}
+
+[history]
+PATH = {history}
+""")
+
+
+def read_events(path):
+    stages, outcomes, model_ms = {}, {}, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event['event'] == 'span':
+                stages.setdefault(event['stage'], []).append(event['ms'])
+            elif event['event'] == 'check':
+                outcomes[event['outcome']] = outcomes.get(event['outcome'], 0) + 1
+            elif event['event'] == 'model_call':
+                model_ms.append(event['ms'])
+    return stages, outcomes, model_ms
+
+
+def run(args):
+    from ai_agent import WebMonitorAgent
+
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(queue, {
+        'flaky_rate': args.flaky_rate, 'period': args.period, 'latency': args.latency,
+        'jitter': args.jitter, 'rate_429': args.rate_429,
+    }), daemon=True)
+    server.start()
+    site_url, llm_url = queue.get(timeout=30)
+    urls = farm_urls(site_url, static=args.static, heavy=args.heavy, slow=args.slow,
+                     flaky=args.flaky, changing=args.changing, slow_delay=args.slow_delay)
+
+    workdir = tempfile.mkdtemp(prefix='web_monitor_bench_')
+    event_log = os.path.join(workdir, 'events.jsonl')
+    config_file = os.path.join(workdir, 'bench.cfg')
+    write_config(config_file, llm_url, event_log, os.path.join(workdir, 'history.db'))
+
+    print(f"网站数: {len(urls)}，轮数: {args.rounds}，并发: {args.concurrency}，模型延迟: {args.latency}s")
+    cpu_start = cpu_seconds()
+    agent = WebMonitorAgent([config_file] + ([args.config] if args.config else []))
+    rss = [current_rss_mb()]
+    round_seconds = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for index in range(args.rounds):
+                round_start = time.perf_counter()
+                list(executor.map(agent.check_website, urls))
+                round_seconds.append(round(time.perf_counter() - round_start, 3))
+                rss.append(current_rss_mb())
+                print(f"第{index + 1}轮: {round_seconds[-1]:.2f}秒")
+                if args.pause and index + 1 < args.rounds:
+                    time.sleep(args.pause)
+        elapsed = time.perf_counter() - start
+        model_stats = dict(agent.ai_client.stats) if agent.ai_client is not None else {}
+        http_stats = agent.fetcher.report()
+    finally:
+        agent.close()
+        server.terminate()
+    cpu = cpu_seconds() - cpu_start
+
+    stages, outcomes, model_ms = read_events(event_log)
+    checks = len(urls) * args.rounds
+    rss = [value for value in rss if value is not None]
+    return {
+        'meta': {
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'throughput': {
+            'checks': checks,
+            'seconds': round(elapsed, 3),
+            'checks_per_sec': round(checks / elapsed, 3) if elapsed else None,
+            'round_seconds': round_seconds,
+        },
+        'stages': {name: summarize(values) for name, values in sorted(stages.items())},
+        'outcomes': outcomes,
+        'model': dict(model_stats, latency_ms=summarize(model_ms)),
+        'http': http_stats,
+        'resources': {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_percent': round(100 * cpu / elapsed, 1) if elapsed else None,
+            'rss_start_mb': round(rss[0], 1) if rss else None,
+            'rss_end_mb': round(rss[-1], 1) if rss else None,
+            # Linux上ru_maxrss单位为KB
+            'rss_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def _lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(old, new):
+    print(f"\n{'指标':<32}{'基准':>12}{'本次':>12}{'变化':>10}")
+    for path, higher_is_better in COMPARE_KEYS:
+        before, after = _lookup(old, path), _lookup(new, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        mark = '' if abs(change) < 5 else ('  ↑改善' if better else '  ↓退化')
+        print(f"{'.'.join(path):<32}{before:>12.3f}{after:>12.3f}{change:>9.1f}%{mark}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='端到端基准测试（本地假网站 + 假模型服务）')
+    parser.add_argument('--rounds', type=int, default=3, help='检查轮数')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时检查的网站数')
+    parser.add_argument('--pause', type=float, default=0, help='每轮之间的间隔（秒）')
+    parser.add_argument('--static', type=int, default=20, help='静态页面数')
+    parser.add_argument('--heavy', type=int, default=0, help='需要截图的页面数（需要浏览器）')
+    parser.add_argument('--slow', type=int, default=4, help='慢页面数')
+    parser.add_argument('--slow-delay', type=float, default=1.0, help='慢页面的响应延迟（秒）')
+    parser.add_argument('--flaky', type=int, default=4, help='不稳定页面数')
+    parser.add_argument('--flaky-rate', type=float, default=0.2, help='不稳定页面返回500的概率')
+    parser.add_argument('--changing', type=int, default=8, help='定期变化的页面数')
+    parser.add_argument('--period', type=float, default=5, help='变化页面的变化周期（秒）')
+    parser.add_argument('--latency', type=float, default=0.3, help='模型响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.1, help='模型延迟抖动（秒）')
+    parser.add_argument('--rate-429', type=float, default=0.05, help='模型返回429的概率')
+    parser.add_argument('--config', help='叠加的配置文件')
+    parser.add_argument('--label', default='', help='结果标签')
+    parser.add_argument('--output', help='结果JSON路径，默认 benchmarks/results/e2e-时间.json')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    throughput = result['throughput']
+    print(f"\n吞吐量: {throughput['checks_per_sec']} checks/sec（{throughput['checks']}次检查，{throughput['seconds']}秒）")
+    print(f"\n{'阶段':<12}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}")
+    for name, stats in result['stages'].items():
+        print(f"{name:<12}{stats['count']:>8}{stats['p50']:>12.2f}{stats['p95']:>12.2f}{stats['p99']:>12.2f}")
+    print(f"\n检查结果来源: {result['outcomes']}")
+    print(f"模型调用: {result['model'].get('api_calls')}次，重试: {result['model'].get('retries')}次")
+    print(f"资源: {result['resources']}")
+    print(f"结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
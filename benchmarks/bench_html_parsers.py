@@ -0,0 +1,121 @@
+"""
+HTML解析后端基准测试
+====================
+比较各解析后端在一批保存下来的网页上的分类耗时，并与原来的
+BeautifulSoup(html.parser) 全量解析做对照。
+
+用法：
+    python benchmarks/bench_html_parsers.py --corpus saved_pages/ --repeat 20
+不指定 --corpus 时使用内置生成的合成网页（静态页、大表格页、SPA外壳页、长文本页）。
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_classify import BACKENDS, MAX_SCRIPTS, MAX_TEXT, available_backends, get_backend  # noqa: E402
+
+
+def bs4_classify(html, max_text=MAX_TEXT, max_scripts=MAX_SCRIPTS):
+    """原来的做法：完整构建BeautifulSoup树"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    text = soup.get_text(separator='\n', strip=True)
+    if len(text) < max_text and len(soup.find_all('script')) < max_scripts:
+        return 'text', text
+    return 'complex', None
+
+
+def synthetic_corpus():
+    """生成几类典型网页"""
+    static = '<html><head><title>状态</title></head><body><h1>服务状态</h1>%s</body></html>' % (
+        ''.join('<p>服务%d: 正常</p>' % i for i in range(50))
+    )
+    table = '<html><body><table>%s</table></body></html>' % (
+        ''.join('<tr><td>%d</td><td>node-%d</td><td>OK</td><td>%d ms</td></tr>' % (i, i, i % 97)
+                for i in range(3000))
+    )
+    spa = '<html><head>%s</head><body><div id="app"></div><script>window.__STATE__=%s</script></body></html>' % (
+        ''.join('<script src="/static/chunk-%d.js"></script>' % i for i in range(30)),
+        '{"k":"%s"}' % ('x' * 2000000),
+    )
+    article = '<html><body>%s</body></html>' % (
+        ''.join('<p>%s</p>' % ('监控日志内容 ' * 40) for _ in range(2000))
+    )
+    return {'static.html': static, 'table.html': table, 'spa.html': spa, 'article.html': article}
+
+
+def load_corpus(path):
+    corpus = {}
+    for filename in sorted(glob.glob(os.path.join(path, '**', '*.htm*'), recursive=True)):
+        with open(filename, 'rb') as f:
+            corpus[os.path.relpath(filename, path)] = f.read().decode('utf-8', errors='replace')
+    return corpus
+
+
+def bench(classify, corpus, repeat):
+    """返回每个页面的中位耗时（毫秒）和分类结果"""
+    timings, kinds = {}, {}
+    for name, html in corpus.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            kind, _ = classify(html)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+        kinds[name] = kind
+    return timings, kinds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML解析后端基准测试')
+    parser.add_argument('--corpus', help='保存的网页目录（*.html）')
+    parser.add_argument('--repeat', type=int, default=10, help='每个页面重复次数')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='要测试的后端，逗号分隔')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not corpus:
+        print(f"目录中没有网页: {args.corpus}")
+        return 1
+    total_bytes = sum(len(html.encode('utf-8')) for html in corpus.values())
+    print(f"页面数: {len(corpus)}，总大小: {total_bytes / 1024 / 1024:.2f} MB，重复: {args.repeat}")
+
+    candidates = [('bs4', bs4_classify)]
+    installed = available_backends()
+    for name in args.backends.split(','):
+        name = name.strip()
+        if name in installed:
+            candidates.append((name, get_backend(name).classify))
+        else:
+            print(f"跳过未安装的后端: {name}")
+
+    results = {}
+    for name, classify in candidates:
+        try:
+            results[name] = bench(classify, corpus, args.repeat)
+        except ImportError as e:
+            print(f"跳过{name}: {e}")
+
+    baseline = results.get('bs4')
+    print(f"\n{'页面':<28}" + ''.join(f"{name:>14}" for name in results))
+    for page in corpus:
+        print(f"{page[:27]:<28}" + ''.join(f"{results[name][0][page]:>12.2f}ms" for name in results))
+    print(f"{'合计':<28}" + ''.join(f"{sum(results[name][0].values()):>12.2f}ms" for name in results))
+
+    if baseline:
+        print("\n与bs4分类结果一致率:")
+        for name, (_, kinds) in results.items():
+            same = sum(1 for page in corpus if kinds[page] == baseline[1][page])
+            print(f"  {name}: {same}/{len(corpus)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+长时间运行（soak）内存测试
+==========================
+用本地假网站和假模型服务（见 fake_servers.py）模拟长时间的监控：每一轮把所有网站检查一遍，
+代表一个检查间隔，不真正等待。例如 24 小时、每 60 秒检查一次就是 1440 轮。
+每轮结束后记录进程 RSS，去掉预热阶段后计算内存的增长趋势：
+- slope_mb_per_hour：RSS 对模拟时间做最小二乘拟合得到的斜率
+- growth_mb：斜率乘以模拟时长，即按这个趋势整段时间内的增长
+- 首尾四分之一的 RSS 中位数之差
+增长超过 --max-growth-mb 时退出码为 1，可以放在 CI 中防止内存泄漏回归：
+    python benchmarks/bench_soak.py --hours 24 --interval 60 --output results/soak.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_end_to_end import _serve, current_rss_mb, git_revision, write_config  # noqa: E402
+from fake_servers import farm_urls  # noqa: E402
+from metrics import setup_logging  # noqa: E402
+
+
+def slope(points):
+    """最小二乘斜率"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def run(args):
+    from ai_agent import WebMonitorAgent
+
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(queue, {
+        'flaky_rate': args.flaky_rate, 'period': args.period, 'latency': args.latency,
+        'jitter': 0, 'rate_429': 0,
+    }), daemon=True)
+    server.start()
+    site_url, llm_url = queue.get(timeout=30)
+    urls = farm_urls(site_url, static=args.static, heavy=args.heavy, slow=0, flaky=args.flaky,
+                     changing=args.changing)
+
+    workdir = tempfile.mkdtemp(prefix='web_monitor_soak_')
+    config_file = os.path.join(workdir, 'soak.cfg')
+    write_config(config_file, llm_url, os.devnull, os.path.join(workdir, 'history.db'))
+    with open(config_file, 'a', encoding='utf-8') as f:
+        # 假网站都在同一个主机上，不稳定页面的500会让整个主机熔断，使大部分检查直接跳过；
+        # 模拟时间被压缩，模型配额也要相应放大，否则大部分时间都在等限流
+        f.write("\n[memory]\nCHECK_INTERVAL = 0\n\n[resilience]\nENABLED = false\n"
+                "\n[llm]\nRPM = 1000000\nTPM = 1000000000\n")
+
+    rounds = max(1, int(args.hours * 3600 / args.interval))
+    print(f"网站数: {len(urls)}，模拟{args.hours}小时（每{args.interval}秒一轮，共{rounds}轮，"
+          f"{rounds * len(urls)}次检查）")
+    agent = WebMonitorAgent([config_file] + ([args.config] if args.config else []))
+    samples = [(0.0, current_rss_mb())]
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for index in range(rounds):
+                list(executor.map(agent.check_website, urls))
+                simulated_hours = (index + 1) * args.interval / 3600
+                samples.append((simulated_hours, current_rss_mb()))
+                if (index + 1) % max(1, rounds // 20) == 0:
+                    print(f"模拟{simulated_hours:6.1f}小时: RSS {samples[-1][1]:.1f}MB，"
+                          f"已用{time.perf_counter() - start:.0f}秒")
+        elapsed = time.perf_counter() - start
+        memory_report = agent.memory_guard.report()
+        http_stats = agent.fetcher.report()
+    finally:
+        agent.close()
+        server.terminate()
+
+    samples = [(x, y) for x, y in samples if y is not None]
+    steady = samples[int(len(samples) * args.warmup):]
+    quarter = max(1, len(steady) // 4)
+    trend = slope(steady)
+    growth = trend * args.hours
+    return {
+        'meta': {
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git': git_revision(),
+            'args': vars(args),
+        },
+        'checks': rounds * len(urls),
+        'seconds': round(elapsed, 1),
+        'memory': {
+            'rss_start_mb': round(samples[0][1], 1) if samples else None,
+            'rss_after_warmup_mb': round(steady[0][1], 1) if steady else None,
+            'rss_end_mb': round(samples[-1][1], 1) if samples else None,
+            'rss_max_mb': round(max(y for _, y in samples), 1) if samples else None,
+            'slope_mb_per_hour': round(trend, 4),
+            'growth_mb': round(growth, 2),
+            'quartile_delta_mb': round(median([y for _, y in steady[-quarter:]])
+                                       - median([y for _, y in steady[:quarter]]), 2) if steady else None,
+            'guard': memory_report,
+        },
+        'http': http_stats,
+        'samples': [(round(x, 3), round(y, 2)) for x, y in samples],
+        'passed': growth <= args.max_growth_mb,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='长时间运行内存测试（本地假网站 + 假模型服务）')
+    parser.add_argument('--hours', type=float, default=24, help='模拟的运行时长（小时）')
+    parser.add_argument('--interval', type=float, default=60, help='模拟的检查间隔（秒），每个间隔为一轮')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时检查的网站数')
+    parser.add_argument('--static', type=int, default=10, help='静态页面数')
+    parser.add_argument('--heavy', type=int, default=0, help='需要渲染的页面数（需要浏览器）')
+    parser.add_argument('--flaky', type=int, default=4, help='不稳定页面数')
+    parser.add_argument('--flaky-rate', type=float, default=0.2, help='不稳定页面返回500的概率')
+    parser.add_argument('--changing', type=int, default=6, help='定期变化的页面数')
+    parser.add_argument('--period', type=float, default=1, help='变化页面的变化周期（真实秒数）')
+    parser.add_argument('--latency', type=float, default=0.005, help='模型响应延迟（秒）')
+    parser.add_argument('--warmup', type=float, default=0.1, help='计算趋势时忽略的预热比例')
+    parser.add_argument('--max-growth-mb', type=float, default=20, help='允许的内存增长（MB）')
+    parser.add_argument('--config', help='叠加的配置文件')
+    parser.add_argument('--label', default='', help='结果标签')
+    parser.add_argument('--output', help='结果JSON路径，默认 benchmarks/results/soak-时间.json')
+    parser.add_argument('--log-level', default='ERROR', help='日志级别')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    result = run(args)
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"soak-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    memory = result['memory']
+    print(f"\n{result['checks']}次检查，用时{result['seconds']}秒")
+    print(f"RSS: 开始{memory['rss_start_mb']}MB，预热后{memory['rss_after_warmup_mb']}MB，"
+          f"结束{memory['rss_end_mb']}MB，最高{memory['rss_max_mb']}MB")
+    print(f"趋势: {memory['slope_mb_per_hour']}MB/小时，整段增长{memory['growth_mb']}MB，"
+          f"首尾四分之一中位数相差{memory['quartile_delta_mb']}MB")
+    print(f"{'通过' if result['passed'] else '未通过'}（允许增长{args.max_growth_mb}MB），结果已保存: {output}")
+    return 0 if result['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
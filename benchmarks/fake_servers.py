@@ -0,0 +1,235 @@
+"""
+基准测试用的本地假服务
+======================
+- FakeSiteFarm：合成网页站点
+    /static/<n>    静态小页面（支持ETag/304）
+    /heavy/<n>     大量脚本的页面（会走截图分支，需要浏览器）
+    /slow/<n>      延迟响应的页面（?delay=秒，默认1秒）
+    /flaky/<n>     按概率返回500
+    /changing/<n>  每隔period秒变化一次的页面，偶尔出现告警
+- FakeLLMServer：OpenAI兼容的 /v1/chat/completions，可配置延迟和429注入
+
+单独运行：
+    python benchmarks/fake_servers.py --site-port 8765 --llm-port 8766 --latency 0.3 --rate-429 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_SECTION_RE = re.compile(r'=== 第(\d+)部分:')
+
+
+def _page(title, body, scripts=0):
+    script_tags = ''.join(f'<script>var v{i} = {i};</script>' for i in range(scripts))
+    return f'<html><head><title>{title}</title>{script_tags}</head><body><h1>{title}</h1>{body}</body></html>'
+
+
+def farm_urls(base_url, static=10, heavy=0, slow=2, flaky=2, changing=4, slow_delay=1.0):
+    """按类型生成假网站的URL列表"""
+    urls = [f"{base_url}/static/{i}" for i in range(static)]
+    urls += [f"{base_url}/heavy/{i}" for i in range(heavy)]
+    urls += [f"{base_url}/slow/{i}?delay={slow_delay}" for i in range(slow)]
+    urls += [f"{base_url}/flaky/{i}" for i in range(flaky)]
+    urls += [f"{base_url}/changing/{i}" for i in range(changing)]
+    return urls
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        farm = self.server.farm
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        kind, _, index = parts.path.strip('/').partition('/')
+        farm.hits[kind] = farm.hits.get(kind, 0) + 1
+        index = int(index or 0)
+
+        if kind == 'static':
+            html = _page(f'静态页面{index}', ''.join(f'<p>服务{i}: 正常</p>' for i in range(30)))
+        elif kind == 'heavy':
+            html = _page(f'控制台{index}', '<div id="app"></div>', scripts=30)
+        elif kind == 'slow':
+            time.sleep(float(query.get('delay', [1])[0]))
+            html = _page(f'慢页面{index}', '<p>状态: 正常</p>')
+        elif kind == 'flaky':
+            if farm.random.random() < farm.flaky_rate:
+                self._send(500, b'internal error')
+                return
+            html = _page(f'不稳定页面{index}', '<p>状态: 正常</p>')
+        elif kind == 'changing':
+            epoch = int(time.time() // farm.period)
+            state = '严重告警: 磁盘空间不足' if (epoch + index) % 5 == 0 else '状态: 正常'
+            html = _page(f'变化页面{index}', f'<p>第{epoch}轮</p><p>{state}</p>')
+        else:
+            self._send(404, b'not found')
+            return
+
+        body = html.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, headers={'ETag': etag})
+            return
+        self._send(200, body, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag})
+
+
+class FakeSiteFarm:
+    """合成网页站点"""
+
+    def __init__(self, host='127.0.0.1', port=0, flaky_rate=0.2, period=30, seed=0):
+        self.flaky_rate = flaky_rate
+        self.period = period
+        self.random = random.Random(seed)
+        self.hits = {}
+        self.server = ThreadingHTTPServer((host, port), _SiteHandler)
+        self.server.daemon_threads = True
+        self.server.farm = self
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self, **counts):
+        return farm_urls(self.base_url, **counts)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-site', daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _verdict(text):
+    # 提示词本身包含“告警”等字样，这里只识别合成页面中的告警文本；按提示词要求回复JSON
+    if '严重告警' in text:
+        verdict = {'status': '异常', 'alerts': [{'severity': '严重', 'content': '磁盘空间不足',
+                                                'cause': '日志文件增长过快', 'action': '清理磁盘或扩容'}]}
+    else:
+        verdict = {'status': '正常', 'alerts': []}
+    return json.dumps(verdict, ensure_ascii=False)
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        llm = self.server.llm
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with llm.lock:
+            llm.calls += 1
+            throttled = llm.random.random() < llm.rate_429
+            if throttled:
+                llm.throttled += 1
+        if throttled:
+            self._json(429, {'error': {'message': 'rate limited'}}, {'Retry-After': str(llm.retry_after)})
+            return
+        time.sleep(max(0.0, llm.latency + llm.random.uniform(-llm.jitter, llm.jitter)))
+
+        prompt = str(request.get('messages', [{}])[-1].get('content', ''))
+        sections = _SECTION_RE.findall(prompt)
+        if sections:
+            # 打包请求：按提示词要求回复以部分编号为键的JSON对象
+            chunks = _SECTION_RE.split(prompt)[2::2]
+            text = json.dumps({n: json.loads(_verdict(chunk)) for n, chunk in zip(sections, chunks)},
+                              ensure_ascii=False)
+        else:
+            text = _verdict(prompt)
+        prompt_tokens = max(1, len(prompt) // 2)
+        self._json(200, {
+            'id': f'fake-{llm.calls}', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': text}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 20, 'total_tokens': prompt_tokens + 20},
+        })
+
+
+class FakeLLMServer:
+    """OpenAI兼容的模拟模型服务"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.3, jitter=0.1, rate_429=0.0, retry_after=0.5, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.server = ThreadingHTTPServer((host, port), _LLMHandler)
+        self.server.daemon_threads = True
+        self.server.llm = self
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-llm', daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动假网站和假模型服务')
+    parser.add_argument('--site-port', type=int, default=8765)
+    parser.add_argument('--llm-port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.3, help='模型响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.1, help='模型延迟抖动（秒）')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='返回429的概率')
+    parser.add_argument('--flaky-rate', type=float, default=0.2, help='/flaky 返回500的概率')
+    parser.add_argument('--period', type=float, default=30, help='/changing 页面的变化周期（秒）')
+    args = parser.parse_args()
+
+    site = FakeSiteFarm(port=args.site_port, flaky_rate=args.flaky_rate, period=args.period).start()
+    llm = FakeLLMServer(port=args.llm_port, latency=args.latency, jitter=args.jitter, rate_429=args.rate_429).start()
+    print(f"假网站: {site.base_url}")
+    print(f"假模型: {llm.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.close()
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
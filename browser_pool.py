@@ -0,0 +1,337 @@
+"""
+常驻无头浏览器池
+================
+避免每次截图都启动一个新的Chromium进程：
+- 预热N个浏览器进程，每个浏览器提供若干可复用的无痕上下文/页面
+- 健康检查，浏览器崩溃后自动重启
+- 每个浏览器服务K个页面后回收重启，限制内存泄漏；内存超过预算时也可以随时要求全部回收（recycle）
+- 所有页面都忙时排队等待（背压），超时报错
+- 自动查找Chrome/Chromium可执行文件（Linux/macOS/Windows）
+
+浏览器池运行在独立的事件循环线程上，同步代码通过 run() 提交协程。
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import threading
+from contextlib import asynccontextmanager
+
+from pyppeteer import launch
+
+from loop_thread import LoopThread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LAUNCH_ARGS = [
+    '--window-size=1920,1080',
+    '--ignore-certificate-errors',
+    '--allow-running-insecure-content',
+    '--disable-extensions',
+    '--disable-popup-blocking',
+    '--disable-default-apps',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+]
+
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+# 常见的Chrome/Chromium安装位置
+_CHROME_NAMES = [
+    'google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome',
+]
+_CHROME_PATHS = {
+    'linux': [
+        '/usr/bin/google-chrome',
+        '/usr/bin/google-chrome-stable',
+        '/usr/bin/chromium',
+        '/usr/bin/chromium-browser',
+        '/snap/bin/chromium',
+        '/opt/google/chrome/chrome',
+    ],
+    'darwin': [
+        '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+        '/Applications/Chromium.app/Contents/MacOS/Chromium',
+    ],
+    'win32': [
+        r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+        r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+    ],
+}
+
+
+def find_chrome_executable(preferred=None):
+    """查找Chrome可执行文件，找不到时返回None（由pyppeteer使用自带的Chromium）"""
+    candidates = [preferred, os.environ.get('CHROME_PATH'), os.environ.get('PUPPETEER_EXECUTABLE_PATH')]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return path
+
+    for name in _CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+
+    platform = 'linux' if sys.platform.startswith('linux') else sys.platform
+    for path in _CHROME_PATHS.get(platform, []):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class _BrowserSlot:
+    """池中的一个浏览器进程及其空闲页面"""
+
+    def __init__(self, index):
+        self.index = index
+        self.browser = None
+        self.idle_pages = []
+        self.in_use = 0
+        self.pages_served = 0
+        self.retiring = False
+        self.lock = asyncio.Lock()
+
+    def is_alive(self):
+        """进程和调试连接是否都还在"""
+        if self.browser is None:
+            return False
+        process = getattr(self.browser, 'process', None)
+        if process is not None and process.poll() is not None:
+            return False
+        connection = getattr(self.browser, '_connection', None)
+        if connection is not None and not getattr(connection, '_connected', True):
+            return False
+        return True
+
+
+class BrowserPool:
+    """常驻浏览器池"""
+
+    def __init__(self, size=2, pages_per_browser=4, max_pages_per_browser=200,
+                 executable_path=None, launch_args=None, viewport=None,
+                 acquire_timeout=60, health_check_interval=30):
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.max_pages_per_browser = max_pages_per_browser
+        self.executable_path = find_chrome_executable(executable_path)
+        self.launch_args = list(launch_args or DEFAULT_LAUNCH_ARGS)
+        self.viewport = viewport or DEFAULT_VIEWPORT
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.stats = {'launches': 0, 'restarts': 0, 'recycles': 0, 'pages_served': 0, 'waits': 0}
+
+        self._slots = []
+        self._sem = None
+        self._health_task = None
+        self._loop_thread = LoopThread('browser-pool')
+        self._start_lock = threading.Lock()
+
+    # ---------- 事件循环线程 ----------
+
+    def start(self):
+        """启动浏览器池所在的事件循环线程（幂等）"""
+        with self._start_lock:
+            if self._loop_thread.start():
+                self._loop_thread.run(self._setup())
+
+    async def _setup(self):
+        self._sem = asyncio.Semaphore(self.size * self.pages_per_browser)
+        self._slots = [_BrowserSlot(i) for i in range(self.size)]
+        self._health_task = asyncio.ensure_future(self._health_loop())
+
+    def run(self, coro, timeout=None):
+        """在浏览器池的事件循环中运行协程并同步等待结果"""
+        self.start()
+        return self._loop_thread.run(coro, timeout)
+
+    async def run_async(self, coro):
+        """在其它事件循环中等待浏览器池中的协程"""
+        self.start()
+        return await self._loop_thread.run_async(coro)
+
+    # ---------- 浏览器管理 ----------
+
+    async def _launch(self, slot):
+        """启动（或重启）一个浏览器进程"""
+        options = {
+            'headless': True,
+            'args': self.launch_args,
+            # 不在主线程，不能注册信号处理
+            'handleSIGINT': False,
+            'handleSIGTERM': False,
+            'handleSIGHUP': False,
+        }
+        if self.executable_path:
+            options['executablePath'] = self.executable_path
+        slot.browser = await launch(**options)
+        slot.idle_pages = []
+        slot.pages_served = 0
+        slot.retiring = False
+        self.stats['launches'] += 1
+
+    async def _close_browser(self, slot):
+        """关闭浏览器进程，忽略已崩溃进程的错误；空出的slot不再处于回收中，可以重新分配"""
+        browser, slot.browser = slot.browser, None
+        slot.idle_pages = []
+        slot.retiring = False
+        if browser is None:
+            return
+        try:
+            await asyncio.wait_for(browser.close(), timeout=10)
+        except Exception:
+            process = getattr(browser, 'process', None)
+            if process is not None and process.poll() is None:
+                process.kill()
+
+    async def _ensure_browser(self, slot):
+        """保证slot中有一个健康的浏览器"""
+        if slot.is_alive():
+            return
+        if slot.browser is not None:
+            logger.warning("浏览器%d已失效，正在重启...", slot.index)
+            self.stats['restarts'] += 1
+            await self._close_browser(slot)
+        await self._launch(slot)
+
+    async def _new_page(self, slot):
+        """在独立的无痕上下文中创建页面"""
+        context = await slot.browser.createIncognitoBrowserContext()
+        page = await context.newPage()
+        await page.setViewport(self.viewport)
+        return context, page
+
+    async def _health_loop(self):
+        """定期检查空闲浏览器是否还能响应"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for slot in self._slots:
+                if slot.browser is None or slot.in_use:
+                    continue
+                async with slot.lock:
+                    try:
+                        if not slot.is_alive():
+                            raise RuntimeError('process exited')
+                        await asyncio.wait_for(slot.browser.version(), timeout=5)
+                    except Exception as e:
+                        logger.warning("浏览器%d健康检查失败: %s", slot.index, e)
+                        self.stats['restarts'] += 1
+                        await self._close_browser(slot)
+
+    def _pick_slot(self):
+        """选择负载最低、未在回收中的浏览器"""
+        candidates = [s for s in self._slots if not s.retiring] or self._slots
+        return min(candidates, key=lambda s: s.in_use)
+
+    # ---------- 页面借还 ----------
+
+    async def acquire(self):
+        """借出一个页面，所有页面都忙时等待"""
+        if self._sem.locked():
+            self.stats['waits'] += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"浏览器池繁忙，{self.acquire_timeout}秒内没有空闲页面")
+
+        slot = self._pick_slot()
+        try:
+            async with slot.lock:
+                await self._ensure_browser(slot)
+                if slot.idle_pages:
+                    context, page = slot.idle_pages.pop()
+                else:
+                    context, page = await self._new_page(slot)
+                slot.in_use += 1
+                slot.pages_served += 1
+                self.stats['pages_served'] += 1
+                if slot.pages_served >= self.max_pages_per_browser:
+                    slot.retiring = True
+        except Exception:
+            self._sem.release()
+            raise
+        return slot, context, page
+
+    async def release(self, slot, context, page, reusable=True):
+        """归还页面；出错的页面直接丢弃，达到回收阈值的浏览器在空闲后重启"""
+        try:
+            async with slot.lock:
+                slot.in_use -= 1
+                if reusable and slot.is_alive() and not slot.retiring:
+                    try:
+                        await page.goto('about:blank')
+                        slot.idle_pages.append((context, page))
+                        return
+                    except Exception:
+                        pass
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+                if slot.retiring and slot.in_use == 0:
+                    logger.info("浏览器%d已服务%d个页面，回收重启", slot.index, slot.pages_served)
+                    self.stats['recycles'] += 1
+                    await self._close_browser(slot)
+        finally:
+            self._sem.release()
+
+    @asynccontextmanager
+    async def page(self):
+        """async with pool.page() as page: ..."""
+        slot, context, page = await self.acquire()
+        reusable = True
+        try:
+            yield page
+        except BaseException:
+            reusable = False
+            raise
+        finally:
+            await self.release(slot, context, page, reusable)
+
+    async def warm_up(self):
+        """预先启动所有浏览器"""
+        for slot in self._slots:
+            async with slot.lock:
+                await self._ensure_browser(slot)
+
+    async def _recycle_all(self):
+        for slot in self._slots:
+            async with slot.lock:
+                if slot.browser is None:
+                    continue
+                # 忙碌的浏览器在最后一个页面归还后重启，空闲的立即关闭，下次借页面时重新启动
+                slot.retiring = True
+                if slot.in_use == 0:
+                    self.stats['recycles'] += 1
+                    await self._close_browser(slot)
+
+    def recycle(self, timeout=30):
+        """回收重启所有浏览器（内存超过预算时）"""
+        if self._loop_thread.running:
+            self._loop_thread.run(self._recycle_all(), timeout=timeout)
+
+    def browser_pids(self):
+        """当前各浏览器主进程的pid"""
+        pids = []
+        for slot in self._slots:
+            process = getattr(slot.browser, 'process', None) if slot.browser is not None else None
+            if process is not None:
+                pids.append(process.pid)
+        return pids
+
+    async def _close_all(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for slot in self._slots:
+            await self._close_browser(slot)
+
+    def close(self):
+        """关闭所有浏览器并停止事件循环线程"""
+        if not self._loop_thread.running:
+            return
+        try:
+            self._loop_thread.run(self._close_all(), timeout=30)
+        finally:
+            self._loop_thread.stop()
@@ -0,0 +1,287 @@
+"""
+命令行入口
+==========
+    python cli.py run --targets targets.json                       监控目标文件中的网站（默认自适应间隔）
+    python cli.py check-once --url http://example.com              检查一次后退出（适合cron）
+    python cli.py bench --rounds 5 --output results/new.json       端到端基准测试
+    python cli.py local --workers 4 --urls-file urls.txt          本机协调者 + 4个工作进程
+    python cli.py coordinator --db /var/lib/monitor/queue.db --urls-file urls.txt
+    python cli.py worker --db /var/lib/monitor/queue.db [--id w0] [--targets targets.json]  在同一台机器上单独启动工作进程
+    python cli.py history --url http://example.com --last 20       查询检查历史
+    python cli.py history --alerts --since 24h
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from metrics import setup_logging
+from targets import TargetsError, load_targets, target_intervals
+
+# 只在用到的子命令里导入 ai_agent / sharding 等模块，保证短时任务启动快
+
+
+def load_urls(args):
+    """合并 --targets、--url 和 --urls-file（每行一个URL，#开头为注释）"""
+    urls = [target.url for target in args.target_list] if getattr(args, 'target_list', None) else []
+    urls += list(args.url or [])
+    if args.urls_file:
+        with open(args.urls_file, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    urls.append(line)
+    return list(dict.fromkeys(urls))
+
+
+def load_intervals(args, urls):
+    """每个URL的检查间隔：目标文件中的interval，否则为 --interval"""
+    return target_intervals(args.target_list or (), urls, args.interval)
+
+
+def _add_queue_args(parser):
+    parser.add_argument('--db', default='work_queue.db', help='本机队列文件（SQLite，不能放在网络文件系统上多机共享）')
+    parser.add_argument('--config', default='secret.cfg', help='配置文件')
+    parser.add_argument('--lease-ttl', type=float, default=120, help='租约时长（秒）')
+    parser.add_argument('--heartbeat-timeout', type=float, default=30, help='心跳超时（秒）')
+
+
+def _add_target_args(parser):
+    parser.add_argument('--targets', help='监控目标文件（JSON，安装PyYAML后也支持YAML）')
+    parser.add_argument('--url', action='append', help='监控的URL，可重复')
+    parser.add_argument('--urls-file', help='URL列表文件')
+    parser.add_argument('--interval', type=float, default=60, help='检查间隔（秒）')
+
+
+def _create_agent(args):
+    from ai_agent import WebMonitorAgent
+    return WebMonitorAgent(args.config, targets=args.target_list)
+
+
+def cmd_run(args):
+    urls = load_urls(args)
+    if not urls:
+        sys.exit("没有监控目标，请使用 --targets、--url 或 --urls-file")
+    agent = _create_agent(args)
+    try:
+        agent.start_monitoring(urls, interval=args.interval, mode=args.mode,
+                               max_concurrency=args.concurrency, per_host_limit=args.per_host)
+    finally:
+        agent.close()
+    # 内存超过上限时以3退出，交给systemd等按退出码重启
+    return 3 if agent.memory_exceeded else 0
+
+
+def cmd_check_once(args):
+    """每个网站检查一次；有告警时返回1，有网站检查失败时返回2"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    urls = load_urls(args)
+    if not urls:
+        sys.exit("没有监控目标，请使用 --targets、--url 或 --urls-file")
+    agent = _create_agent(args)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+            results = list(executor.map(agent.check_website, urls))
+    finally:
+        agent.close()
+    alerts = errors = 0
+    for url, result in zip(urls, results):
+        observation = agent.last_observation(url)
+        if observation is None or observation.error:
+            errors += 1
+            status = '失败'
+        elif observation.alert:
+            alerts += 1
+            status = '告警'
+        else:
+            status = '正常'
+        print(f"[{status}] {url}")
+        if result and (args.full or status != '正常'):
+            print('    ' + result.replace('\n', '\n    '))
+    print(f"共{len(urls)}个网站：告警{alerts}个，失败{errors}个")
+    return 2 if errors else (1 if alerts else 0)
+
+
+def cmd_bench(args):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+    from bench_end_to_end import main as bench_main
+    return bench_main(args.bench_args)
+
+
+def cmd_local(args):
+    from sharding import QueueHostError, run_local
+    urls = load_urls(args)
+    if not urls:
+        sys.exit("没有监控目标，请使用 --targets、--url 或 --urls-file")
+    # 协调者按目标文件中的间隔排期，工作进程读取同一个目标文件中的其它参数
+    try:
+        run_local(args.db, load_intervals(args, urls), interval=args.interval, workers=args.workers,
+                  config_file=args.config, lease_ttl=args.lease_ttl, heartbeat_timeout=args.heartbeat_timeout,
+                  targets_file=args.targets)
+    except QueueHostError as e:
+        sys.exit(str(e))
+
+
+def cmd_coordinator(args):
+    from sharding import Coordinator, QueueHostError
+    urls = load_urls(args)
+    if not urls:
+        sys.exit("没有监控目标，请使用 --targets、--url 或 --urls-file")
+    try:
+        coordinator = Coordinator(args.db, heartbeat_timeout=args.heartbeat_timeout)
+    except QueueHostError as e:
+        sys.exit(str(e))
+    coordinator.set_targets(load_intervals(args, urls))
+    coordinator.run()
+
+
+def cmd_worker(args):
+    from sharding import QueueHostError, Worker
+    try:
+        worker = Worker(args.db, args.id, args.config, lease_ttl=args.lease_ttl, batch_size=args.batch,
+                        targets_file=args.targets)
+    except QueueHostError as e:
+        sys.exit(str(e))
+    worker.run()
+
+
+def cmd_status(args):
+    from sharding import QueueHostError, WorkQueue
+    try:
+        queue = WorkQueue(args.db)
+    except QueueHostError as e:
+        sys.exit(str(e))
+    print(f"存活工作进程: {queue.live_workers(args.heartbeat_timeout)}")
+    for shard, total, leased, last_checked in queue.summary():
+        print(f"分片 {shard}: 目标{total}个，检查中{leased or 0}个，最近检查时间 {last_checked}")
+    queue.close()
+
+
+def parse_duration(value):
+    """'90'、'30m'、'24h'、'7d' -> 秒"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _print_checks(rows, as_json, full):
+    if as_json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    for row in rows:
+        elapsed = f"{row['elapsed_ms']:.0f}ms" if row['elapsed_ms'] is not None else '-'
+        print(f"{row['time']}  {row['verdict'] or '':<8} {row['severity'] or '':<2}  {row['outcome']:<16} {elapsed:>8}  {row['url']}")
+        if full and row['report']:
+            print('    ' + row['report'].replace('\n', '\n    '))
+
+
+def cmd_history(args):
+    from history import HistoryStore
+    store = HistoryStore(args.db)
+    try:
+        if args.prune:
+            deleted = store.prune(retention_days=args.retention_days, max_rows_per_url=args.max_rows)
+            store.compact()
+            print(f"已清理{deleted}条记录")
+        elif args.alerts:
+            since = time.time() - parse_duration(args.since) if args.since else None
+            _print_checks(store.alerts(since=since, url=args.url, limit=args.last), args.json, args.full)
+        elif args.url:
+            _print_checks(store.last_results(args.url, args.last), args.json, args.full)
+        else:
+            for url, total, alerts, last_ts in store.summary():
+                last = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_ts))
+                print(f"{url}  检查{total}次，告警{alerts or 0}次，最近检查 {last}")
+    finally:
+        store.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='AI网站监控')
+    parser.add_argument('--log-level', default='INFO', help='日志级别（DEBUG/INFO/WARNING）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='持续监控')
+    run.add_argument('--config', default='secret.cfg', help='配置文件')
+    _add_target_args(run)
+    run.add_argument('--mode', choices=('serial', 'async', 'adaptive'), default='adaptive', help='调度方式')
+    run.add_argument('--concurrency', type=int, default=20, help='同时检查的网站数（async/adaptive）')
+    run.add_argument('--per-host', type=int, default=2, help='每个主机同时检查的网站数（async/adaptive）')
+    run.set_defaults(func=cmd_run)
+
+    check_once = sub.add_parser('check-once', help='每个网站检查一次后退出（有告警时退出码为1，失败为2）')
+    check_once.add_argument('--config', default='secret.cfg', help='配置文件')
+    _add_target_args(check_once)
+    check_once.add_argument('--concurrency', type=int, default=4, help='同时检查的网站数')
+    check_once.add_argument('--full', action='store_true', help='正常的网站也显示分析结果')
+    check_once.set_defaults(func=cmd_check_once)
+
+    bench = sub.add_parser('bench', help='端到端基准测试，其余参数透传给 benchmarks/bench_end_to_end.py',
+                           add_help=False)
+    bench.set_defaults(func=cmd_bench)
+
+    local = sub.add_parser('local', help='本机启动协调者和多个工作进程')
+    _add_queue_args(local)
+    _add_target_args(local)
+    local.add_argument('--workers', type=int, default=4, help='工作进程数')
+    local.set_defaults(func=cmd_local)
+
+    coordinator = sub.add_parser('coordinator', help='只运行协调者（与工作进程在同一台机器上）')
+    _add_queue_args(coordinator)
+    _add_target_args(coordinator)
+    coordinator.set_defaults(func=cmd_coordinator)
+
+    worker = sub.add_parser('worker', help='只运行一个工作进程')
+    _add_queue_args(worker)
+    worker.add_argument('--id', help='工作进程ID，默认 主机名-进程号')
+    worker.add_argument('--batch', type=int, default=4, help='每次领取的目标数')
+    worker.add_argument('--targets', help='监控目标文件，与协调者使用同一份（默认为配置文件[targets]节的FILE）')
+    worker.set_defaults(func=cmd_worker)
+
+    status = sub.add_parser('status', help='查看队列和分片状态')
+    _add_queue_args(status)
+    status.set_defaults(func=cmd_status)
+
+    history = sub.add_parser('history', help='查询检查历史')
+    history.add_argument('--db', default='check_history.db', help='历史文件（[history]节的PATH）')
+    history.add_argument('--url', help='只看某个URL')
+    history.add_argument('--last', type=int, default=20, help='最多显示的条数')
+    history.add_argument('--alerts', action='store_true', help='只看告警')
+    history.add_argument('--since', help='告警的时间窗口，如 30m、24h、7d')
+    history.add_argument('--full', action='store_true', help='显示报告全文')
+    history.add_argument('--json', action='store_true', help='每行输出一条JSON')
+    history.add_argument('--prune', action='store_true', help='按保留策略清理并压缩')
+    history.add_argument('--retention-days', type=float, default=30, help='清理时保留的天数')
+    history.add_argument('--max-rows', type=int, default=10000, help='清理时每个URL保留的条数')
+    history.set_defaults(func=cmd_history)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        args.bench_args = extra
+    elif extra:
+        parser.error(f"无法识别的参数: {' '.join(extra)}")
+    setup_logging(args.log_level)
+    # 目标文件在启动时整体校验，有错误时列出全部问题后退出
+    try:
+        args.target_list = load_targets(args.targets) if getattr(args, 'targets', None) else None
+    except (OSError, TargetsError) as e:
+        sys.exit(str(e))
+    try:
+        return args.func(args) or 0
+    except KeyboardInterrupt:
+        print("\n已停止")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
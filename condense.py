@@ -0,0 +1,181 @@
+"""
+长页面文本压缩
+==============
+代替原来的 text[:3000] 截断：页面后半部分的错误横幅不会被截掉，页眉、导航等无用内容也不再占用token。
+文本超出token预算时：
+- 去掉连续多次检查都原样出现、且不含告警关键词的行（页眉、导航、页脚等）
+- 结构相同只有数字不同的表格行只保留第一行，含告警关键词的行始终保留
+- 按相关性给每行打分：命中告警关键词/规则 > 与上次检查相比新出现的行 > 关键词行的上下文 > 页面开头 > 其它
+- 按分数从高到低装入token预算，再按原顺序输出，被省略的部分用“……”标出
+token数使用真实的分词器计算（安装了tiktoken时），否则按字符估算。
+"""
+
+import logging
+import re
+import threading
+from collections import namedtuple
+
+from analysis_service import estimate_text_tokens
+from prefilter import KeywordMatcher
+from result_cache import DEFAULT_VOLATILE_PATTERNS, compile_patterns
+
+logger = logging.getLogger(__name__)
+
+Condensed = namedtuple('Condensed', [
+    'text',             # 压缩后的文本
+    'tokens',           # 压缩后的token数
+    'original_tokens',  # 原文的token数
+    'lines',            # 保留的行数
+    'total_lines',      # 原文的行数
+    'boilerplate',      # 去掉的重复出现的行数
+    'duplicates',       # 合并掉的相似表格行数
+])
+
+GAP = '……'
+
+# 行分数
+SCORE_ALERT = 100
+SCORE_CHANGED = 50
+SCORE_CONTEXT = 30
+SCORE_HEAD = 20
+SCORE_OTHER = 1
+
+_DIGITS = re.compile(r'\d+(?:\.\d+)?')
+
+
+class TokenCounter:
+    """token计数：安装了tiktoken时使用真实分词，否则按字符估算"""
+
+    def __init__(self, encoding='cl100k_base'):
+        self._encoding = None
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding)
+        except ImportError:
+            logger.debug("未安装tiktoken，按字符估算token数")
+        except Exception as e:
+            # 分词表需要下载，离线环境下可能失败
+            logger.warning("加载分词器%s失败，按字符估算token数: %s", encoding, e)
+
+    @property
+    def exact(self):
+        return self._encoding is not None
+
+    def count(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_text_tokens(text)
+
+
+class Condenser:
+    """按token预算压缩页面文本，记录每个URL各行连续出现的次数"""
+
+    def __init__(self, token_budget=1500, keywords=(), regexes=(), boilerplate_checks=3, context_lines=1,
+                 head_lines=3, volatile_patterns=None, counter=None):
+        self.token_budget = token_budget
+        self.matcher = KeywordMatcher(keywords)
+        self.regexes = [re.compile(r, re.IGNORECASE) for r in regexes]
+        self.boilerplate_checks = boilerplate_checks
+        self.context_lines = context_lines
+        self.head_lines = head_lines
+        self.volatile_patterns = volatile_patterns or compile_patterns(DEFAULT_VOLATILE_PATTERNS)
+        self.counter = counter or TokenCounter()
+        self.stats = {'condensed': 0, 'passed': 0, 'tokens_in': 0, 'tokens_out': 0}
+        self._streaks = {}
+        self._lock = threading.Lock()
+
+    def _normalize(self, line):
+        for pattern in self.volatile_patterns:
+            line = pattern.sub('#', line)
+        return line
+
+    def _is_alert(self, line):
+        return bool(self.matcher.find(line)) or any(r.search(line) for r in self.regexes)
+
+    def _update_streaks(self, url, keys):
+        """更新各行连续出现的次数，返回更新前的记录（第一次检查时为None）"""
+        with self._lock:
+            previous = self._streaks.get(url)
+            self._streaks[url] = {key: (previous or {}).get(key, 0) + 1 for key in keys}
+        return previous
+
+    def condense(self, url, text):
+        """压缩页面文本，返回Condensed；未超出预算时原样返回"""
+        lines = [line.strip() for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        keys = [self._normalize(line) for line in lines]
+        previous = self._update_streaks(url, set(keys))
+
+        original_tokens = self.counter.count(text)
+        self.stats['tokens_in'] += original_tokens
+        if original_tokens <= self.token_budget:
+            self.stats['passed'] += 1
+            self.stats['tokens_out'] += original_tokens
+            return Condensed(text, original_tokens, original_tokens, len(lines), len(lines), 0, 0)
+
+        alerts = [self._is_alert(line) for line in lines]
+        scores = [None] * len(lines)
+        boilerplate = duplicates = 0
+        shapes = set()
+        for index, (line, key, alert) in enumerate(zip(lines, keys, alerts)):
+            if alert:
+                scores[index] = SCORE_ALERT
+                continue
+            # 连续多次检查都出现过的行视为页面框架
+            if previous is not None and previous.get(key, 0) >= self.boilerplate_checks:
+                boilerplate += 1
+                continue
+            # 只有数字不同的表格行只保留第一行
+            shape = _DIGITS.sub('#', key)
+            if shape in shapes:
+                duplicates += 1
+                continue
+            shapes.add(shape)
+            if previous is not None and key not in previous:
+                scores[index] = SCORE_CHANGED
+            elif index < self.head_lines:
+                scores[index] = SCORE_HEAD
+            else:
+                scores[index] = SCORE_OTHER
+        for index, alert in enumerate(alerts):
+            if not alert:
+                continue
+            for neighbor in range(max(0, index - self.context_lines), min(len(lines), index + self.context_lines + 1)):
+                if scores[neighbor] is not None and scores[neighbor] < SCORE_CONTEXT:
+                    scores[neighbor] = SCORE_CONTEXT
+
+        selected = {}
+        remaining = self.token_budget
+        gap_tokens = self.counter.count(GAP + '\n')
+        for index in sorted((i for i, s in enumerate(scores) if s is not None), key=lambda i: (-scores[i], i)):
+            # 为省略标记预留空间
+            cost = self.counter.count(lines[index] + '\n') + gap_tokens
+            if cost <= remaining:
+                selected[index] = lines[index]
+                remaining -= cost
+            elif scores[index] >= SCORE_ALERT and remaining > gap_tokens * 4:
+                # 超长的告警行截断后保留
+                keep = max(1, len(lines[index]) * (remaining - gap_tokens) // cost)
+                selected[index] = lines[index][:keep]
+                remaining -= self.counter.count(selected[index] + '\n') + gap_tokens
+            if remaining <= gap_tokens:
+                break
+
+        output = []
+        last = -1
+        for index in sorted(selected):
+            if index != last + 1:
+                output.append(GAP)
+            output.append(selected[index])
+            last = index
+        if last != len(lines) - 1:
+            output.append(GAP)
+        condensed = '\n'.join(output)
+        tokens = self.counter.count(condensed)
+        self.stats['condensed'] += 1
+        self.stats['tokens_out'] += tokens
+        return Condensed(condensed, tokens, original_tokens, len(selected), len(lines), boilerplate, duplicates)
+
+    def forget(self, url):
+        with self._lock:
+            self._streaks.pop(url, None)
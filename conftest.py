@@ -0,0 +1,25 @@
+"""
+pytest公共夹具
+"""
+
+import pytest
+
+
+@pytest.fixture
+def make_agent(tmp_path):
+    """用临时配置创建WebMonitorAgent：不连接模型，不写历史和指标文件"""
+    from ai_agent import WebMonitorAgent
+
+    agents = []
+
+    def factory(extra=''):
+        config_file = tmp_path / 'test.cfg'
+        config_file.write_text("[history]\nENABLED = false\n\n[memory]\nCHECK_INTERVAL = 0\n\n" + extra,
+                               encoding='utf-8')
+        agent = WebMonitorAgent(str(config_file))
+        agents.append(agent)
+        return agent
+
+    yield factory
+    for agent in agents:
+        agent.close()
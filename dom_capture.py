@@ -0,0 +1,190 @@
+"""
+DOM文字提取
+===========
+复杂网页渲染完成后不再一律整页截图，而是在页面中用 page.evaluate 提取渲染后的文字：
+- 没有配置选择器时提取整个页面（body）的文字，配置了CSS选择器/XPath时只提取这些元素的文字
+- 提取前用MutationObserver观察这些元素，等它们停止变化（最多observe_ms）再读取
+- 与该URL上一次的快照比较，文字和视觉信号都没有变化时可以直接复用上次的分析结果
+- 只有配置了视觉信号（canvas图表、用颜色表示状态的指示灯等只能看图的元素）时才截图，
+  截图只包含这些元素所在的区域，提取到的文字一并交给视觉模型
+
+提取文字比截图编码和视觉模型调用便宜几个数量级。
+"""
+
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+CAPTURES = ('dom', 'screenshot')
+
+DomSnapshot = namedtuple('DomSnapshot', [
+    'texts',      # [(选择器/XPath, 文字)]，没有配置选择器时为 [('body', 整页文字)]
+    'missing',    # 页面中没有找到的选择器/XPath
+    'visual',     # 视觉信号元素的特征（位置、颜色、canvas内容哈希等），用于判断是否变化
+    'clip',       # 视觉信号元素所在区域 {'x','y','width','height'}，没有找到元素时为None
+    'mutations',  # 观察期间被监控元素发生的变化次数
+])
+
+# 在页面中提取文字：先等被监控的元素静默quietMs（最多observeMs），再读取文字和视觉特征
+_EXTRACT_JS = """async (selectors, xpaths, visualSelectors, observeMs, quietMs, maxChars) => {
+    const entries = [];
+    const missing = [];
+    for (const selector of selectors) {
+        const nodes = Array.from(document.querySelectorAll(selector));
+        if (nodes.length) entries.push([selector, nodes]); else missing.push(selector);
+    }
+    for (const xpath of xpaths) {
+        const nodes = [];
+        try {
+            const result = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+        } catch (e) {}
+        if (nodes.length) entries.push([xpath, nodes]); else missing.push(xpath);
+    }
+    if (!selectors.length && !xpaths.length && document.body) entries.push(['body', [document.body]]);
+    const visualNodes = [];
+    for (const selector of visualSelectors) {
+        visualNodes.push(...document.querySelectorAll(selector));
+    }
+
+    let mutations = 0;
+    const watched = entries.flatMap(entry => entry[1]).concat(visualNodes);
+    if (observeMs > 0 && watched.length) {
+        await new Promise(resolve => {
+            let timer = null;
+            const observer = new MutationObserver(records => {
+                mutations += records.length;
+                clearTimeout(timer);
+                timer = setTimeout(done, quietMs);
+            });
+            const limit = setTimeout(done, observeMs);
+            function done() {
+                observer.disconnect();
+                clearTimeout(timer);
+                clearTimeout(limit);
+                resolve();
+            }
+            for (const node of watched) {
+                observer.observe(node, {subtree: true, childList: true, attributes: true, characterData: true});
+            }
+            timer = setTimeout(done, quietMs);
+        });
+    }
+
+    let budget = maxChars;
+    const texts = [];
+    for (const [key, nodes] of entries) {
+        let text = nodes.map(node => (node.innerText !== undefined ? node.innerText : node.textContent) || '')
+            .map(t => t.trim()).filter(t => t).join('\\n');
+        text = text.slice(0, Math.max(0, budget));
+        budget -= text.length;
+        texts.push([key, text]);
+    }
+
+    const visual = [];
+    let left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+    for (const node of visualNodes) {
+        const rect = node.getBoundingClientRect();
+        const style = getComputedStyle(node);
+        const feature = [node.tagName, node.className && node.className.baseVal !== undefined
+                ? node.className.baseVal : node.className,
+            Math.round(rect.width), Math.round(rect.height),
+            style.color, style.backgroundColor, style.borderColor, style.fill, style.visibility];
+        if (node.tagName === 'CANVAS') {
+            try {
+                const data = node.toDataURL();
+                let hash = 0;
+                for (let i = 0; i < data.length; i++) hash = (hash * 31 + data.charCodeAt(i)) | 0;
+                feature.push(hash);
+            } catch (e) {
+                // 跨域内容污染的canvas无法读取，只能每次都当作可能变化
+                feature.push(Date.now());
+            }
+        }
+        visual.push(feature.join('|'));
+        if (rect.width > 0 && rect.height > 0) {
+            left = Math.min(left, rect.left + window.scrollX);
+            top = Math.min(top, rect.top + window.scrollY);
+            right = Math.max(right, rect.right + window.scrollX);
+            bottom = Math.max(bottom, rect.bottom + window.scrollY);
+        }
+    }
+    const clip = right > left && bottom > top
+        ? {x: Math.floor(left), y: Math.floor(top), width: Math.ceil(right - left), height: Math.ceil(bottom - top)}
+        : null;
+    return {texts, missing, visual, clip, mutations};
+}"""
+
+
+class DomConfig:
+    """某个URL的DOM提取参数"""
+
+    def __init__(self, capture='dom', selectors=(), xpaths=(), visual_selectors=(),
+                 observe_ms=1000, quiet_ms=200, max_chars=100000):
+        if capture not in CAPTURES:
+            raise ValueError(f"未知的获取方式: {capture}，可选: {', '.join(CAPTURES)}")
+        self.capture = capture
+        self.selectors = list(selectors)
+        self.xpaths = list(xpaths)
+        self.visual_selectors = list(visual_selectors)
+        self.observe_ms = observe_ms
+        self.quiet_ms = quiet_ms
+        self.max_chars = max_chars
+
+    @property
+    def visual(self):
+        """是否配置了只能看图的视觉信号"""
+        return bool(self.visual_selectors)
+
+
+async def extract_dom(page, config):
+    """在已经就绪的页面中提取文字，返回DomSnapshot"""
+    data = await page.evaluate(
+        _EXTRACT_JS, config.selectors, config.xpaths, config.visual_selectors,
+        config.observe_ms, config.quiet_ms, config.max_chars,
+    )
+    return DomSnapshot(
+        texts=[tuple(item) for item in data['texts']],
+        missing=list(data['missing']),
+        visual=list(data['visual']),
+        clip=data['clip'],
+        mutations=data['mutations'],
+    )
+
+
+def snapshot_text(snapshot):
+    """把快照整理成交给模型分析的文本；没有找到的元素也列出来（元素消失本身可能就是异常）"""
+    if [key for key, _ in snapshot.texts] == ['body'] and not snapshot.missing:
+        return snapshot.texts[0][1]
+    blocks = [f"【{key}】\n{text}" for key, text in snapshot.texts]
+    blocks.extend(f"【{key}】\n（页面中未找到该元素）" for key in snapshot.missing)
+    return '\n\n'.join(blocks)
+
+
+class DomTracker:
+    """记录每个URL上一次DOM快照的哈希，判断文字和视觉信号是否变化"""
+
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(items):
+        return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+    def update(self, url, snapshot):
+        """记录本次快照，返回 (文字是否变化, 视觉信号是否变化)；第一次检查时都视为变化"""
+        digests = (self._digest((snapshot.texts, snapshot.missing)), self._digest(snapshot.visual))
+        with self._lock:
+            previous = self._last.get(url)
+            self._last[url] = digests
+        if previous is None:
+            return True, True
+        return digests[0] != previous[0], digests[1] != previous[1]
+
+    def forget(self, url):
+        with self._lock:
+            self._last.pop(url, None)
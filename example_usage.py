@@ -5,8 +5,12 @@ AI Agent使用示例
 """
 
 from ai_agent import WebMonitorAgent
+from metrics import setup_logging
 
 def main():
+    # 运行日志输出到标准错误，调试时可改为 setup_logging('DEBUG')
+    setup_logging()
+    
     # 初始化AI Agent
     agent = WebMonitorAgent()
     
@@ -32,6 +36,8 @@ def main():
         agent.start_monitoring(monitor_urls, interval=monitor_interval)
     except KeyboardInterrupt:
         print("\n监控已手动停止")
+    finally:
+        agent.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""
+HTTP获取层
+==========
+所有网页请求共用一个带连接池的keep-alive会话：
+- 连接复用，协商gzip/deflate（安装brotli时也支持br）压缩
+- 按URL记录ETag/Last-Modified，发送If-None-Match/If-Modified-Since条件请求，
+  304时调用方可以直接跳过后续的解析和分析
+- 统计节省的字节数和连接复用率
+- 响应体流式读取，超过max_bytes的部分丢弃（只分析前max_bytes字节），异常巨大的页面不会撑爆内存
+同时提供同步（requests）和异步（httpx）两个版本。
+"""
+
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 65536
+
+
+def _accept_encoding():
+    """根据已安装的解压库协商压缩算法"""
+    encodings = ['gzip', 'deflate']
+    try:
+        import brotli  # noqa: F401
+        encodings.append('br')
+    except ImportError:
+        pass
+    return ', '.join(encodings)
+
+
+class FetchStats:
+    """线程安全的获取统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'connections': 0,
+            'not_modified': 0,
+            'bytes_received': 0,
+            'bytes_saved': 0,
+            'truncated': 0,
+        }
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def report(self):
+        """返回统计快照，包含连接复用率"""
+        with self._lock:
+            report = dict(self.counters)
+        requests_count = report['requests']
+        report['connection_reuse_ratio'] = (
+            max(0.0, 1 - report['connections'] / requests_count) if requests_count else 0.0
+        )
+        return report
+
+
+class ValidatorStore:
+    """按URL保存缓存校验信息（ETag/Last-Modified）和上次响应体大小"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._validators = {}
+
+    def conditional_headers(self, url):
+        with self._lock:
+            validator = self._validators.get(url)
+        headers = {}
+        if validator:
+            if validator.get('etag'):
+                headers['If-None-Match'] = validator['etag']
+            if validator.get('last_modified'):
+                headers['If-Modified-Since'] = validator['last_modified']
+        return headers
+
+    def update(self, url, headers, size):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        with self._lock:
+            if etag or last_modified:
+                self._validators[url] = {'etag': etag, 'last_modified': last_modified, 'size': size}
+            else:
+                self._validators.pop(url, None)
+
+    def last_size(self, url):
+        with self._lock:
+            validator = self._validators.get(url)
+        return validator['size'] if validator else 0
+
+    def forget(self, url):
+        with self._lock:
+            self._validators.pop(url, None)
+
+
+def _compression_saving(headers, body_size):
+    """压缩传输节省的字节数（服务器给出Content-Length时才能计算）"""
+    if not headers.get('Content-Encoding'):
+        return 0
+    try:
+        wire_size = int(headers.get('Content-Length', ''))
+    except ValueError:
+        return 0
+    return max(0, body_size - wire_size)
+
+
+class _CountingAdapter(HTTPAdapter):
+    """统计新建连接数的HTTPAdapter，用于计算连接复用率"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        def counting(pool_cls):
+            # 统计真正的TCP建连（connect），连接对象断开后重连也会计入
+            class CountingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    stats.incr('connections')
+                    return super().connect()
+
+            class CountingPool(pool_cls):
+                ConnectionCls = CountingConnection
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting(cls) for scheme, cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+def _join_capped(chunks, max_bytes):
+    """拼接已读取的块，超过上限时截断"""
+    body = b''.join(chunks)
+    return body[:max_bytes] if max_bytes and len(body) > max_bytes else body
+
+
+class HttpFetcher:
+    """同步获取器，基于共享的requests.Session
+
+    max_bytes 为响应体（解压后）的上限，None或0表示不限制。
+    """
+
+    def __init__(self, timeout=10, verify=False, pool_connections=10, pool_maxsize=20, headers=None,
+                 max_bytes=None):
+        self.timeout = timeout
+        self.max_bytes = max_bytes or None
+        self.verify = verify
+        self.stats = FetchStats()
+        self.validators = ValidatorStore()
+        self.session = requests.Session()
+        adapter = _CountingAdapter(self.stats, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = _accept_encoding()
+        if headers:
+            self.session.headers.update(headers)
+
+    def fetch(self, url, conditional=True, timeout=None):
+        """获取网页，返回requests.Response；status_code为304表示内容未变化
+
+        timeout 不为None时覆盖默认超时（如检查剩余的时间）。
+        """
+        headers = self.validators.conditional_headers(url) if conditional else {}
+        response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, verify=self.verify,
+                                    stream=True)
+        self.stats.incr('requests')
+        self._read_body(url, response)
+
+        if response.status_code == 304:
+            self.stats.incr('not_modified')
+            self.stats.incr('bytes_saved', self.validators.last_size(url))
+            return response
+
+        if response.ok:
+            size = len(response.content)
+            self.stats.incr('bytes_received', size)
+            self.stats.incr('bytes_saved', _compression_saving(response.headers, size))
+            self.validators.update(url, response.headers, size)
+        return response
+
+    def _read_body(self, url, response):
+        """流式读取响应体，超过max_bytes时丢弃其余部分并断开该连接"""
+        chunks = []
+        size = 0
+        truncated = False
+        try:
+            for chunk in response.iter_content(READ_CHUNK):
+                chunks.append(chunk)
+                size += len(chunk)
+                if self.max_bytes and size > self.max_bytes:
+                    truncated = True
+                    break
+        finally:
+            # 读完的连接放回连接池；提前停止时未读完的连接被关闭
+            response.close()
+        response._content = _join_capped(chunks, self.max_bytes)
+        response._content_consumed = True
+        if truncated:
+            self.stats.incr('truncated')
+            logger.warning("响应体超过%d字节，只保留前面部分: %s", self.max_bytes, url)
+
+    def probe(self, url, timeout=3):
+        """廉价探测：短超时的HEAD请求，服务器有正常响应即视为可用（不支持HEAD的501也算）"""
+        try:
+            response = self.session.head(url, timeout=timeout, verify=self.verify, allow_redirects=False)
+        except requests.RequestException:
+            return False
+        self.stats.incr('requests')
+        return response.status_code < 500 or response.status_code == 501
+
+    def report(self):
+        return self.stats.report()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpFetcher:
+    """异步获取器，基于共享的httpx.AsyncClient"""
+
+    def __init__(self, timeout=10, verify=False, max_connections=100,
+                 max_keepalive_connections=20, headers=None, max_bytes=None):
+        import httpx
+
+        self.max_bytes = max_bytes or None
+        self.stats = FetchStats()
+        self.validators = ValidatorStore()
+        default_headers = {'Accept-Encoding': _accept_encoding()}
+        default_headers.update(headers or {})
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            verify=verify,
+            follow_redirects=True,
+            headers=default_headers,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    async def _trace(self, event_name, info):
+        # httpcore的trace钩子：每建立一个新TCP连接触发一次
+        if event_name == 'connection.connect_tcp.complete':
+            self.stats.incr('connections')
+
+    async def fetch(self, url, conditional=True):
+        """获取网页，返回httpx.Response；status_code为304表示内容未变化"""
+        headers = self.validators.conditional_headers(url) if conditional else {}
+        async with self.client.stream('GET', url, headers=headers, extensions={'trace': self._trace}) as response:
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes(READ_CHUNK):
+                chunks.append(chunk)
+                size += len(chunk)
+                if self.max_bytes and size > self.max_bytes:
+                    self.stats.incr('truncated')
+                    logger.warning("响应体超过%d字节，只保留前面部分: %s", self.max_bytes, url)
+                    break
+            response._content = _join_capped(chunks, self.max_bytes)
+        self.stats.incr('requests')
+
+        if response.status_code == 304:
+            self.stats.incr('not_modified')
+            self.stats.incr('bytes_saved', self.validators.last_size(url))
+            return response
+
+        if response.is_success:
+            size = len(response.content)
+            self.stats.incr('bytes_received', size)
+            self.stats.incr('bytes_saved', _compression_saving(response.headers, size))
+            self.validators.update(url, response.headers, size)
+        return response
+
+    def report(self):
+        return self.stats.report()
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,253 @@
+"""
+检查历史
+========
+每次检查的时间、URL、内容哈希、各阶段耗时、结论、告警级别和报告文本写入SQLite（WAL模式）：
+- 检查线程只把记录放进有界队列，由后台线程批量写入，不会因为磁盘IO阻塞
+- 报告文本按哈希单独存放，同一份报告重复出现时只存一次
+- 索引支持“某个URL最近N次结果”和“某个时间窗口内的告警”两类查询
+- 保留策略：按天数和每个URL的最大条数定期清理，清理后回收无引用的报告
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    url TEXT NOT NULL,
+    outcome TEXT,
+    content_hash TEXT,
+    verdict TEXT,
+    severity TEXT,
+    alert INTEGER NOT NULL DEFAULT 0,
+    elapsed_ms REAL,
+    timings TEXT,
+    report_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_checks_url_ts ON checks (url, ts);
+CREATE INDEX IF NOT EXISTS idx_checks_alert_ts ON checks (ts) WHERE alert = 1;
+CREATE TABLE IF NOT EXISTS reports (
+    hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+"""
+
+_COLUMNS = 'c.ts, c.url, c.outcome, c.content_hash, c.verdict, c.severity, c.elapsed_ms, c.timings, r.text'
+
+_STOP = object()
+
+
+def _row_to_dict(row):
+    ts, url, outcome, content_hash, verdict, severity, elapsed_ms, timings, report = row
+    return {
+        'ts': ts,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)),
+        'url': url,
+        'outcome': outcome,
+        'content_hash': content_hash,
+        'verdict': verdict,
+        'severity': severity,
+        'elapsed_ms': elapsed_ms,
+        'timings': json.loads(timings) if timings else {},
+        'report': report,
+    }
+
+
+class HistoryStore:
+    """检查历史存储"""
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 retention_days=30, max_rows_per_url=10000, prune_interval=3600):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_rows_per_url = max_rows_per_url
+        self.prune_interval = prune_interval
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'pruned': 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._read_lock = threading.Lock()
+        self._db = self._connect()
+        self._db.executescript(SCHEMA)
+        self._writer = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    # ---------- 写入 ----------
+
+    def start(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+            self._writer.start()
+        return self
+
+    def record(self, url, outcome, report=None, content_hash=None, verdict=None, severity=None,
+               elapsed_ms=None, timings=None, ts=None):
+        """提交一条检查记录（不阻塞；队列满时丢弃并计数）"""
+        alert = verdict == 'alert'
+        item = (ts or time.time(), url, outcome, content_hash, verdict, severity, int(alert),
+                elapsed_ms, json.dumps(timings, ensure_ascii=False) if timings else None, report)
+        try:
+            self._queue.put_nowait(item)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _write_loop(self):
+        db = self._connect()
+        last_prune = 0.0
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write_batch(db, batch)
+                except sqlite3.Error as e:
+                    logger.error("写入检查历史失败（%d条）: %s", len(batch), e)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if time.monotonic() - last_prune > self.prune_interval:
+                last_prune = time.monotonic()
+                try:
+                    self.prune(db)
+                except sqlite3.Error as e:
+                    logger.warning("清理检查历史失败: %s", e)
+        db.close()
+
+    def _write_batch(self, db, batch):
+        reports = {}
+        rows = []
+        for ts, url, outcome, content_hash, verdict, severity, alert, elapsed_ms, timings, report in batch:
+            report_hash = None
+            if report:
+                report_hash = hashlib.sha1(report.encode('utf-8')).hexdigest()
+                reports[report_hash] = report
+            rows.append((ts, url, outcome, content_hash, verdict, severity, alert, elapsed_ms, timings, report_hash))
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany('INSERT OR IGNORE INTO reports (hash, text) VALUES (?, ?)', reports.items())
+            db.executemany(
+                'INSERT INTO checks (ts, url, outcome, content_hash, verdict, severity, alert, '
+                'elapsed_ms, timings, report_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self.stats['written'] += len(rows)
+        self.stats['batches'] += 1
+
+    def flush(self, timeout=None):
+        """等待队列中的记录全部写入"""
+        if self._writer is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+
+    # ---------- 保留策略 ----------
+
+    def prune(self, db=None, retention_days=None, max_rows_per_url=None):
+        """删除超过保留天数的记录、每个URL超出条数上限的旧记录，以及无引用的报告"""
+        db = db or self._db
+        retention_days = self.retention_days if retention_days is None else retention_days
+        max_rows_per_url = self.max_rows_per_url if max_rows_per_url is None else max_rows_per_url
+        deleted = 0
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if retention_days:
+                cursor = db.execute('DELETE FROM checks WHERE ts < ?', (time.time() - retention_days * 86400,))
+                deleted += cursor.rowcount
+            if max_rows_per_url:
+                for (url,) in db.execute(
+                        'SELECT url FROM checks GROUP BY url HAVING COUNT(*) > ?', (max_rows_per_url,)).fetchall():
+                    cursor = db.execute(
+                        'DELETE FROM checks WHERE url = ? AND ts < ('
+                        'SELECT ts FROM checks WHERE url = ? ORDER BY ts DESC LIMIT 1 OFFSET ?)',
+                        (url, url, max_rows_per_url - 1),
+                    )
+                    deleted += cursor.rowcount
+            if deleted:
+                db.execute('DELETE FROM reports WHERE hash NOT IN (SELECT report_hash FROM checks '
+                           'WHERE report_hash IS NOT NULL)')
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self.stats['pruned'] += deleted
+        if deleted:
+            logger.info("检查历史清理了%d条记录", deleted)
+        return deleted
+
+    def compact(self):
+        """清理后回收磁盘空间"""
+        with self._read_lock:
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.execute('VACUUM')
+
+    # ---------- 查询 ----------
+
+    def _query(self, sql, params):
+        with self._read_lock:
+            return [_row_to_dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def last_results(self, url, limit=10):
+        """某个URL最近limit次检查，按时间倒序"""
+        return self._query(
+            f'SELECT {_COLUMNS} FROM checks c LEFT JOIN reports r ON r.hash = c.report_hash '
+            'WHERE c.url = ? ORDER BY c.ts DESC LIMIT ?',
+            (url, limit),
+        )
+
+    def alerts(self, since=None, until=None, url=None, limit=1000):
+        """时间窗口内的告警，按时间倒序"""
+        sql = (f'SELECT {_COLUMNS} FROM checks c LEFT JOIN reports r ON r.hash = c.report_hash '
+               'WHERE c.alert = 1 AND c.ts >= ? AND c.ts <= ?')
+        params = [since or 0, until or time.time()]
+        if url:
+            sql += ' AND c.url = ?'
+            params.append(url)
+        sql += ' ORDER BY c.ts DESC LIMIT ?'
+        params.append(limit)
+        return self._query(sql, params)
+
+    def summary(self):
+        """每个URL的检查次数、告警次数和最近一次检查时间"""
+        with self._read_lock:
+            return self._db.execute(
+                'SELECT url, COUNT(*), SUM(alert), MAX(ts) FROM checks GROUP BY url ORDER BY url'
+            ).fetchall()
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join(timeout=30)
+            self._writer = None
+        self._db.close()
@@ -0,0 +1,227 @@
+"""
+网页分类与文本提取
+==================
+判断网页是“简单网页”（直接做文本分析）还是“复杂网页”（需要截图），
+不再为每个页面构建完整的BeautifulSoup树：
+- 可插拔的解析后端：selectolax、lxml（已安装时使用），否则使用标准库的流式解析
+- 流式分类器增量解析，一旦脚本数或文本长度超过阈值立即停止
+- 提取文本时跳过script/style，不构建整棵树
+
+判定规则与原来一致：文本字符数 < max_text 且 script标签数 < max_scripts 为简单网页。
+"""
+
+import logging
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+MAX_TEXT = 10000
+MAX_SCRIPTS = 10
+
+# 提取文本时跳过的标签
+SKIP_TAGS = ('script', 'style', 'noscript', 'template')
+
+
+class _ThresholdReached(Exception):
+    """流式解析中超过阈值，提前停止"""
+
+
+class _StreamingParser(HTMLParser):
+    """边解析边统计script数量和可见文本，可在超过阈值时提前停止
+
+    分块feed时同一个文本节点可能分多次回调handle_data，先暂存，遇到下一个标签时再作为一行。
+    """
+
+    def __init__(self, max_text=None, max_scripts=None):
+        super().__init__(convert_charrefs=True)
+        self.max_text = max_text
+        self.max_scripts = max_scripts
+        self.script_count = 0
+        self.text_length = 0
+        self.lines = []
+        self._skip_depth = 0
+        self._pending = []
+        self._pending_length = 0
+
+    def _flush_text(self):
+        data = ''.join(self._pending).strip()
+        self._pending = []
+        self._pending_length = 0
+        if not data:
+            return
+        # 与 get_text(separator='\n') 一致：行之间计一个换行符
+        self.text_length += len(data) + (1 if self.lines else 0)
+        self.lines.append(data)
+        if self.max_text is not None and self.text_length >= self.max_text:
+            raise _ThresholdReached()
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            if tag == 'script':
+                self.script_count += 1
+                if self.max_scripts is not None and self.script_count >= self.max_scripts:
+                    raise _ThresholdReached()
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._pending.append(data)
+        self._pending_length += len(data)
+        # 很长的文本节点不必等到下一个标签才判断：确定会超过阈值时立即结束
+        if self.max_text is not None and self.text_length + self._pending_length >= self.max_text:
+            data = ''.join(self._pending).strip()
+            if self.text_length + len(data) + (1 if self.lines else 0) >= self.max_text:
+                self._flush_text()
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+
+class StreamBackend:
+    """标准库html.parser的流式后端，按块增量解析，超过阈值立即停止"""
+
+    name = 'stream'
+
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+
+    def classify(self, html, max_text=MAX_TEXT, max_scripts=MAX_SCRIPTS):
+        parser = _StreamingParser(max_text, max_scripts)
+        try:
+            for start in range(0, len(html), self.chunk_size):
+                parser.feed(html[start:start + self.chunk_size])
+            parser.close()
+        except _ThresholdReached:
+            return 'complex', None
+        return 'text', parser.text()
+
+    def extract_text(self, html):
+        parser = _StreamingParser()
+        parser.feed(html)
+        parser.close()
+        return parser.text()
+
+
+class LxmlBackend:
+    """lxml后端（C实现的完整解析）"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        from lxml import etree
+
+        self._html = lxml.html
+        self._etree = etree
+
+    def _parse(self, html):
+        try:
+            return self._html.document_fromstring(html)
+        except (self._etree.ParserError, ValueError):
+            # 空文档，或带编码声明的str
+            return self._html.document_fromstring(html.encode('utf-8')) if html.strip() else None
+
+    def _text(self, root):
+        self._etree.strip_elements(root, *SKIP_TAGS, self._etree.Comment, with_tail=False)
+        pieces = (piece.strip() for piece in root.itertext())
+        return '\n'.join(piece for piece in pieces if piece)
+
+    def classify(self, html, max_text=MAX_TEXT, max_scripts=MAX_SCRIPTS):
+        root = self._parse(html)
+        if root is None:
+            return 'text', ''
+        script_count = sum(1 for _ in root.iter('script'))
+        if script_count >= max_scripts:
+            return 'complex', None
+        text = self._text(root)
+        if len(text) >= max_text:
+            return 'complex', None
+        return 'text', text
+
+    def extract_text(self, html):
+        root = self._parse(html)
+        return self._text(root) if root is not None else ''
+
+
+class SelectolaxBackend:
+    """selectolax后端（lexbor引擎，通常最快）"""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser as parser_cls
+        except ImportError:
+            # 旧版本selectolax只有modest引擎
+            from selectolax.parser import HTMLParser as parser_cls
+
+        self._parser_cls = parser_cls
+
+    def _text(self, tree):
+        tree.strip_tags(list(SKIP_TAGS))
+        root = tree.root
+        return root.text(separator='\n', strip=True) if root is not None else ''
+
+    def classify(self, html, max_text=MAX_TEXT, max_scripts=MAX_SCRIPTS):
+        tree = self._parser_cls(html)
+        if len(tree.css('script')) >= max_scripts:
+            return 'complex', None
+        text = self._text(tree)
+        if len(text) >= max_text:
+            return 'complex', None
+        return 'text', text
+
+    def extract_text(self, html):
+        return self._text(self._parser_cls(html))
+
+
+# 自动选择时的优先顺序
+BACKENDS = {
+    'selectolax': SelectolaxBackend,
+    'lxml': LxmlBackend,
+    'stream': StreamBackend,
+}
+
+
+def available_backends():
+    """返回当前环境可用的后端名称（按优先顺序）"""
+    names = []
+    for name, backend_cls in BACKENDS.items():
+        try:
+            backend_cls()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name='auto'):
+    """按名称创建后端；'auto' 选择已安装的最快后端，缺少依赖时退回流式后端"""
+    if name and name != 'auto':
+        if name not in BACKENDS:
+            raise ValueError(f"未知的HTML解析后端: {name}，可选: {', '.join(BACKENDS)}")
+        try:
+            return BACKENDS[name]()
+        except ImportError as e:
+            logger.warning("HTML解析后端%s不可用(%s)，使用流式解析", name, e)
+            return StreamBackend()
+    for backend_cls in BACKENDS.values():
+        try:
+            return backend_cls()
+        except ImportError:
+            continue
+    return StreamBackend()
@@ -0,0 +1,180 @@
+"""
+截图处理流水线
+==============
+截图在内存中处理后直接发给视觉模型，不再写临时文件（并发检查也不会互相覆盖）：
+- 按URL配置的感兴趣区域（ROI）裁剪
+- 缩放到视觉模型合适的宽度，整页长截图按高度切成若干块
+- 重新编码为JPEG/WebP，在字节预算内自动降低质量
+"""
+
+import base64
+import io
+
+from PIL import Image
+
+DEFAULT_OPTIONS = {
+    'roi': None,            # (x, y, w, h)，像素
+    'max_width': 1280,      # 缩放后的最大宽度
+    'tile_height': 1280,    # 每块的高度
+    'max_tiles': 4,         # 最多发送的块数，超出时整体再缩小
+    'format': 'JPEG',       # JPEG 或 WEBP
+    'quality': 85,          # 初始编码质量
+    'min_quality': 40,      # 最低编码质量
+    'max_bytes': 600000,    # 所有块编码后的总字节预算
+}
+
+_MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+
+def parse_roi(value):
+    """解析 'x,y,w,h' 形式的ROI配置"""
+    if not value:
+        return None
+    parts = [int(p) for p in str(value).replace(' ', '').split(',')]
+    if len(parts) != 4 or parts[2] <= 0 or parts[3] <= 0:
+        raise ValueError(f"ROI格式应为 x,y,w,h: {value}")
+    return tuple(parts)
+
+
+def roi_box(roi, width, height):
+    """ROI在图像范围内的部分 (x0, y0, x1, y1)；没有ROI或与图像不相交时返回None"""
+    if not roi:
+        return None
+    x, y, w, h = roi
+    box = (max(0, x), max(0, y), min(width, x + w), min(height, y + h))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return box
+
+
+def crop_roi(image, roi):
+    """按ROI裁剪，超出图像范围的部分自动截断"""
+    box = roi_box(roi, image.width, image.height)
+    return image.crop(box) if box is not None else image
+
+
+def clip_boxes(boxes, roi, width, height):
+    """把区域 [(x, y, w, h)] 限制在ROI内，完全在ROI之外的区域丢弃"""
+    bounds = roi_box(roi, width, height) or (0, 0, width, height)
+    clipped = []
+    for x, y, w, h in boxes:
+        x0, y0 = max(x, bounds[0]), max(y, bounds[1])
+        x1, y1 = min(x + w, bounds[2]), min(y + h, bounds[3])
+        if x0 < x1 and y0 < y1:
+            clipped.append((x0, y0, x1 - x0, y1 - y0))
+    return clipped
+
+
+def fit_image(image, max_width, tile_height, max_tiles):
+    """缩放到最大宽度，并保证切块数量不超过max_tiles"""
+    scale = min(1.0, max_width / image.width)
+    if image.height * scale > tile_height * max_tiles:
+        scale = tile_height * max_tiles / image.height
+    if scale < 1.0:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    return image
+
+
+def split_tiles(image, tile_height):
+    """按高度切块"""
+    if image.height <= tile_height:
+        return [image]
+    return [
+        image.crop((0, top, image.width, min(image.height, top + tile_height)))
+        for top in range(0, image.height, tile_height)
+    ]
+
+
+def encode_image(image, fmt='JPEG', quality=85, min_quality=40, max_bytes=None):
+    """编码为指定格式，超过字节预算时逐步降低质量"""
+    fmt = fmt.upper()
+    if fmt == 'JPG':
+        fmt = 'JPEG'
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    while True:
+        buffer = io.BytesIO()
+        options = {'quality': quality}
+        if fmt == 'JPEG':
+            options['optimize'] = True
+        elif fmt == 'WEBP':
+            options['method'] = 4
+        image.save(buffer, format=fmt, **options)
+        data = buffer.getvalue()
+        if max_bytes is None or len(data) <= max_bytes or quality <= min_quality:
+            return data
+        quality = max(min_quality, quality - 10)
+
+
+def to_data_url(data, fmt='JPEG'):
+    """编码为可直接放入image_url的data URL"""
+    fmt = 'JPEG' if fmt.upper() == 'JPG' else fmt.upper()
+    return f"data:{_MIME_TYPES.get(fmt, 'image/jpeg')};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _merge_options(options):
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update({k: v for k, v in options.items() if v is not None})
+    return opts
+
+
+def decode_image(image_data):
+    """解码截图为RGB图像"""
+    with Image.open(io.BytesIO(image_data)) as source:
+        source.load()
+        return source.convert('RGB')
+
+
+def _encode_tiles(image, opts):
+    image = fit_image(image, opts['max_width'], opts['tile_height'], opts['max_tiles'])
+    tiles = split_tiles(image, opts['tile_height'])
+    per_tile_budget = opts['max_bytes'] // len(tiles) if opts['max_bytes'] else None
+    return [
+        (encode_image(tile, opts['format'], opts['quality'], opts['min_quality'], per_tile_budget),
+         opts['format'])
+        for tile in tiles
+    ]
+
+
+def prepare_images(image_data, **options):
+    """截图 -> 裁剪/缩放/切块/编码后的图片列表 [(bytes, 格式)]"""
+    opts = _merge_options(options)
+    image = crop_roi(decode_image(image_data), opts['roi'])
+    return _encode_tiles(image, opts)
+
+
+def prepare_regions(image_data, boxes, **options):
+    """只编码截图中的若干区域 [(x, y, w, h)]，每个区域一块，字节预算按区域平分
+
+    配置了ROI时区域先限制在ROI内；都在ROI之外时按ROI整体编码。
+    """
+    opts = _merge_options(options)
+    image = decode_image(image_data)
+    boxes = clip_boxes(boxes, opts['roi'], image.width, image.height)
+    if not boxes:
+        return _encode_tiles(crop_roi(image, opts['roi']), opts)
+    region_opts = dict(opts, max_tiles=1)
+    if opts['max_bytes']:
+        region_opts['max_bytes'] = opts['max_bytes'] // max(1, len(boxes))
+    encoded = []
+    for box in boxes:
+        encoded.extend(_encode_tiles(crop_roi(image, box), region_opts))
+    return encoded
+
+
+def _message_parts(encoded):
+    return [
+        {"type": "image_url", "image_url": {"url": to_data_url(data, fmt)}}
+        for data, fmt in encoded
+    ]
+
+
+def image_message_parts(image_data, **options):
+    """生成OpenAI兼容的image_url消息片段列表"""
+    return _message_parts(prepare_images(image_data, **options))
+
+
+def region_message_parts(image_data, boxes, **options):
+    """只包含变化区域的image_url消息片段列表"""
+    return _message_parts(prepare_regions(image_data, boxes, **options))
@@ -0,0 +1,68 @@
+"""
+后台事件循环线程
+================
+浏览器池、AI分析服务等异步组件运行在各自的事件循环线程上，
+同步代码（包括线程池中的检查任务）通过 run() 提交协程并等待结果。
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+class LoopThread:
+    """在守护线程中运行一个事件循环"""
+
+    def __init__(self, name='event-loop'):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动线程（幂等），本次调用真正启动了线程时返回True"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.loop = asyncio.new_event_loop()
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._started.wait()
+        return True
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        self.loop.run_forever()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def run(self, coro, timeout=None):
+        """在后台事件循环中运行协程并同步等待结果；超时时取消该协程后抛出TimeoutError"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def run_async(self, coro):
+        """在其它事件循环中等待后台事件循环里的协程"""
+        self.start()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stop(self, timeout=10):
+        """停止事件循环并等待线程退出"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            self.loop.close()
@@ -0,0 +1,186 @@
+"""
+内存预算
+========
+监控进程需要长期运行，内存只能在预算内波动：
+- rss_bytes / process_tree_rss：读取本进程和浏览器进程（含渲染子进程）的常驻内存，
+  Linux上直接读/proc，其它平台安装了psutil时使用psutil，都不可用时返回None
+- trim_memory：垃圾回收后把空闲的堆内存还给操作系统（glibc的malloc_trim）
+- MemoryGuard：按间隔采样内存并写入指标；浏览器超过阈值时回收重启浏览器，本进程超过阈值时先整理内存，
+  仍然超过时标记为超限，由调用方退出进程并交给上级（分片模式的协调者、systemd等）重启
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+MemoryStatus = namedtuple('MemoryStatus', [
+    'rss',           # 本进程RSS（字节），无法读取时为None
+    'browser_rss',   # 浏览器进程RSS合计（字节），没有浏览器或无法读取时为None
+    'exceeded',      # 回收后本进程仍超过上限
+])
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _psutil():
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def rss_bytes(pid=None):
+    """进程的常驻内存（字节），pid为None时为本进程；读取失败时返回None"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    psutil = _psutil()
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+def _children_from_proc():
+    """从/proc读取 {父进程: [子进程]}"""
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # 进程名可能包含空格和括号，从最后一个')'之后开始解析
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def process_tree_rss(pids):
+    """若干进程及其全部子进程的RSS合计（字节）；都读取失败时返回None"""
+    pids = [pid for pid in pids if pid]
+    if not pids:
+        return None
+    if os.path.isdir('/proc'):
+        children = _children_from_proc()
+        seen = set()
+        stack = list(pids)
+        while stack:
+            pid = stack.pop()
+            if pid not in seen:
+                seen.add(pid)
+                stack.extend(children.get(pid, ()))
+    else:
+        psutil = _psutil()
+        if psutil is None:
+            return None
+        seen = set(pids)
+        for pid in pids:
+            try:
+                seen.update(child.pid for child in psutil.Process(pid).children(recursive=True))
+            except psutil.Error:
+                pass
+    sizes = [size for size in (rss_bytes(pid) for pid in seen) if size is not None]
+    return sum(sizes) if sizes else None
+
+
+_libc = None
+
+
+def trim_memory():
+    """垃圾回收，并把空闲堆内存还给操作系统（只在glibc上有效）"""
+    global _libc
+    collected = gc.collect()
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+            _libc.malloc_trim.argtypes = [ctypes.c_size_t]
+        except (OSError, AttributeError):
+            _libc = False
+    if _libc:
+        _libc.malloc_trim(0)
+    return collected
+
+
+class MemoryGuard:
+    """按间隔采样内存，超过阈值时回收
+
+    max_rss / browser_max_rss 为字节数，0或None表示不限制（只采样写入指标）。
+    browser_pids() 返回当前浏览器主进程的pid列表，recycle_browsers() 回收重启浏览器。
+    """
+
+    def __init__(self, max_rss=None, browser_max_rss=None, check_interval=30,
+                 browser_pids=None, recycle_browsers=None, metrics=None, clock=time.monotonic):
+        self.max_rss = max_rss or None
+        self.browser_max_rss = browser_max_rss or None
+        self.check_interval = check_interval
+        self.browser_pids = browser_pids
+        self.recycle_browsers = recycle_browsers
+        self.metrics = metrics
+        self.clock = clock
+        self.exceeded = False
+        self.stats = {'samples': 0, 'browser_recycles': 0, 'trims': 0}
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        rss = rss_bytes()
+        browser_rss = process_tree_rss(self.browser_pids()) if self.browser_pids is not None else None
+        self.stats['samples'] += 1
+        if self.metrics is not None:
+            if rss is not None:
+                self.metrics.set_gauge('memory_rss_bytes', rss, process='agent')
+            self.metrics.set_gauge('memory_rss_bytes', browser_rss or 0, process='browser')
+        return rss, browser_rss
+
+    def _recycle(self, kind):
+        self.stats['browser_recycles' if kind == 'browser' else 'trims'] += 1
+        if self.metrics is not None:
+            self.metrics.incr('memory_recycles_total', kind=kind)
+
+    def check(self, force=False):
+        """到了采样间隔时采样并按需回收，返回MemoryStatus；未到间隔时返回None"""
+        now = self.clock()
+        with self._lock:
+            if not force and self._checked is not None and now - self._checked < self.check_interval:
+                return None
+            self._checked = now
+        rss, browser_rss = self._sample()
+
+        if self.browser_max_rss and browser_rss is not None and browser_rss > self.browser_max_rss:
+            logger.warning("浏览器内存%.0fMB超过上限%.0fMB，回收重启浏览器",
+                           browser_rss / MB, self.browser_max_rss / MB)
+            self._recycle('browser')
+            if self.recycle_browsers is not None:
+                self.recycle_browsers()
+
+        if self.max_rss and rss is not None and rss > self.max_rss:
+            # 先把空闲的堆内存还给操作系统，再重新测量
+            self._recycle('process')
+            trim_memory()
+            trimmed = rss_bytes()
+            logger.warning("进程内存%.0fMB超过上限%.0fMB，回收后为%.0fMB",
+                           rss / MB, self.max_rss / MB, (trimmed or 0) / MB)
+            if trimmed is not None and trimmed > self.max_rss:
+                self.exceeded = True
+            rss = trimmed
+        return MemoryStatus(rss, browser_rss, self.exceeded)
+
+    def report(self):
+        rss = rss_bytes()
+        return dict(self.stats, rss_mb=round(rss / MB, 1) if rss is not None else None, exceeded=self.exceeded)
@@ -0,0 +1,247 @@
+"""
+指标与分阶段耗时
+================
+- 计数器：缓存命中、304、本地预筛升级、模型错误等
+- 直方图：每个阶段（获取、解析、渲染、编码、模型调用）的耗时，模型的token用量
+- 仪表：进程和浏览器的内存占用等当前值
+- 导出：Prometheus文本格式（写入文件或通过HTTP端点），以及JSON Lines事件日志
+
+所有记录都只是内存中的加法，未配置导出时几乎没有开销。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 耗时（秒）和token用量的默认分桶
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(processName)s] %(name)s: %(message)s'
+
+
+def setup_logging(level='INFO', path=None):
+    """配置根日志：输出到标准错误，或写入文件"""
+    logging.basicConfig(
+        level=getattr(logging, str(level).upper(), logging.INFO),
+        format=LOG_FORMAT,
+        filename=path or None,
+    )
+    # openai/httpx 每个请求都会输出一行INFO日志
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + list(extra or ())
+    if not items:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+    return '{' + body + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class EventLog:
+    """JSON Lines事件日志，每个事件一行"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, event, **fields):
+        record = {'ts': round(time.time(), 3), 'event': event, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Metrics:
+    """计数器、仪表和直方图的注册表"""
+
+    def __init__(self, prefix='web_monitor', event_log=None):
+        self.prefix = prefix
+        self.event_log = EventLog(event_log) if isinstance(event_log, str) else event_log
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._server = None
+
+    # ---------- 记录 ----------
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def event(self, event, **fields):
+        """写入事件日志（未配置时忽略）"""
+        if self.event_log is not None:
+            self.event_log.write(event, **fields)
+
+    @contextmanager
+    def trace(self):
+        """收集当前线程中各阶段的耗时 {stage: 毫秒}，用于记录单次检查"""
+        timings = {}
+        previous = getattr(self._local, 'timings', None)
+        self._local.timings = timings
+        try:
+            yield timings
+        finally:
+            self._local.timings = previous
+
+    @contextmanager
+    def span(self, stage, url=None):
+        """记录一个阶段的耗时到 stage_seconds{stage=...}，出错时计入 stage_errors_total"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_seconds', elapsed, stage=stage)
+            timings = getattr(self._local, 'timings', None)
+            if timings is not None:
+                timings[stage] = round(timings.get(stage, 0) + elapsed * 1000, 2)
+            if error is not None:
+                self.incr('stage_errors_total', stage=stage)
+            if self.event_log is not None:
+                fields = {'stage': stage, 'url': url, 'ms': round(elapsed * 1000, 2)}
+                if error is not None:
+                    fields['error'] = repr(error)
+                self.event_log.write('span', **fields)
+            logger.debug("阶段 %s 耗时 %.1fms %s", stage, elapsed * 1000, url or '')
+
+    def set_help(self, name, text):
+        self._help[name] = text
+
+    # ---------- 导出 ----------
+
+    def snapshot(self):
+        """当前计数器的值 {(name, labels): value}"""
+        with self._lock:
+            return dict(self._counters)
+
+    def render_prometheus(self):
+        """Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, h.buckets, list(h.counts), h.count, h.sum) for key, h in histograms]
+
+        seen = set()
+        for kind, items in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in items:
+                full = f"{self.prefix}_{name}"
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {full} {self._help[name]}")
+                    lines.append(f"# TYPE {full} {kind}")
+                lines.append(f"{full}{_format_labels(labels)} {value}")
+
+        for (name, labels), buckets, counts, count, total in histograms:
+            full = f"{self.prefix}_{name}"
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{full}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{full}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{full}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """原子地写入文本文件（可供node_exporter的textfile collector读取）"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def serve(self, port, host='0.0.0.0'):
+        """在后台线程中提供 /metrics 端点"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info("指标端点: http://%s:%d/metrics", host, self._server.server_address[1])
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
@@ -0,0 +1,302 @@
+"""
+告警通知
+========
+检查线程只调用 submit()，通知在自己的事件循环线程中异步处理：
+- 按 URL + 告警级别 + 规范化后的告警内容计算指纹，窗口期内重复的告警不再发送；
+  页面恢复正常后清除该URL的指纹，再次出现时重新通知；无法解析的分析结果不算恢复
+- 在 digest_window 秒内收集到的告警合并成一份汇总（最多 digest_max 条）
+- 汇总分发给各个通知渠道（webhook、文件、SMTP、内存），每个渠道有自己的有界队列和发送协程，
+  慢渠道只会让自己的队列积压/丢弃，不会阻塞监控检查和其它渠道
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import smtplib
+import time
+from collections import namedtuple
+from email.message import EmailMessage
+
+from alerts import SEVERITY_RANK
+from loop_thread import LoopThread
+from result_cache import DEFAULT_VOLATILE_PATTERNS, compile_patterns, normalize_text
+
+logger = logging.getLogger(__name__)
+
+Notification = namedtuple('Notification', ['url', 'severity', 'alert', 'fingerprint', 'time'])
+Digest = namedtuple('Digest', ['items', 'start', 'end'])
+
+_VOLATILE = compile_patterns(DEFAULT_VOLATILE_PATTERNS + [r'\d+(?:\.\d+)?'])
+
+
+def fingerprint(url, alert):
+    """告警指纹：忽略时间、数字等易变内容"""
+    key = '\n'.join((url, alert.severity, normalize_text(alert.content, _VOLATILE)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def format_digest(digest):
+    """汇总的标题和正文"""
+    counts = {}
+    for item in digest.items:
+        counts[item.severity] = counts.get(item.severity, 0) + 1
+    summary = '，'.join(f"{level}{count}条" for level, count in
+                       sorted(counts.items(), key=lambda kv: -SEVERITY_RANK.get(kv[0], 0)))
+    title = f"网站监控告警汇总：{summary}"
+    lines = []
+    for index, item in enumerate(digest.items, 1):
+        alert = item.alert
+        lines.append(f"{index}. 【{item.severity}】{item.url}")
+        lines.append(f"   时间：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item.time))}")
+        lines.append(f"   告警内容：{alert.content}")
+        if alert.cause:
+            lines.append(f"   可能的原因：{alert.cause}")
+        if alert.action:
+            lines.append(f"   建议的处理措施：{alert.action}")
+    return title, '\n'.join(lines)
+
+
+def digest_to_dict(digest):
+    title, text = format_digest(digest)
+    return {
+        'title': title,
+        'text': text,
+        'start': digest.start,
+        'end': digest.end,
+        'alerts': [
+            {'url': item.url, 'time': item.time, 'fingerprint': item.fingerprint, **item.alert._asdict()}
+            for item in digest.items
+        ],
+    }
+
+
+# ---------- 通知渠道 ----------
+
+class MemorySink:
+    """保存在内存中，供测试和本地调试使用"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.digests = []
+
+    async def send(self, digest):
+        self.digests.append(digest)
+
+
+class FileSink:
+    """每份汇总追加一行JSON"""
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def _write(self, digest):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(digest_to_dict(digest), ensure_ascii=False) + '\n')
+
+    async def send(self, digest):
+        await asyncio.get_running_loop().run_in_executor(None, self._write, digest)
+
+
+class WebhookSink:
+    """POST JSON到webhook地址"""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=10, headers=None):
+        import httpx
+
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout, headers=headers)
+
+    async def send(self, digest):
+        response = await self._client.post(self.url, json=digest_to_dict(digest))
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SmtpSink:
+    """通过SMTP发送邮件"""
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, recipients, username=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def _send(self, digest):
+        title, text = format_digest(digest)
+        message = EmailMessage()
+        message['Subject'] = title
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(text)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            smtp.send_message(message)
+
+    async def send(self, digest):
+        await asyncio.get_running_loop().run_in_executor(None, self._send, digest)
+
+
+# ---------- 通知器 ----------
+
+class Notifier:
+    """告警去重、汇总和分发"""
+
+    def __init__(self, sinks, dedup_window=3600, digest_window=30, digest_max=50,
+                 max_queue=1000, sink_queue=100, send_timeout=30, min_severity='信息'):
+        self.sinks = list(sinks)
+        self.dedup_window = dedup_window
+        self.digest_window = digest_window
+        self.digest_max = digest_max
+        self.max_queue = max_queue
+        self.sink_queue = sink_queue
+        self.send_timeout = send_timeout
+        self.min_rank = SEVERITY_RANK.get(min_severity, 0)
+        self.stats = {'submitted': 0, 'suppressed': 0, 'dropped': 0, 'digests': 0,
+                      'delivered': 0, 'sink_errors': 0, 'sink_dropped': 0}
+        self._loop_thread = LoopThread('notifier')
+        self._queue = None
+        self._sink_queues = []
+        self._tasks = []
+        self._sent = {}          # 指纹 -> 最近一次通知时间
+        self._active = {}        # url -> 当前告警指纹集合
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._loop_thread.start():
+            self._loop_thread.run(self._setup())
+        return self
+
+    async def _setup(self):
+        self._queue = asyncio.Queue(self.max_queue)
+        self._tasks = [asyncio.ensure_future(self._collect())]
+        for sink in self.sinks:
+            queue = asyncio.Queue(self.sink_queue)
+            self._sink_queues.append(queue)
+            self._tasks.append(asyncio.ensure_future(self._deliver(sink, queue)))
+
+    async def _shutdown(self, timeout):
+        # 先把已收集的告警发出去，再停止
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._tasks, return_exceptions=True), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("通知未能在%s秒内发送完毕", timeout)
+            for task in self._tasks:
+                task.cancel()
+        for sink in self.sinks:
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                try:
+                    await close()
+                except Exception:
+                    pass
+
+    def close(self, timeout=30):
+        if not self._loop_thread.running:
+            return
+        try:
+            self._loop_thread.run(self._shutdown(timeout), timeout=timeout + 5)
+        finally:
+            self._loop_thread.stop()
+
+    # ---------- 提交 ----------
+
+    def submit(self, url, result):
+        """提交一个网站的结构化分析结果（线程安全，不阻塞）"""
+        if self._queue is None:
+            return
+        self._loop_thread.loop.call_soon_threadsafe(self._accept, url, result, time.time())
+
+    def _accept(self, url, result, now):
+        if result.unparsed:
+            # 无法解析的回复既不是告警也不代表恢复，保留现有指纹，避免告警在下一次检查时重复通知
+            return
+        if not result.is_alert:
+            # 恢复正常：之后再出现同样的告警需要重新通知
+            for key in self._active.pop(url, ()):
+                self._sent.pop(key, None)
+            return
+        active = set()
+        for alert in result.alerts:
+            if SEVERITY_RANK.get(alert.severity, 0) < self.min_rank:
+                continue
+            key = fingerprint(url, alert)
+            active.add(key)
+            self.stats['submitted'] += 1
+            last = self._sent.get(key)
+            if last is not None and now - last < self.dedup_window:
+                self.stats['suppressed'] += 1
+                continue
+            try:
+                self._queue.put_nowait(Notification(url, alert.severity, alert, key, now))
+            except asyncio.QueueFull:
+                self.stats['dropped'] += 1
+                continue
+            self._sent[key] = now
+        self._active[url] = active
+        if len(self._sent) > 10000:
+            cutoff = now - self.dedup_window
+            self._sent = {key: ts for key, ts in self._sent.items() if ts >= cutoff}
+
+    # ---------- 汇总和分发 ----------
+
+    async def _collect(self):
+        """在汇总窗口内收集告警，然后分发给各个渠道"""
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            items = [first]
+            deadline = time.monotonic() + self.digest_window
+            while len(items) < self.digest_max:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+            items.sort(key=lambda n: (-SEVERITY_RANK.get(n.severity, 0), n.time))
+            digest = Digest(items, items[0].time, time.time())
+            self.stats['digests'] += 1
+            for queue in self._sink_queues:
+                try:
+                    queue.put_nowait(digest)
+                except asyncio.QueueFull:
+                    self.stats['sink_dropped'] += 1
+        for queue in self._sink_queues:
+            await queue.put(None)
+
+    async def _deliver(self, sink, queue):
+        """单个渠道的发送协程"""
+        name = getattr(sink, 'name', type(sink).__name__)
+        while True:
+            digest = await queue.get()
+            if digest is None:
+                return
+            try:
+                await asyncio.wait_for(sink.send(digest), self.send_timeout)
+                self.stats['delivered'] += 1
+            except Exception as e:
+                self.stats['sink_errors'] += 1
+                logger.warning("通知渠道%s发送失败: %s", name, e)
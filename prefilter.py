@@ -0,0 +1,152 @@
+"""
+本地预筛
+========
+在调用AI模型之前，先在本地对提取出的文本做快速分诊：
+- 告警关键词用编译好的多模式匹配器一次扫描（安装了pyahocorasick时使用Aho-Corasick自动机，
+  否则使用合并后的单个正则）
+- 额外的正则规则
+- 与该URL上一次的内容比较变化比例（先去掉时间戳等易变内容）
+只有命中关键词/规则、或内容有明显变化的页面才交给AI模型分析。
+关键词、正则和变化阈值都可以按URL单独配置。
+"""
+
+import re
+import threading
+import time
+from collections import namedtuple
+
+from result_cache import DEFAULT_VOLATILE_PATTERNS, compile_patterns
+
+TriageVerdict = namedtuple('TriageVerdict', [
+    'escalate',         # 是否需要交给AI模型
+    'reason',           # 判定原因
+    'keywords',         # 命中的关键词
+    'patterns',         # 命中的正则规则
+    'changed',          # 内容是否有明显变化
+    'change_ratio',     # 与上一次相比变化的行比例
+    'elapsed_ms',       # 分诊耗时
+])
+
+
+def normalize_lines(text, patterns):
+    """去掉易变内容后按行切分，返回非空行列表"""
+    for pattern in patterns:
+        text = pattern.sub('#', text)
+    lines = (line.strip() for line in text.splitlines())
+    return [line for line in lines if line]
+
+
+class KeywordMatcher:
+    """多关键词一次扫描，大小写不敏感"""
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+        self._automaton = None
+        self._regex = None
+        if not self.keywords:
+            return
+        try:
+            import ahocorasick
+        except ImportError:
+            self._regex = re.compile('|'.join(re.escape(k) for k in self.keywords))
+            return
+        automaton = ahocorasick.Automaton()
+        for keyword in self.keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        self._automaton = automaton
+
+    def find(self, text):
+        """返回文本中出现过的关键词（去重，按首次出现顺序）"""
+        if not self.keywords:
+            return []
+        text = text.lower()
+        if self._automaton is not None:
+            found = (keyword for _, keyword in self._automaton.iter(text))
+        else:
+            found = (m.group(0) for m in self._regex.finditer(text))
+        return list(dict.fromkeys(found))
+
+
+class _Rule:
+    """某个URL的分诊规则"""
+
+    def __init__(self, keywords, regexes, min_change_ratio):
+        self.matcher = KeywordMatcher(keywords)
+        self.regexes = [re.compile(r, re.IGNORECASE) for r in regexes]
+        self.min_change_ratio = min_change_ratio
+
+
+class PreFilter:
+    """告警关键词/正则 + 内容变化的本地分诊"""
+
+    def __init__(self, keywords, regexes=(), min_change_ratio=0.05, volatile_patterns=None):
+        self.default_rule = _Rule(keywords, regexes, min_change_ratio)
+        self.volatile_patterns = volatile_patterns or compile_patterns(DEFAULT_VOLATILE_PATTERNS)
+        self.stats = {'escalated': 0, 'suppressed': 0}
+        self._rules = {}
+        self._last_lines = {}
+        self._lock = threading.Lock()
+
+    def set_rule(self, url, keywords=None, regexes=None, min_change_ratio=None, extend=True):
+        """设置某个URL的规则；extend=True时在默认关键词/正则基础上追加"""
+        base = self.default_rule
+        if extend:
+            keywords = list(base.matcher.keywords) + list(keywords or [])
+            regexes = [r.pattern for r in base.regexes] + list(regexes or [])
+        self._rules[url] = _Rule(
+            keywords or [],
+            regexes or [],
+            base.min_change_ratio if min_change_ratio is None else min_change_ratio,
+        )
+
+    def forget(self, url):
+        """丢弃某个URL的比较基准（模型分析失败时调用），下次检查重新交给AI模型"""
+        with self._lock:
+            self._last_lines.pop(url, None)
+
+    def _line_set(self, text):
+        return {hash(line) for line in normalize_lines(text, self.volatile_patterns)}
+
+    def _change_ratio(self, url, lines):
+        """与上一次交给AI模型的内容相比变化的行比例；第一次检查视为全部变化"""
+        with self._lock:
+            previous = self._last_lines.get(url)
+        if previous is None:
+            return 1.0
+        union = lines | previous
+        if not union:
+            return 0.0
+        return len(lines ^ previous) / len(union)
+
+    def triage(self, url, text):
+        """对页面文本做本地分诊，返回TriageVerdict"""
+        start = time.perf_counter()
+        rule = self._rules.get(url, self.default_rule)
+        keywords = rule.matcher.find(text)
+        patterns = [r.pattern for r in rule.regexes if r.search(text)]
+        lines = self._line_set(text)
+        change_ratio = self._change_ratio(url, lines)
+        changed = change_ratio >= rule.min_change_ratio
+
+        if keywords or patterns:
+            reason = '命中告警关键词/规则'
+        elif changed:
+            reason = f'内容变化{change_ratio:.0%}'
+        else:
+            reason = '未命中关键词且内容无明显变化'
+        escalate = bool(keywords or patterns or changed)
+        self.stats['escalated' if escalate else 'suppressed'] += 1
+        # 只有交给AI模型的内容才作为比较基准，缓慢的累积变化最终也会触发分析
+        if escalate:
+            with self._lock:
+                self._last_lines[url] = lines
+        return TriageVerdict(
+            escalate=escalate,
+            reason=reason,
+            keywords=keywords,
+            patterns=patterns,
+            changed=changed,
+            change_ratio=change_ratio,
+            elapsed_ms=(time.perf_counter() - start) * 1000,
+        )
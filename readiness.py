@@ -0,0 +1,125 @@
+"""
+页面就绪策略
+============
+替代固定的 networkidle0 + sleep 等待。长轮询/websocket页面永远达不到networkidle0，
+每次截图都会白白耗尽超时。可按URL选择：
+- selector     等待某个CSS选择器出现
+- function     等待一段JS表达式返回真值
+- quiescence   DOM在quiet_ms内没有任何变化（MutationObserver）
+- settle       domcontentloaded 后再等待固定的 settle_ms
+- networkidle  原来的 networkidle0 + settle_ms（兼容）
+同时可以通过请求拦截屏蔽字体、音视频、广告和统计脚本等重资源。
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+STRATEGIES = ('selector', 'function', 'quiescence', 'settle', 'networkidle')
+
+DEFAULT_BLOCK_TYPES = ('font', 'media')
+DEFAULT_BLOCK_HOSTS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
+    'google-analytics.com', 'googletagmanager.com', 'hm.baidu.com',
+    'cnzz.com', 'umeng.com', 'hotjar.com', 'mixpanel.com', 'segment.io',
+)
+
+# 在页面中等待DOM静默：quietMs内没有任何变化即返回，最多等待maxMs
+_QUIESCENCE_JS = """(quietMs, maxMs) => new Promise(resolve => {
+    const start = Date.now();
+    let timer = null;
+    let observer = null;
+    const done = () => {
+        if (observer) observer.disconnect();
+        clearTimeout(timer);
+        resolve(Date.now() - start);
+    };
+    observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs);
+    });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    timer = setTimeout(done, quietMs);
+    setTimeout(done, maxMs);
+})"""
+
+
+class ReadinessConfig:
+    """某个URL的就绪策略"""
+
+    def __init__(self, strategy='quiescence', selector=None, predicate=None,
+                 quiet_ms=500, settle_ms=None, timeout_ms=15000,
+                 block_types=None, block_hosts=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的就绪策略: {strategy}，可选: {', '.join(STRATEGIES)}")
+        if strategy == 'selector' and not selector:
+            raise ValueError("selector策略需要配置SELECTOR")
+        if strategy == 'function' and not predicate:
+            raise ValueError("function策略需要配置PREDICATE")
+        self.strategy = strategy
+        self.selector = selector
+        self.predicate = predicate
+        self.quiet_ms = quiet_ms
+        # 未指定时：settle默认1秒，networkidle保持原来的3秒
+        if settle_ms is None:
+            settle_ms = {'settle': 1000, 'networkidle': 3000}.get(strategy, 0)
+        self.settle_ms = settle_ms
+        self.timeout_ms = timeout_ms
+        # None使用内置列表；显式传入空列表时不屏蔽
+        self.block_types = set(DEFAULT_BLOCK_TYPES if block_types is None else block_types)
+        self.block_hosts = tuple(DEFAULT_BLOCK_HOSTS if block_hosts is None else block_hosts)
+
+    def should_block(self, resource_type, url):
+        if resource_type in self.block_types:
+            return True
+        host = urlsplit(url).hostname or ''
+        return any(host == h or host.endswith('.' + h) for h in self.block_hosts)
+
+
+async def _enable_blocking(page, config):
+    """开启请求拦截，返回需要在结束时移除的处理函数"""
+    if not config.block_types and not config.block_hosts:
+        return None
+
+    def on_request(request):
+        if config.should_block(request.resourceType, request.url):
+            asyncio.ensure_future(request.abort())
+        else:
+            asyncio.ensure_future(request.continue_())
+
+    await page.setRequestInterception(True)
+    page.on('request', on_request)
+    return on_request
+
+
+async def _disable_blocking(page, handler):
+    """页面会被浏览器池复用，结束后恢复"""
+    if handler is None:
+        return
+    page.remove_listener('request', handler)
+    try:
+        await page.setRequestInterception(False)
+    except Exception:
+        pass
+
+
+async def load_page(page, url, config):
+    """按就绪策略打开页面，返回后即可截图"""
+    handler = await _enable_blocking(page, config)
+    try:
+        timeout = config.timeout_ms
+        if config.strategy == 'networkidle':
+            await page.goto(url, {'waitUntil': 'networkidle0', 'timeout': timeout})
+        else:
+            await page.goto(url, {'waitUntil': 'domcontentloaded', 'timeout': timeout})
+
+        if config.strategy == 'selector':
+            await page.waitForSelector(config.selector, {'timeout': timeout})
+        elif config.strategy == 'function':
+            await page.waitForFunction(config.predicate, {'timeout': timeout})
+        elif config.strategy == 'quiescence':
+            await page.evaluate(_QUIESCENCE_JS, config.quiet_ms, timeout)
+
+        if config.settle_ms:
+            await asyncio.sleep(config.settle_ms / 1000)
+    finally:
+        await _disable_blocking(page, handler)
@@ -0,0 +1,174 @@
+"""
+熔断与检查时限
+==============
+目标网站宕机时，每次检查都要等满请求超时（截图时更久），慢目标会占满工作线程和浏览器页面。
+- CircuitBreaker：按主机熔断，closed（正常）→ 连续失败达到阈值 → open（直接跳过）
+  → 冷却时间到 → half_open（只放行一次廉价探测）→ 成功则closed，失败则重新open且冷却时间加倍
+- Deadline：一次检查从获取、渲染到分析共用的截止时间，各阶段的超时都不超过剩余时间
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# acquire() 的返回值
+ALLOW = 'allow'      # 正常执行
+PROBE = 'probe'      # 冷却结束，先做一次探测
+REJECT = 'reject'    # 熔断中，直接跳过
+
+
+class CircuitBreaker:
+    """单个主机的熔断器（线程安全由CircuitBreakers负责）"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30, max_reset_timeout=600, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.open_timeout = reset_timeout
+        self.opened_at = None
+        self.probe_started = None
+        self.trips = 0
+
+    def acquire(self):
+        now = self.clock()
+        if self.state == CLOSED:
+            return ALLOW
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_timeout:
+                return REJECT
+            self.state = HALF_OPEN
+            self.probe_started = now
+            return PROBE
+        # half_open：探测进行中时其它调用直接跳过；探测方没有回报结果时，超时后允许再次探测
+        if now - self.probe_started < self.open_timeout:
+            return REJECT
+        self.probe_started = now
+        return PROBE
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_timeout = self.reset_timeout
+        self.opened_at = self.probe_started = None
+
+    def failure(self):
+        """记录一次失败，本次失败导致熔断时返回True"""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # 探测失败：重新熔断，冷却时间加倍
+            self.open_timeout = min(self.max_reset_timeout, self.open_timeout * 2)
+        elif self.state == OPEN or self.failures < self.failure_threshold:
+            return False
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.trips += 1
+        return True
+
+    def retry_in(self):
+        """距离下一次允许探测的秒数，未熔断时为0"""
+        if self.state == CLOSED:
+            return 0.0
+        start = self.opened_at if self.state == OPEN else self.probe_started
+        return max(0.0, self.open_timeout - (self.clock() - start))
+
+
+class CircuitBreakers:
+    """按主机（host:port）分组的熔断器"""
+
+    def __init__(self, name='fetch', failure_threshold=3, reset_timeout=30, max_reset_timeout=600,
+                 clock=time.monotonic):
+        self.name = name
+        self.options = dict(failure_threshold=failure_threshold, reset_timeout=reset_timeout,
+                            max_reset_timeout=max_reset_timeout, clock=clock)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url):
+        return urlsplit(url).netloc or url
+
+    def _get(self, url):
+        key = self.key(url)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(**self.options)
+        return key, breaker
+
+    def acquire(self, url):
+        """返回 ALLOW / PROBE / REJECT"""
+        with self._lock:
+            key, breaker = self._get(url)
+            decision = breaker.acquire()
+        if decision == PROBE:
+            logger.info("%s熔断器半开，探测 %s", self.name, key)
+        return decision
+
+    def success(self, url):
+        with self._lock:
+            key, breaker = self._get(url)
+            recovered = breaker.state != CLOSED
+            breaker.success()
+        if recovered:
+            logger.info("%s熔断器恢复: %s", self.name, key)
+
+    def failure(self, url):
+        """记录一次失败，本次失败导致熔断时返回True"""
+        with self._lock:
+            key, breaker = self._get(url)
+            tripped = breaker.failure()
+            timeout = breaker.open_timeout
+        if tripped:
+            logger.warning("%s熔断器打开: %s（%.0f秒后探测）", self.name, key, timeout)
+        return tripped
+
+    def record(self, url, ok):
+        if ok:
+            self.success(url)
+        else:
+            self.failure(url)
+
+    def retry_in(self, url):
+        with self._lock:
+            return self._get(url)[1].retry_in()
+
+    def report(self):
+        """每个主机的熔断状态"""
+        with self._lock:
+            return {
+                key: {'state': b.state, 'failures': b.failures, 'trips': b.trips,
+                      'retry_in': round(b.retry_in(), 1)}
+                for key, b in self._breakers.items()
+            }
+
+
+class Deadline:
+    """一次检查的截止时间；seconds为None或0时不限时"""
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.clock = clock
+        self.expires = clock() + seconds if seconds else None
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - self.clock())
+
+    def expired(self):
+        return self.expires is not None and self.clock() >= self.expires
+
+    def timeout(self, default=None):
+        """本阶段可用的超时：不超过default和剩余时间"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(default, remaining)
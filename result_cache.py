@@ -0,0 +1,198 @@
+"""
+分析结果缓存
+============
+页面内容没有变化时直接复用上一次的分析结果，不再调用AI模型：
+- 文本：去掉时间戳、计数器等易变内容（可配置的正则规则）后计算内容哈希
+- 截图：计算感知哈希（dHash），汉明距离在阈值内视为未变化
+- TTL过期 + LRU淘汰，可选SQLite持久化，重启后缓存仍然有效
+"""
+
+import hashlib
+import io
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 默认的易变内容规则：日期时间、Unix时间戳、“x分钟前”之类的相对时间
+DEFAULT_VOLATILE_PATTERNS = [
+    r'\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}日?(?:[ T]?\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?',
+    r'\b\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AaPp][Mm])?\b',
+    r'\b1\d{9}(?:\d{3})?\b',
+    r'\d+\s*(?:秒|分钟|小时|天)前',
+    r'\b\d+\s*(?:seconds?|minutes?|hours?|days?)\s+ago\b',
+]
+
+
+def compile_patterns(patterns):
+    """编译易变内容规则"""
+    return [re.compile(p, re.IGNORECASE) for p in patterns]
+
+
+def normalize_text(text, patterns):
+    """去掉易变内容并压缩空白，得到用于比较的规范化文本"""
+    for pattern in patterns:
+        text = pattern.sub('#', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def content_hash(text, patterns):
+    """规范化文本的SHA-256"""
+    return hashlib.sha256(normalize_text(text, patterns).encode('utf-8')).hexdigest()
+
+
+def perceptual_hash(image_data, hash_size=8):
+    """截图的差值哈希（dHash），返回64位整数"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data)).convert('L')
+    image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    """两个哈希值的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """按内容哈希缓存分析结果"""
+
+    def __init__(self, max_entries=1024, ttl=3600, path=None,
+                 volatile_patterns=None, phash_threshold=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_threshold = phash_threshold
+        self.patterns = compile_patterns(
+            DEFAULT_VOLATILE_PATTERNS if volatile_patterns is None else volatile_patterns
+        )
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        # key -> {'result', 'time', 'phash'}
+        self._entries = OrderedDict()
+        # url -> 上一次的key，用于感知哈希的近似匹配
+        self._last_by_url = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open_store(path)
+
+    # ---------- 持久化 ----------
+
+    def _open_store(self, path):
+        """打开SQLite存储并加载未过期的条目"""
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS result_cache ('
+            'key TEXT PRIMARY KEY, url TEXT, result TEXT, created REAL, phash TEXT)'
+        )
+        self._db.execute('DELETE FROM result_cache WHERE created < ?', (time.time() - self.ttl,))
+        self._db.commit()
+        rows = self._db.execute(
+            'SELECT key, url, result, created, phash FROM result_cache ORDER BY created DESC LIMIT ?',
+            (self.max_entries,),
+        ).fetchall()
+        for key, url, result, created, phash in reversed(rows):
+            self._entries[key] = {
+                'result': result,
+                'time': created,
+                'phash': int(phash, 16) if phash else None,
+            }
+            if url:
+                self._last_by_url[url] = key
+
+    def _persist(self, key, url, entry):
+        if self._db is None:
+            return
+        phash = '%016x' % entry['phash'] if entry['phash'] is not None else None
+        self._db.execute(
+            'INSERT OR REPLACE INTO result_cache (key, url, result, created, phash) VALUES (?, ?, ?, ?, ?)',
+            (key, url, entry['result'], entry['time'], phash),
+        )
+        self._db.commit()
+
+    def _forget(self, key):
+        if self._db is not None:
+            self._db.execute('DELETE FROM result_cache WHERE key = ?', (key,))
+            self._db.commit()
+
+    # ---------- 查询 ----------
+
+    def _get(self, key):
+        """按key取未过期的条目，命中时移到LRU末尾"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['time'] > self.ttl:
+            del self._entries[key]
+            self._forget(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _record(self, url, key, entry):
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        # 命中的结果就是该URL当前内容的结果，304时复用的应是它而不是更早存入的结果
+        self._last_by_url[url] = key
+        return entry['result']
+
+    def lookup_text(self, url, text):
+        """返回 (key, 缓存的结果或None)"""
+        key = 'text:' + content_hash(text, self.patterns)
+        with self._lock:
+            return key, self._record(url, key, self._get(key))
+
+    def lookup_image(self, url, image_data, reuse=True):
+        """返回 (key, 缓存的结果或None)；同一URL上一次截图的感知哈希足够接近时也视为命中
+
+        感知哈希只有64位，状态灯变色这样的小面积变化可能得到相同或很接近的哈希；
+        调用方已经确认截图有变化时传入reuse=False，只计算key、不复用缓存的结果。
+        """
+        phash = perceptual_hash(image_data)
+        key = 'image:%016x' % phash
+        with self._lock:
+            if not reuse:
+                return key, self._record(url, key, None)
+            hit_key, entry = key, self._get(key)
+            if entry is None:
+                last_key = self._last_by_url.get(url)
+                last = self._get(last_key) if last_key else None
+                if (last is not None and last['phash'] is not None
+                        and hamming_distance(last['phash'], phash) <= self.phash_threshold):
+                    hit_key, entry = last_key, last
+            return key, self._record(url, hit_key, entry)
+
+    def last_result(self, url):
+        """某个URL最近一次缓存的结果"""
+        with self._lock:
+            key = self._last_by_url.get(url)
+            entry = self._get(key) if key else None
+            return entry['result'] if entry else None
+
+    def store(self, url, key, result):
+        """保存分析结果，超出容量时淘汰最久未使用的条目"""
+        phash = int(key.split(':', 1)[1], 16) if key.startswith('image:') else None
+        entry = {'result': result, 'time': time.time(), 'phash': phash}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._last_by_url[url] = key
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+                self._forget(old_key)
+            self._persist(key, url, entry)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,428 @@
+"""
+分片工作模式
+============
+单进程的 schedule 循环受限于一个CPU核和一个浏览器。分片模式下：
+- 协调者把URL列表写入共享的SQLite队列，用一致性哈希把URL分给存活的工作进程
+- 工作进程只领取分给自己、且已到期的URL，领取时加租约（lease）
+- 工作进程定期发心跳并续租；心跳超时的工作进程被移出哈希环，
+  它的URL自动分给其它工作进程（一致性哈希保证其余URL不动），未完成的租约过期后可被重新领取
+- 本机用进程池启动N个工作进程，也可以分别启动协调者和工作进程（同一台机器上）
+- 队列使用SQLite的WAL模式，依赖本机共享内存，不能通过NFS/SMB等网络文件系统在多台机器间共享：
+  队列文件记录创建它的主机，其它主机打开时报错（QueueHostError）。多节点部署需要换用独立的消息队列或数据库
+- 工作进程内存超过[memory]节的MAX_RSS_MB时主动退出，本机模式下由run_local重新启动
+"""
+
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+from metrics import setup_logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    url TEXT PRIMARY KEY,
+    interval REAL NOT NULL,
+    next_due REAL NOT NULL,
+    shard TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_checked REAL,
+    last_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_targets_shard_due ON targets (shard, next_due);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    node TEXT,
+    pid INTEGER,
+    started REAL,
+    heartbeat REAL
+);
+"""
+
+
+class HashRing:
+    """一致性哈希环（带虚拟节点）"""
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f"{node}#{i}")
+            self._nodes[key] = node
+            bisect.insort(self._keys, key)
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f"{node}#{i}")
+            if self._nodes.pop(key, None) is not None:
+                self._keys.remove(key)
+
+    def get(self, value):
+        """value所属的节点，环为空时返回None"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(value)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+class QueueHostError(Exception):
+    """队列文件由另一台主机创建"""
+
+
+class WorkQueue:
+    """基于SQLite（WAL模式）的本机共享任务队列
+
+    WAL模式靠同一台机器上的共享内存（-shm文件）协调读写，网络文件系统上多台机器同时访问会损坏数据库，
+    所以只允许创建队列文件的主机使用它。
+    """
+
+    def __init__(self, path, timeout=30, host=None):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        try:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.executescript(SCHEMA)
+            self.host = self._check_host(host or socket.gethostname())
+        except BaseException:
+            self._db.close()
+            raise
+
+    def _check_host(self, host):
+        """第一次打开时记录主机名，之后其它主机打开时报错"""
+        def write(db):
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('host', ?)", (host,))
+            return db.execute("SELECT value FROM meta WHERE key = 'host'").fetchone()[0]
+        owner = self._write(write)
+        if owner != host:
+            raise QueueHostError(
+                f"队列文件 {self.path} 由主机 {owner} 创建，不能在 {host} 上使用：SQLite（WAL模式）"
+                f"不支持多台机器通过网络文件系统共享。请在 {owner} 上运行，多节点部署需要使用独立的消息队列；"
+                f"确认原主机已不再使用后删除该文件即可重新创建"
+            )
+        return host
+
+    def _write(self, func):
+        """在一个IMMEDIATE事务中执行写操作"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self._db)
+                self._db.execute('COMMIT')
+                return result
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # ---------- 目标 ----------
+
+    def sync_targets(self, targets):
+        """写入目标列表 {url: interval}，删除不在列表中的URL"""
+        now = time.time()
+
+        def write(db):
+            existing = {row[0] for row in db.execute('SELECT url FROM targets')}
+            for url, interval in targets.items():
+                if url in existing:
+                    db.execute('UPDATE targets SET interval = ? WHERE url = ?', (interval, url))
+                else:
+                    # 首次检查在一个间隔内随机错开
+                    db.execute(
+                        'INSERT INTO targets (url, interval, next_due) VALUES (?, ?, ?)',
+                        (url, interval, now + random.uniform(0, min(interval, 5))),
+                    )
+            for url in existing - set(targets):
+                db.execute('DELETE FROM targets WHERE url = ?', (url,))
+        self._write(write)
+
+    def assign_shards(self, ring):
+        """按哈希环重新分配所有目标，返回变动的数量"""
+        def write(db):
+            moved = 0
+            for url, shard in db.execute('SELECT url, shard FROM targets').fetchall():
+                owner = ring.get(url)
+                if owner != shard:
+                    db.execute('UPDATE targets SET shard = ? WHERE url = ?', (owner, url))
+                    moved += 1
+            return moved
+        return self._write(write)
+
+    def claim(self, worker_id, limit, lease_ttl):
+        """领取分给自己且已到期、没有有效租约的目标"""
+        now = time.time()
+
+        def write(db):
+            rows = db.execute(
+                'SELECT url FROM targets WHERE shard = ? AND next_due <= ? '
+                'AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY next_due LIMIT ?',
+                (worker_id, now, now, limit),
+            ).fetchall()
+            urls = [row[0] for row in rows]
+            for url in urls:
+                db.execute(
+                    'UPDATE targets SET lease_owner = ?, lease_expires = ? WHERE url = ?',
+                    (worker_id, now + lease_ttl, url),
+                )
+            return urls
+        return self._write(write)
+
+    def complete(self, worker_id, url, status, jitter=0.1):
+        """完成检查：释放租约并安排下一次检查"""
+        now = time.time()
+
+        def write(db):
+            row = db.execute('SELECT interval FROM targets WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return
+            interval = row[0]
+            next_due = now + interval * (1 + random.uniform(-jitter, jitter))
+            db.execute(
+                'UPDATE targets SET next_due = ?, lease_owner = NULL, lease_expires = NULL, '
+                'last_checked = ?, last_status = ? WHERE url = ? AND lease_owner = ?',
+                (next_due, now, status, url, worker_id),
+            )
+        self._write(write)
+
+    def renew_leases(self, worker_id, lease_ttl):
+        now = time.time()
+        self._write(lambda db: db.execute(
+            'UPDATE targets SET lease_expires = ? WHERE lease_owner = ? AND lease_expires >= ?',
+            (now + lease_ttl, worker_id, now),
+        ))
+
+    # ---------- 工作进程 ----------
+
+    def register(self, worker_id, node=None, pid=None):
+        """工作进程启动时登记，返回释放的租约数
+
+        本机模式下重启的工作进程沿用原来的ID（分片不变），原进程留下的租约属于已经中断的检查，
+        不释放的话新进程会一直续租而永远不再检查这些目标；释放后它们立即可以重新领取。
+        """
+        now = time.time()
+
+        def write(db):
+            db.execute(
+                'INSERT INTO workers (worker_id, node, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(worker_id) DO UPDATE SET node = excluded.node, pid = excluded.pid, '
+                'started = excluded.started, heartbeat = excluded.heartbeat',
+                (worker_id, node, pid, now, now),
+            )
+            return db.execute(
+                'UPDATE targets SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?',
+                (worker_id,),
+            ).rowcount
+        return self._write(write)
+
+    def heartbeat(self, worker_id, node=None, pid=None):
+        now = time.time()
+        self._write(lambda db: db.execute(
+            'INSERT INTO workers (worker_id, node, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat',
+            (worker_id, node, pid, now, now),
+        ))
+
+    def live_workers(self, timeout):
+        cutoff = time.time() - timeout
+        return [row[0] for row in self._read('SELECT worker_id FROM workers WHERE heartbeat >= ?', (cutoff,))]
+
+    def remove_dead_workers(self, timeout):
+        """删除心跳超时的工作进程，返回被删除的ID"""
+        cutoff = time.time() - timeout
+
+        def write(db):
+            dead = [row[0] for row in db.execute('SELECT worker_id FROM workers WHERE heartbeat < ?', (cutoff,))]
+            db.execute('DELETE FROM workers WHERE heartbeat < ?', (cutoff,))
+            return dead
+        return self._write(write)
+
+    def unregister(self, worker_id):
+        self._write(lambda db: db.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,)))
+
+    def summary(self):
+        """每个分片的目标数和最近检查状态"""
+        return self._read(
+            'SELECT shard, COUNT(*), SUM(lease_owner IS NOT NULL), MAX(last_checked) FROM targets GROUP BY shard'
+        )
+
+    def close(self):
+        self._db.close()
+
+
+class Coordinator:
+    """协调者：维护目标列表，按存活的工作进程重新分片"""
+
+    def __init__(self, db_path, heartbeat_timeout=30, rebalance_interval=5):
+        self.queue = WorkQueue(db_path)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.rebalance_interval = rebalance_interval
+        self._workers = set()
+        self._ring = HashRing()
+        self._stop = threading.Event()
+
+    def set_targets(self, urls, interval=60):
+        targets = urls if isinstance(urls, dict) else {url: interval for url in urls}
+        self.queue.sync_targets(targets)
+        logger.info("协调者: 共%d个监控目标", len(targets))
+
+    def rebalance(self):
+        """根据心跳更新哈希环，并把目标重新分到存活的工作进程"""
+        for worker_id in self.queue.remove_dead_workers(self.heartbeat_timeout):
+            logger.warning("协调者: 工作进程%s心跳超时，移出", worker_id)
+        live = set(self.queue.live_workers(self.heartbeat_timeout))
+        if live == self._workers:
+            # 新增的目标也需要分配
+            return self.queue.assign_shards(self._ring)
+        for worker_id in self._workers - live:
+            self._ring.remove(worker_id)
+        for worker_id in live - self._workers:
+            self._ring.add(worker_id)
+        self._workers = live
+        moved = self.queue.assign_shards(self._ring)
+        logger.info("协调者: 存活工作进程%d个，重新分配%d个目标", len(live), moved)
+        return moved
+
+    def run(self):
+        while not self._stop.is_set():
+            self.rebalance()
+            self._stop.wait(self.rebalance_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+class Worker:
+    """工作进程：领取自己分片中到期的目标并检查"""
+
+    def __init__(self, db_path, worker_id=None, config_file='secret.cfg', lease_ttl=120,
+                 heartbeat_interval=5, poll_interval=1.0, batch_size=4, agent=None, targets_file=None):
+        # targets_file 为监控目标文件，提供每个目标的模式、就绪策略等参数；未指定时使用配置文件[targets]节的FILE
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.queue = WorkQueue(db_path)
+        self.config_file = config_file
+        self.targets_file = targets_file
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.agent = agent
+        self._stop = threading.Event()
+
+    def _heartbeat_loop(self):
+        """独立线程发心跳并续租，检查耗时较长时租约也不会过期"""
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(self.worker_id)
+                self.queue.renew_leases(self.worker_id, self.lease_ttl)
+            except sqlite3.Error as e:
+                logger.warning("工作进程%s心跳失败: %s", self.worker_id, e)
+
+    def run(self):
+        if self.agent is None:
+            from ai_agent import WebMonitorAgent
+            self.agent = WebMonitorAgent(self.config_file, targets=self.targets_file)
+        released = self.queue.register(self.worker_id, node=socket.gethostname(), pid=os.getpid())
+        if released:
+            logger.warning("工作进程%s释放了上次运行中断时留下的%d个租约", self.worker_id, released)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='heartbeat', daemon=True)
+        heartbeat.start()
+        logger.info("工作进程%s已启动", self.worker_id)
+        try:
+            while not self._stop.is_set():
+                urls = self.queue.claim(self.worker_id, self.batch_size, self.lease_ttl)
+                if not urls:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                for url in urls:
+                    try:
+                        result = self.agent.check_website(url)
+                        status = 'ok' if result is not None else 'error'
+                    except Exception as e:
+                        logger.exception("工作进程%s检查%s出错: %s", self.worker_id, url, e)
+                        status = 'error'
+                    self.queue.complete(self.worker_id, url, status)
+                if self.agent.memory_exceeded:
+                    # 本批已全部完成，退出后不会留下未完成的租约
+                    logger.warning("工作进程%s内存超过上限，退出以便重启", self.worker_id)
+                    break
+        finally:
+            self._stop.set()
+            self.queue.unregister(self.worker_id)
+            self.agent.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _worker_main(db_path, worker_id, config_file, lease_ttl, targets_file=None):
+    """子进程入口"""
+    setup_logging()
+    worker = Worker(db_path, worker_id, config_file, lease_ttl=lease_ttl, targets_file=targets_file)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_local(db_path, urls, interval=60, workers=4, config_file='secret.cfg',
+              lease_ttl=120, heartbeat_timeout=30, targets_file=None):
+    """本机启动协调者和N个工作进程，工作进程异常退出时自动重启
+
+    urls 可以是 {url: 间隔} 字典；targets_file 传给每个工作进程。
+    """
+    coordinator = Coordinator(db_path, heartbeat_timeout=heartbeat_timeout)
+    coordinator.set_targets(urls, interval)
+    node = socket.gethostname()
+    processes = {}
+
+    def spawn(index):
+        worker_id = f"{node}-w{index}"
+        process = multiprocessing.Process(
+            target=_worker_main, args=(db_path, worker_id, config_file, lease_ttl, targets_file),
+            name=worker_id, daemon=True,
+        )
+        process.start()
+        processes[index] = process
+
+    for index in range(workers):
+        spawn(index)
+    logger.info("本机分片模式: %d个工作进程，队列文件 %s", workers, db_path)
+    try:
+        while True:
+            coordinator.rebalance()
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logger.warning("工作进程%s已退出（exitcode=%s），重新启动", process.name, process.exitcode)
+                    spawn(index)
+            time.sleep(coordinator.rebalance_interval)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=10)
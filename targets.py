@@ -0,0 +1,249 @@
+"""
+监控目标文件
+============
+用一个文件声明所有监控目标以及每个目标自己的参数，启动时整体校验，有问题时一次列出全部错误：
+
+    {
+      "defaults": {"interval": 60, "mode": "auto"},
+      "targets": [
+        "https://example.com/",
+        {"url": "https://example.com/status", "interval": 30, "mode": "text",
+         "keywords": ["离线"], "regexes": ["失败率\\s*[:：]\\s*[1-9]\\d*%"]},
+        {"url": "https://example.com/dashboard", "mode": "image", "roi": [0, 0, 1280, 800],
+         "readiness": {"strategy": "selector", "selector": "#main", "timeout_ms": 20000}},
+        {"url": "https://example.com/console", "mode": "dom", "selectors": ["#alarm-list", ".status-bar"],
+         "visual_selectors": ["canvas#cpu-chart", ".health-lamp"]}
+      ]
+    }
+
+mode：text 只做文本分析，image 总是整页截图，dom 总是渲染后提取页面文字，auto（默认）按页面复杂度自动判断。
+capture：复杂网页渲染后的获取方式，dom（提取文字）或 screenshot（整页截图）；
+selectors/xpaths 只提取这些元素的文字，visual_selectors 为只能看图的元素（配置后才截图）。
+支持JSON；安装了PyYAML时也支持YAML（.yaml/.yml）。
+"""
+
+import json
+import re
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from dom_capture import CAPTURES
+
+MODES = ('auto', 'text', 'dom', 'image')
+
+Target = namedtuple('Target', [
+    'url',
+    'interval',     # 检查间隔（秒），None表示使用全局间隔
+    'mode',         # auto / text / dom / image
+    'readiness',    # 就绪策略参数（ReadinessConfig的关键字参数），没有则为空字典
+    'roi',          # 截图分析区域 (x, y, w, h)，没有则为None
+    'keywords',     # 追加的告警关键词
+    'regexes',      # 追加的正则规则
+    'capture',      # 复杂网页的获取方式 dom / screenshot，None表示使用配置文件
+    'selectors',    # 只提取这些CSS选择器的文字
+    'xpaths',       # 只提取这些XPath的文字
+    'visual_selectors',  # 只能看图的视觉信号元素
+])
+
+# 就绪策略中可以配置的参数及类型
+READINESS_FIELDS = {
+    'strategy': str,
+    'selector': str,
+    'predicate': str,
+    'quiet_ms': int,
+    'settle_ms': int,
+    'timeout_ms': int,
+    'block_types': list,
+    'block_hosts': list,
+}
+
+_FIELDS = ('url', 'interval', 'mode', 'readiness', 'roi', 'keywords', 'regexes',
+           'capture', 'selectors', 'xpaths', 'visual_selectors')
+
+
+class TargetsError(ValueError):
+    """目标文件校验失败，errors为全部问题的列表"""
+
+    def __init__(self, errors, source=None):
+        self.errors = list(errors)
+        self.source = source
+        header = f"监控目标文件 {source} 有{len(self.errors)}处错误" if source else f"监控目标有{len(self.errors)}处错误"
+        super().__init__(header + '：\n' + '\n'.join(f"  - {error}" for error in self.errors))
+
+
+def _check_url(url, where, errors):
+    if not isinstance(url, str) or not url.strip():
+        errors.append(f"{where}.url: 不能为空")
+        return None
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        errors.append(f"{where}.url: 不是有效的http/https地址: {url}")
+    return url
+
+
+def _check_interval(value, where, errors):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        errors.append(f"{where}.interval: 必须是大于0的秒数: {value!r}")
+        return None
+    return float(value)
+
+
+def _check_roi(value, where, errors):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(',')]
+    try:
+        roi = tuple(int(v) for v in value)
+    except (TypeError, ValueError):
+        roi = ()
+    if len(roi) != 4 or min(roi) < 0 or roi[2] == 0 or roi[3] == 0:
+        errors.append(f"{where}.roi: 需要4个非负整数 [x, y, 宽, 高]，宽高大于0: {value!r}")
+        return None
+    return roi
+
+
+def _check_strings(value, where, field, errors):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value):
+        errors.append(f"{where}.{field}: 必须是非空字符串列表")
+        return []
+    return value
+
+
+def _check_readiness(value, where, errors):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        errors.append(f"{where}.readiness: 必须是对象")
+        return {}
+    options = {}
+    for key, item in value.items():
+        expected = READINESS_FIELDS.get(key)
+        if expected is None:
+            errors.append(f"{where}.readiness.{key}: 未知参数，可选: {', '.join(READINESS_FIELDS)}")
+        elif expected is int and (isinstance(item, bool) or not isinstance(item, int) or item < 0):
+            errors.append(f"{where}.readiness.{key}: 必须是非负整数（毫秒）: {item!r}")
+        elif expected is list and not (isinstance(item, list) and all(isinstance(v, str) for v in item)):
+            errors.append(f"{where}.readiness.{key}: 必须是字符串列表")
+        elif expected is str and not isinstance(item, str):
+            errors.append(f"{where}.readiness.{key}: 必须是字符串")
+        else:
+            options[key] = item
+    # 策略名和必需参数的检查与运行时一致
+    from readiness import ReadinessConfig
+    try:
+        ReadinessConfig(**options)
+    except ValueError as e:
+        errors.append(f"{where}.readiness: {e}")
+    return options
+
+
+def _parse_target(item, defaults, where, errors):
+    if isinstance(item, str):
+        item = {'url': item}
+    if not isinstance(item, dict):
+        errors.append(f"{where}: 必须是URL字符串或对象")
+        return None
+    for key in item:
+        if key not in _FIELDS:
+            errors.append(f"{where}.{key}: 未知参数，可选: {', '.join(_FIELDS)}")
+    merged = dict(defaults, **item)
+    mode = merged.get('mode') or 'auto'
+    if mode not in MODES:
+        errors.append(f"{where}.mode: 必须是 {'/'.join(MODES)}: {mode!r}")
+    regexes = _check_strings(merged.get('regexes'), where, 'regexes', errors)
+    for pattern in regexes:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            errors.append(f"{where}.regexes: 无效的正则 {pattern!r}: {e}")
+    capture = merged.get('capture')
+    if capture is not None and capture not in CAPTURES:
+        errors.append(f"{where}.capture: 必须是 {'/'.join(CAPTURES)}: {capture!r}")
+        capture = None
+    return Target(
+        url=_check_url(merged.get('url'), where, errors),
+        interval=_check_interval(merged.get('interval'), where, errors),
+        mode=mode,
+        readiness=_check_readiness(merged.get('readiness'), where, errors),
+        roi=_check_roi(merged.get('roi'), where, errors),
+        keywords=_check_strings(merged.get('keywords'), where, 'keywords', errors),
+        regexes=regexes,
+        capture=capture,
+        selectors=_check_strings(merged.get('selectors'), where, 'selectors', errors),
+        xpaths=_check_strings(merged.get('xpaths'), where, 'xpaths', errors),
+        visual_selectors=_check_strings(merged.get('visual_selectors'), where, 'visual_selectors', errors),
+    )
+
+
+def parse_targets(data, source=None):
+    """校验目标定义（列表，或带 defaults/targets 的对象），返回Target列表；有错误时抛出TargetsError"""
+    errors = []
+    if isinstance(data, list):
+        data = {'targets': data}
+    if not isinstance(data, dict):
+        raise TargetsError(["顶层必须是目标列表，或包含 targets 列表的对象"], source)
+    for key in data:
+        if key not in ('defaults', 'targets'):
+            errors.append(f"{key}: 未知的顶层参数，可选: defaults, targets")
+    defaults = data.get('defaults') or {}
+    if not isinstance(defaults, dict):
+        errors.append("defaults: 必须是对象")
+        defaults = {}
+    elif 'url' in defaults:
+        errors.append("defaults.url: 不能在defaults中指定url")
+        defaults = {k: v for k, v in defaults.items() if k != 'url'}
+    items = data.get('targets')
+    if not isinstance(items, list) or not items:
+        errors.append("targets: 必须是非空列表")
+        items = []
+
+    targets = []
+    seen = {}
+    for index, item in enumerate(items):
+        where = f"targets[{index}]"
+        target = _parse_target(item, defaults, where, errors)
+        if target is None or target.url is None:
+            continue
+        if target.url in seen:
+            errors.append(f"{where}.url: 与 targets[{seen[target.url]}] 重复: {target.url}")
+            continue
+        seen[target.url] = index
+        targets.append(target)
+    if errors:
+        raise TargetsError(errors, source)
+    return targets
+
+
+def target_intervals(targets, urls, interval):
+    """每个URL的检查间隔 {url: 秒}：目标文件中有interval时使用它，否则为全局间隔"""
+    own = {target.url: target.interval for target in targets if target.interval is not None}
+    return {url: own.get(url, interval) for url in urls}
+
+
+def load_targets(path):
+    """读取并校验目标文件（.json，或安装了PyYAML时的.yaml/.yml）"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise TargetsError(["读取YAML目标文件需要安装PyYAML，或改用JSON格式"], path) from None
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise TargetsError([f"YAML格式错误: {e}"], path) from None
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise TargetsError([f"JSON格式错误: {e}"], path) from None
+    return parse_targets(data, path)
@@ -0,0 +1,71 @@
+"""
+自适应调度测试：首次检查作为基准，变化/告警/出错时的间隔调整，以及检查抛出异常时不复用旧状态
+"""
+
+import pytest
+
+from adaptive_schedule import IntervalPolicy, Observation, UrlState
+
+ANALYZED = Observation(changed=True, alert=False, error=False, retry_after=None, max_age=None)
+UNCHANGED = Observation(changed=False, alert=False, error=False, retry_after=None, max_age=None)
+ALERT = Observation(changed=True, alert=True, error=False, retry_after=None, max_age=None)
+ERROR = Observation(changed=False, alert=False, error=True, retry_after=None, max_age=None)
+
+
+def make_state():
+    return UrlState(IntervalPolicy(interval=60, min_interval=15, max_interval=1800, backoff=2, tighten=0.5))
+
+
+def test_first_analysis_is_a_baseline():
+    state = make_state()
+    assert state.update(ANALYZED, now=0) == 60
+    assert state.changes == 0 and state.last_change is None
+
+
+def test_changes_after_baseline_tighten():
+    state = make_state()
+    state.update(ANALYZED, now=0)
+    assert state.update(ANALYZED, now=60) == 30
+    assert state.changes == 1
+
+
+def test_unchanged_backs_off():
+    state = make_state()
+    state.update(ANALYZED, now=0)
+    assert state.update(UNCHANGED, now=60) == 120
+    assert state.update(UNCHANGED, now=180) == 240
+
+
+def test_alert_on_first_check_still_tightens():
+    assert make_state().update(ALERT, now=0) == 15
+
+
+def test_errors_retry_quickly_then_back_off():
+    state = make_state()
+    assert [state.update(ERROR, now=i) for i in range(4)] == [15, 30, 60, 60]
+    # 出错不算基准，恢复后的第一次成功检查仍然是基准
+    assert state.update(ANALYZED, now=10) == 60
+
+
+def test_headers_bound_the_delay():
+    state = make_state()
+    state.update(ANALYZED, now=0)
+    assert state.update(UNCHANGED._replace(max_age=600), now=60) == 600
+    assert state.update(ALERT._replace(retry_after=90), now=120) == 90
+
+
+def test_exception_does_not_reuse_previous_observation(make_agent):
+    agent = make_agent()
+    url = 'http://example.com/'
+    agent.get_webpage = lambda url, conditional=True, deadline=None: ('text', '严重告警：磁盘已满')
+    agent.analyze_text = lambda text, url=None, deadline=None: '告警级别：严重\n告警内容：磁盘已满'
+    agent.check_website(url)
+    assert agent.last_observation(url).alert
+
+    def broken(url, conditional=True, deadline=None):
+        raise RuntimeError('bug')
+
+    agent.get_webpage = broken
+    with pytest.raises(RuntimeError):
+        agent.check_website(url)
+    assert agent.last_observation(url) is None
@@ -0,0 +1,47 @@
+"""
+模型回复解析测试
+"""
+
+from alerts import NORMAL_TEXT, UNPARSED_PREFIX, parse_analysis
+
+
+def test_json_reply():
+    reply = ('```json\n{"status": "异常", "alerts": [{"level": "critical", "告警内容": "数据库连接失败", '
+             '"reason": "连接池耗尽", "建议": "重启服务"}]}\n```')
+    result = parse_analysis(reply)
+    assert result.is_alert and result.severity == '严重'
+    alert, = result.alerts
+    assert (alert.content, alert.cause, alert.action) == ('数据库连接失败', '连接池耗尽', '重启服务')
+
+
+def test_normal_json_reply():
+    result = parse_analysis('好的，结果如下：{"status": "正常", "alerts": []}')
+    assert not result.is_alert and not result.unparsed
+    assert result.to_text() == NORMAL_TEXT
+
+
+def test_text_format_round_trip():
+    reply = ('1. 告警级别：警告\n2. 告警内容：CPU使用率95%\n3. 可能的原因：流量突增\n\n'
+             '告警级别：信息\n告警内容：证书30天后过期')
+    result = parse_analysis(reply)
+    assert [a.severity for a in result.alerts] == ['警告', '信息']
+    assert result.severity == '警告'
+    again = parse_analysis(result.to_text())
+    assert again.alerts == result.alerts
+
+
+def test_normal_markers():
+    assert not parse_analysis('经过分析，页面正常。').is_alert
+    assert not parse_analysis('').is_alert
+
+
+def test_unknown_text_is_not_an_alert():
+    reply = '抱歉，我无法访问该网页，请提供更多信息。'
+    result = parse_analysis(reply)
+    assert result.unparsed and not result.is_alert
+    text = result.to_text()
+    assert text.startswith(UNPARSED_PREFIX) and reply in text
+    # 缓存和历史中保存的文本解析回来仍然是未解析，而不是正常或告警
+    again = parse_analysis(text)
+    assert again.unparsed and not again.is_alert and again.to_text() == text
+    assert again.to_dict()['status'] == '未知'
@@ -0,0 +1,67 @@
+"""
+AI分析服务测试：打包回复的拆分，排队时取消的请求
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from alerts import parse_analysis
+from analysis_service import AnalysisService, split_batch_reply
+
+ALERT = {'status': '异常', 'alerts': [{'severity': '严重', 'content': '磁盘空间不足'}]}
+NORMAL = {'status': '正常', 'alerts': []}
+
+
+def test_json_batch_reply():
+    reply = '```json\n' + json.dumps({'1': ALERT, '2': NORMAL}, ensure_ascii=False) + '\n```'
+    first, second = split_batch_reply(reply, 2)
+    assert parse_analysis(first).severity == '严重'
+    assert not parse_analysis(second).is_alert
+
+
+def test_json_batch_reply_with_missing_and_text_parts():
+    reply = json.dumps({'第1部分': '页面正常', '3': NORMAL, '9': ALERT}, ensure_ascii=False)
+    assert split_batch_reply(reply, 3) == ['页面正常', None, json.dumps(NORMAL, ensure_ascii=False)]
+
+
+def test_marker_batch_reply_still_supported():
+    reply = ('=== 第1部分 ===\n' + json.dumps(ALERT, ensure_ascii=False)
+             + '\n=== 第2部分 ===\n' + json.dumps(NORMAL, ensure_ascii=False))
+    first, second = split_batch_reply(reply, 2)
+    assert json.loads(first) == ALERT and json.loads(second) == NORMAL
+
+
+def test_single_object_reply_is_not_a_batch():
+    assert split_batch_reply(json.dumps(NORMAL), 2) == [None, None]
+
+
+def test_cancel_while_queued_releases_in_flight():
+    async def scenario():
+        service = AnalysisService('key', 'http://127.0.0.1:1/v1', max_queue=1)
+        # 不启动worker：队列满后新的请求在put处等待
+        service._queue = asyncio.Queue(maxsize=1)
+        service._queue.put_nowait(('占位', None))
+        messages = [{'role': 'user', 'content': '页面内容'}]
+        first = asyncio.ensure_future(service.complete('m', messages))
+        await asyncio.sleep(0)
+        # 相同的请求合并到第一个请求上
+        second = asyncio.ensure_future(service.complete('m', messages))
+        await asyncio.sleep(0)
+        assert len(service._in_flight) == 1 and service.stats['coalesced'] == 1
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        assert service._in_flight == {}
+
+        # 之后相同的请求重新排队，而不是等待已经取消的请求；已进入队列的请求等worker完成
+        service._queue.get_nowait()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(service.complete('m', messages), 0.05)
+        assert service._queue.qsize() == 1 and len(service._in_flight) == 1
+
+    asyncio.run(scenario())
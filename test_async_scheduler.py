@@ -0,0 +1,96 @@
+"""
+异步调度器测试：上一次检查仍在运行时跳过、按URL的间隔、并发上限，以及检查出错不影响调度
+"""
+
+import asyncio
+
+import pytest
+
+from async_scheduler import AsyncMonitorScheduler
+
+
+@pytest.fixture(autouse=True)
+def no_random_start(monkeypatch):
+    # 首轮之后的第一次检查固定在一个完整间隔之后，而不是在间隔内随机错开
+    monkeypatch.setattr('async_scheduler.random.uniform', lambda a, b: b)
+
+
+class SlowCheck:
+    """记录每个URL的检查次数和同时运行的最大数量"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.counts = {}
+        self.running = 0
+        self.max_running = 0
+        self.overlapping = False
+        self._active = set()
+
+    async def check(self, url):
+        if url in self._active:
+            self.overlapping = True
+        self._active.add(url)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.counts[url] = self.counts.get(url, 0) + 1
+        try:
+            await asyncio.sleep(self.seconds)
+        finally:
+            self.running -= 1
+            self._active.discard(url)
+
+
+def run(scheduler, urls, duration):
+    return asyncio.run(scheduler.run(urls, duration=duration))
+
+
+def test_slow_check_is_skipped_not_stacked():
+    check = SlowCheck(0.3)
+    scheduler = AsyncMonitorScheduler(check.check, interval=0.05, jitter=0)
+    stats = run(scheduler, ['http://slow.example.com/'], 0.5)
+    assert not check.overlapping
+    assert check.counts['http://slow.example.com/'] == 2
+    assert stats['skipped'] >= 5
+    assert stats['started'] == stats['finished'] == 2
+
+
+def test_per_url_intervals_with_coroutine_check():
+    check = SlowCheck(0)
+    fast, slow = 'http://fast.example.com/', 'http://slow.example.com/'
+    scheduler = AsyncMonitorScheduler(check.check, interval=10, jitter=0, intervals={fast: 0.05})
+    run(scheduler, [fast, slow], 0.5)
+    assert check.counts[slow] == 1
+    assert check.counts[fast] >= 5
+
+
+def test_per_host_limit():
+    check = SlowCheck(0.1)
+    urls = [f'http://same.example.com/page{i}' for i in range(6)]
+    scheduler = AsyncMonitorScheduler(check.check, interval=10, per_host_limit=2, jitter=0)
+    run(scheduler, urls, 0.4)
+    assert check.max_running == 2
+    assert sum(check.counts.values()) == 6
+
+
+def test_errors_are_counted_and_scheduling_continues():
+    calls = []
+
+    def check(url):
+        calls.append(url)
+        raise RuntimeError('页面打不开')
+
+    scheduler = AsyncMonitorScheduler(check, interval=0.05, jitter=0)
+    stats = run(scheduler, ['http://broken.example.com/'], 0.3)
+    assert len(calls) >= 3
+    assert stats['errors'] == len(calls)
+
+
+def test_stop_ends_run():
+    async def scenario():
+        scheduler = AsyncMonitorScheduler(SlowCheck(0).check, interval=10, jitter=0)
+        task = asyncio.ensure_future(scheduler.run(['http://example.com/']))
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+        return await asyncio.wait_for(task, 1)
+
+    assert asyncio.run(scenario())['finished'] == 1
@@ -10,9 +10,8 @@ from bs4 import BeautifulSoup
 
 import io
 from PIL import Image
-# 导入Pyppeteer
-from pyppeteer import launch
-import asyncio
+from browser_pool import BrowserPool, DEFAULT_LAUNCH_ARGS
+from readiness import ReadinessConfig, load_page
 
 class BasicMonitor:
     def __init__(self, config_file='secret.cfg'):
@@ -22,54 +21,28 @@ class BasicMonitor:
         print("初始化基本监控器...")
         print(f"读取配置文件: {config_file}")
         print(f"告警关键词: {self.alert_keywords}")
+        # 常驻浏览器池，自动查找Chrome路径
+        self.browser_pool = BrowserPool(
+            size=1,
+            pages_per_browser=1,
+            launch_args=DEFAULT_LAUNCH_ARGS + ['--disable-timeouts-for-profiling'],
+        )
+        print(f"浏览器路径: {self.browser_pool.executable_path or 'pyppeteer自带Chromium'}")
     
     async def capture_screenshot_pyppeteer(self, url):
-        """使用Pyppeteer获取网页截图（异步方法）"""
+        """使用Pyppeteer获取网页截图（异步方法，在浏览器池的事件循环中运行）"""
         try:
-            # 启动Pyppeteer浏览器
-            browser = await launch(
-                headless=True,
-                args=[
-                    '--window-size=1920,1080',
-                    '--ignore-certificate-errors',
-                    '--allow-running-insecure-content',
-                    '--disable-extensions',
-                    '--disable-popup-blocking',
-                    '--disable-default-apps',
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-timeouts-for-profiling'
-                ],
-                executablePath=r'C:\Program Files\Google\Chrome\Application\chrome.exe'  # 手动指定Chrome路径
-            )
-            
-            # 创建新页面
-            page = await browser.newPage()
-            
-            # 设置视图大小
-            await page.setViewport({'width': 1920, 'height': 1080})
-            
-            # 导航到URL（使用更宽松的等待条件）
-            await page.goto(url, {'waitUntil': 'load', 'timeout': 60000})
-            
-            # 等待页面加载完成
-            await asyncio.sleep(5)
-            
-            # 截取整个页面的截图
-            screenshot = await page.screenshot({'fullPage': True, 'type': 'png'})
-            
-            # 关闭浏览器
-            await browser.close()
+            # 从常驻浏览器池借一个页面
+            async with self.browser_pool.page() as page:
+                # 导航到URL，等待DOM静默后即可截图（不再固定等待5秒）
+                await load_page(page, url, ReadinessConfig(timeout_ms=60000))
+                
+                # 截取整个页面的截图
+                screenshot = await page.screenshot({'fullPage': True, 'type': 'png'})
             
             return screenshot
         except Exception as e:
             print(f"Pyppeteer截图出错: {e}")
-            # 确保浏览器关闭
-            try:
-                await browser.close()
-            except:
-                pass
             raise
     
     def capture_screenshot(self, url):
@@ -77,17 +50,8 @@ class BasicMonitor:
         try:
             print("使用Pyppeteer获取网页截图...")
             
-            # 检查当前是否有已运行的事件循环
-            try:
-                loop = asyncio.get_running_loop()
-                # 如果有已运行的事件循环，使用现有的事件循环
-                print("检测到已运行的事件循环，使用现有的事件循环...")
-                # 在当前事件循环中运行协程
-                screenshot = loop.run_until_complete(self.capture_screenshot_pyppeteer(url))
-            except RuntimeError:
-                # 没有已运行的事件循环，使用asyncio.run
-                print("创建新的事件循环...")
-                screenshot = asyncio.run(self.capture_screenshot_pyppeteer(url))
+            # 浏览器池运行在自己的事件循环线程中
+            screenshot = self.browser_pool.run(self.capture_screenshot_pyppeteer(url))
             
             print("Pyppeteer截图成功，保存为temp_screenshot.png")
             # 保存截图为文件
@@ -189,4 +153,7 @@ if __name__ == "__main__":
     ]
     
     # 启动监控
-    monitor.start_monitoring(monitor_urls, interval=60)
\ No newline at end of file
+    try:
+        monitor.start_monitoring(monitor_urls, interval=60)
+    finally:
+        monitor.browser_pool.close()
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+浏览器池测试：并发获取时只创建一个浏览器池，回收后的浏览器位置可以重新分配
+"""
+
+import threading
+import time
+
+import pytest
+
+browser_pool = pytest.importorskip('browser_pool')
+
+
+def test_concurrent_get_browser_pool_creates_one_pool(make_agent, monkeypatch):
+    created = []
+
+    class SlowPool:
+        executable_path = None
+
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(browser_pool, 'BrowserPool', SlowPool)
+    agent = make_agent()
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def worker():
+        barrier.wait()
+        pools.append(agent.get_browser_pool())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
+
+
+class FakePage:
+    async def setViewport(self, viewport):
+        pass
+
+    async def goto(self, url):
+        pass
+
+
+class FakeContext:
+    async def newPage(self):
+        return FakePage()
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    process = None
+
+    async def createIncognitoBrowserContext(self):
+        return FakeContext()
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    async def launch(**options):
+        return FakeBrowser()
+
+    monkeypatch.setattr(browser_pool, 'launch', launch)
+    pool = browser_pool.BrowserPool(size=2, pages_per_browser=1, max_pages_per_browser=1,
+                                    executable_path='/bin/true')
+    yield pool
+    pool.close()
+
+
+def test_recycled_slot_is_reused(pool):
+    async def scenario():
+        first = await pool.acquire()
+        await pool.release(*first)
+        slot = first[0]
+        assert pool.stats['recycles'] == 1
+        assert slot.browser is None and not slot.retiring
+        # 回收后的位置重新启动浏览器，而不是一直被跳过
+        second = await pool.acquire()
+        assert second[0] is slot and slot.browser is not None
+        await pool.release(*second)
+
+    pool.run(scenario())
+    assert pool.stats['launches'] == 2
+
+
+def test_recycle_all_waits_for_busy_pages(pool):
+    pool.max_pages_per_browser = 100
+
+    async def scenario():
+        busy = await pool.acquire()
+        await pool._recycle_all()
+        slot = busy[0]
+        assert slot.retiring and slot.browser is not None
+        await pool.release(*busy)
+        assert slot.browser is None and not slot.retiring
+        assert pool._pick_slot() is slot
+
+    pool.run(scenario())
@@ -0,0 +1,95 @@
+"""
+长页面文本压缩测试：token预算、告警行和新内容优先、页面框架和相似表格行，以及没有tiktoken时按字符估算
+"""
+
+import sys
+
+import pytest
+
+from analysis_service import estimate_text_tokens
+from condense import GAP, Condenser, TokenCounter
+
+URL = 'http://example.com/status'
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'tiktoken', None)
+    return TokenCounter()
+
+
+def page(body, header=('网站首页', '导航：首页 产品 关于我们')):
+    return '\n'.join(list(header) + body)
+
+
+def filler(count, start=0):
+    return [f'第{i}段说明文字，介绍系统的各项功能和使用方法{chr(0x4e00 + i)}' for i in range(start, start + count)]
+
+
+def test_short_text_passes_unchanged(counter):
+    condenser = Condenser(token_budget=1000, counter=counter)
+    text = page(['一切正常'])
+    result = condenser.condense(URL, text)
+    assert result.text == text and result.tokens == result.original_tokens
+    assert condenser.stats['passed'] == 1
+
+
+def test_long_text_fits_budget_and_keeps_alert_at_the_end(counter):
+    condenser = Condenser(token_budget=120, keywords=['错误'], counter=counter)
+    text = page(filler(40) + ['数据库连接错误：连接池耗尽'])
+    result = condenser.condense(URL, text)
+    assert result.original_tokens > 120 and result.tokens <= 120
+    assert '数据库连接错误：连接池耗尽' in result.text
+    assert GAP in result.text and result.lines < result.total_lines
+    # 输出保持原文顺序，页面开头优先于中间的内容
+    assert result.text.startswith('网站首页')
+
+
+def test_alert_context_is_kept(counter):
+    condenser = Condenser(token_budget=120, keywords=['错误'], counter=counter)
+    body = filler(20) + ['服务：订单系统', '状态：错误', '最后更新：昨天'] + filler(20, start=20)
+    result = condenser.condense(URL, page(body))
+    assert '服务：订单系统\n状态：错误\n最后更新：昨天' in result.text
+
+
+def test_boilerplate_dropped_and_new_lines_prioritised(counter):
+    condenser = Condenser(token_budget=150, boilerplate_checks=2, counter=counter)
+    body = filler(30)
+    for _ in range(2):
+        condenser.condense(URL, page(body))
+    result = condenser.condense(URL, page(body + ['新上线：支付通道维护公告']))
+    assert result.boilerplate > 0
+    assert '新上线：支付通道维护公告' in result.text
+    assert '网站首页' not in result.text
+
+
+def test_forget_resets_boilerplate_history(counter):
+    condenser = Condenser(token_budget=150, boilerplate_checks=1, counter=counter)
+    condenser.condense(URL, page(filler(30)))
+    condenser.forget(URL)
+    assert condenser.condense(URL, page(filler(30))).boilerplate == 0
+
+
+def test_similar_table_rows_are_merged(counter):
+    condenser = Condenser(token_budget=100, counter=counter)
+    rows = [f'服务器{i:02d} CPU {i * 3}% 内存 {i * 7}MB 磁盘正常运行中' for i in range(40)]
+    result = condenser.condense(URL, page(rows))
+    assert result.duplicates == 39
+    assert '服务器00' in result.text and '服务器01' not in result.text
+
+
+def test_counter_without_tiktoken_estimates(counter):
+    assert not counter.exact
+    assert counter.count('页面正常 ok') == estimate_text_tokens('页面正常 ok')
+
+
+def test_counter_falls_back_when_encoding_fails(monkeypatch):
+    class BrokenTiktoken:
+        @staticmethod
+        def get_encoding(name):
+            raise RuntimeError('offline')
+
+    monkeypatch.setitem(sys.modules, 'tiktoken', BrokenTiktoken)
+    counter = TokenCounter()
+    assert not counter.exact
+    assert counter.count('abcdefgh') == 2
@@ -0,0 +1,77 @@
+"""
+DOM文字提取测试：用构造的快照检查变化判断、forget，以及快照整理成文本
+"""
+
+import asyncio
+
+import pytest
+
+from dom_capture import DomConfig, DomSnapshot, DomTracker, extract_dom, snapshot_text
+
+URL = 'http://example.com/dashboard'
+
+
+def snapshot(texts=(('#status', '运行中'),), missing=(), visual=()):
+    return DomSnapshot(list(texts), list(missing), list(visual), None, 0)
+
+
+def test_first_snapshot_counts_as_changed():
+    assert DomTracker().update(URL, snapshot()) == (True, True)
+
+
+def test_text_and_visual_changes_are_separate():
+    tracker = DomTracker()
+    tracker.update(URL, snapshot(visual=['DIV|lamp|10|10|rgb(0, 128, 0)']))
+    assert tracker.update(URL, snapshot(visual=['DIV|lamp|10|10|rgb(0, 128, 0)'])) == (False, False)
+    assert tracker.update(URL, snapshot(visual=['DIV|lamp|10|10|rgb(255, 0, 0)'])) == (False, True)
+    assert tracker.update(URL, snapshot([('#status', '已停止')], visual=['DIV|lamp|10|10|rgb(255, 0, 0)'])) == \
+        (True, False)
+
+
+def test_missing_element_is_a_text_change():
+    tracker = DomTracker()
+    tracker.update(URL, snapshot())
+    assert tracker.update(URL, snapshot(texts=(), missing=['#status']))[0]
+
+
+def test_urls_are_tracked_separately():
+    tracker = DomTracker()
+    tracker.update(URL, snapshot())
+    assert tracker.update('http://example.com/other', snapshot()) == (True, True)
+    assert tracker.update(URL, snapshot()) == (False, False)
+
+
+def test_forget_makes_next_snapshot_a_change():
+    tracker = DomTracker()
+    tracker.update(URL, snapshot())
+    tracker.forget(URL)
+    tracker.forget('http://example.com/never-seen')
+    assert tracker.update(URL, snapshot()) == (True, True)
+
+
+def test_snapshot_text():
+    assert snapshot_text(snapshot([('body', '整页文字')])) == '整页文字'
+    text = snapshot_text(snapshot([('#status', '运行中'), ('//table', 'CPU 35%')], missing=['#alerts']))
+    assert text == '【#status】\n运行中\n\n【//table】\nCPU 35%\n\n【#alerts】\n（页面中未找到该元素）'
+
+
+def test_dom_config_validation():
+    assert DomConfig(visual_selectors=['.lamp']).visual
+    assert not DomConfig().visual
+    with pytest.raises(ValueError):
+        DomConfig(capture='pdf')
+
+
+def test_extract_dom_passes_config_to_page():
+    class FakePage:
+        async def evaluate(self, script, *args):
+            self.args = args
+            return {'texts': [['#status', '运行中']], 'missing': ['#alerts'], 'visual': ['CANVAS||300|150|123'],
+                    'clip': {'x': 0, 'y': 10, 'width': 300, 'height': 150}, 'mutations': 2}
+
+    page = FakePage()
+    config = DomConfig(selectors=['#status', '#alerts'], visual_selectors=['canvas'], observe_ms=500)
+    result = asyncio.run(extract_dom(page, config))
+    assert page.args == (['#status', '#alerts'], [], ['canvas'], 500, 200, 100000)
+    assert result.texts == [('#status', '运行中')] and result.missing == ['#alerts']
+    assert result.clip['height'] == 150 and result.mutations == 2
@@ -0,0 +1,83 @@
+"""
+检查历史测试：批量写入、报告去重、按URL和时间窗口查询，以及保留策略
+"""
+
+import time
+
+import pytest
+
+from history import HistoryStore
+
+URL = 'http://example.com/status'
+OTHER = 'http://example.com/other'
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=0.01, prune_interval=3600).start()
+    yield store
+    store.close()
+
+
+def write(store, *records):
+    for record in records:
+        store.record(**record)
+    store.flush(timeout=5)
+
+
+def test_records_are_written_and_queried_newest_first(store):
+    now = time.time()
+    write(store,
+          dict(url=URL, outcome='analyzed', verdict='ok', report='页面正常', ts=now - 20,
+               elapsed_ms=120.0, timings={'fetch': 80.0}),
+          dict(url=URL, outcome='analyzed', verdict='alert', severity='严重', report='告警内容：磁盘已满', ts=now - 10),
+          dict(url=OTHER, outcome='fetch_error', ts=now))
+    first, second = store.last_results(URL)
+    assert (first['verdict'], first['severity'], first['report']) == ('alert', '严重', '告警内容：磁盘已满')
+    assert second['timings'] == {'fetch': 80.0} and second['elapsed_ms'] == 120.0
+    assert len(store.last_results(URL, limit=1)) == 1
+    assert store.summary() == [(OTHER, 1, 0, now), (URL, 2, 1, now - 10)]
+    assert store.stats['written'] == 3
+
+
+def test_identical_reports_are_stored_once(store):
+    write(store, *[dict(url=URL, outcome='analyzed', verdict='ok', report='页面正常') for _ in range(5)])
+    assert store._db.execute('SELECT COUNT(*) FROM reports').fetchone() == (1,)
+    assert [row['report'] for row in store.last_results(URL)] == ['页面正常'] * 5
+
+
+def test_alerts_in_time_window(store):
+    now = time.time()
+    write(store,
+          dict(url=URL, outcome='analyzed', verdict='alert', severity='警告', report='旧告警', ts=now - 2 * DAY),
+          dict(url=URL, outcome='analyzed', verdict='alert', severity='严重', report='新告警', ts=now - 60),
+          dict(url=OTHER, outcome='analyzed', verdict='alert', severity='信息', report='其它网站', ts=now - 30),
+          dict(url=URL, outcome='analyzed', verdict='ok', report='页面正常', ts=now - 10))
+    assert [row['report'] for row in store.alerts(since=now - DAY)] == ['其它网站', '新告警']
+    assert [row['report'] for row in store.alerts(since=now - DAY, url=URL)] == ['新告警']
+    assert [row['report'] for row in store.alerts(until=now - DAY)] == ['旧告警']
+
+
+def test_prune_by_age_and_rows_per_url(store):
+    now = time.time()
+    write(store,
+          dict(url=URL, outcome='analyzed', report='过期的报告', ts=now - 40 * DAY),
+          *[dict(url=OTHER, outcome='analyzed', report=f'报告{i}', ts=now - 100 + i) for i in range(5)])
+    # 后台线程写入第一批记录后可能已经按默认的30天清理过，按累计的清理条数检查
+    store.prune(retention_days=30, max_rows_per_url=3)
+    assert store.stats['pruned'] == 3
+    assert store.last_results(URL) == []
+    assert [row['report'] for row in store.last_results(OTHER)] == ['报告4', '报告3', '报告2']
+    # 没有记录引用的报告一并删除
+    reports = {text for (text,) in store._db.execute('SELECT text FROM reports')}
+    assert reports == {'报告2', '报告3', '报告4'}
+    assert store.prune(retention_days=30, max_rows_per_url=3) == 0
+
+
+def test_full_queue_drops_records(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), max_queue=2)
+    for _ in range(3):
+        store.record(URL, 'analyzed')
+    assert store.stats == dict(store.stats, queued=2, dropped=1)
+    store.close()
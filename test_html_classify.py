@@ -0,0 +1,66 @@
+"""
+网页分类测试：各解析后端（未安装的跳过）对同一批页面给出相同的分类和文本
+"""
+
+import pytest
+
+from html_classify import BACKENDS, MAX_SCRIPTS, StreamBackend, get_backend
+
+
+def make_backend(name):
+    try:
+        return BACKENDS[name]()
+    except ImportError as e:
+        pytest.skip(f"{name}未安装: {e}")
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request):
+    return make_backend(request.param)
+
+
+PAGES = {
+    'simple': ('<html><head><title>状态</title><style>p {color: red}</style></head>'
+               '<body><h1>系统状态</h1><p>一切正常</p><!-- 注释 --><script>var a = 1;</script>'
+               '<ul><li>CPU 35%</li><li>内存 60%</li></ul></body></html>'),
+    'entities': '<html><body><p>磁盘 &gt; 90% &amp; 告警</p><noscript>请启用JS</noscript></body></html>',
+    'empty': '',
+    'scripts': '<html><body>' + '<script>load();</script>' * MAX_SCRIPTS + '<div id="app"></div></body></html>',
+    'long_text': '<html><body>' + '<p>很长的说明文字。</p>' * 2000 + '</body></html>',
+}
+
+EXPECTED = {
+    'simple': ('text', '状态\n系统状态\n一切正常\nCPU 35%\n内存 60%'),
+    'entities': ('text', '磁盘 > 90% & 告警'),
+    'empty': ('text', ''),
+    'scripts': ('complex', None),
+    'long_text': ('complex', None),
+}
+
+
+@pytest.mark.parametrize('page', list(PAGES))
+def test_backends_agree(backend, page):
+    assert backend.classify(PAGES[page]) == EXPECTED[page]
+
+
+def test_extract_text_ignores_thresholds(backend):
+    text = backend.extract_text(PAGES['scripts'].replace('<div id="app"></div>', '<p>加载中</p>'))
+    assert text == '加载中'
+
+
+def test_thresholds_are_configurable(backend):
+    assert backend.classify(PAGES['simple'], max_scripts=1) == ('complex', None)
+    assert backend.classify(PAGES['simple'], max_text=10) == ('complex', None)
+
+
+def test_stream_backend_chunk_boundaries_do_not_split_text():
+    assert StreamBackend(chunk_size=7).classify(PAGES['simple']) == EXPECTED['simple']
+    # 没有标签的长文本也能在超过阈值时提前结束
+    assert StreamBackend(chunk_size=100).classify('<p>' + '字' * 20000, max_text=500) == ('complex', None)
+
+
+def test_get_backend():
+    assert get_backend('stream').name == 'stream'
+    assert get_backend('auto').name in BACKENDS
+    with pytest.raises(ValueError):
+        get_backend('html5lib')
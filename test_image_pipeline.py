@@ -0,0 +1,91 @@
+"""
+截图处理流水线测试：ROI裁剪、缩放和切块、字节预算内的编码，以及只编码变化区域
+"""
+
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from image_pipeline import (crop_roi, decode_image, encode_image, fit_image, image_message_parts, parse_roi,
+                            prepare_images, prepare_regions, split_tiles, to_data_url)
+
+
+def png(width, height, color='white'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def noise(width, height):
+    """随机噪点图，JPEG压缩效果差，用来测试字节预算"""
+    return Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+
+
+def sizes(encoded):
+    return [decode_image(data).size for data, _ in encoded]
+
+
+def test_parse_roi():
+    assert parse_roi('0, 120,1920,900') == (0, 120, 1920, 900)
+    assert parse_roi('') is None
+    for bad in ('1,2,3', '0,0,0,10'):
+        with pytest.raises(ValueError):
+            parse_roi(bad)
+
+
+def test_crop_roi_clamps_to_image():
+    image = Image.new('RGB', (100, 80))
+    assert crop_roi(image, (50, 40, 100, 100)).size == (50, 40)
+    assert crop_roi(image, (200, 200, 10, 10)) is image
+    assert crop_roi(image, None) is image
+
+
+def test_fit_image_scales_width_and_tile_count():
+    assert fit_image(Image.new('RGB', (2560, 1000)), 1280, 1280, 4).size == (1280, 500)
+    # 长截图按块数上限整体缩小
+    assert fit_image(Image.new('RGB', (1000, 8000)), 1280, 1000, 4).size == (500, 4000)
+    assert fit_image(Image.new('RGB', (640, 480)), 1280, 1280, 4).size == (640, 480)
+
+
+def test_split_tiles():
+    tiles = split_tiles(Image.new('RGB', (100, 250)), 100)
+    assert [tile.size for tile in tiles] == [(100, 100), (100, 100), (100, 50)]
+
+
+def test_encode_image_lowers_quality_to_fit_budget():
+    image = noise(200, 200)
+    full = encode_image(image, quality=95)
+    small = encode_image(image, quality=95, min_quality=20, max_bytes=len(full) // 2)
+    assert len(small) < len(full)
+    # 达到最低质量后即使仍超出预算也返回结果
+    assert encode_image(image, quality=40, min_quality=40, max_bytes=10)
+
+
+def test_encode_formats():
+    image = Image.new('RGBA', (20, 20))
+    assert encode_image(image, 'jpg')[:3] == b'\xff\xd8\xff'
+    assert Image.open(io.BytesIO(encode_image(image, 'PNG'))).format == 'PNG'
+
+
+def test_prepare_images_crops_scales_and_tiles():
+    # 裁剪为2000x1600，按宽度缩小为1000x800，超过3块的高度后再缩小为750x600
+    encoded = prepare_images(png(3000, 2000), roi=(0, 0, 2000, 1600), max_width=1000, tile_height=200,
+                             max_tiles=3, format='PNG', max_bytes=0)
+    assert sizes(encoded) == [(750, 200), (750, 200), (750, 200)]
+    assert all(fmt == 'PNG' for _, fmt in encoded)
+
+
+def test_prepare_regions_one_tile_per_region():
+    encoded = prepare_regions(png(400, 300), [(10, 10, 50, 40), (300, 200, 200, 200)], format='PNG', max_bytes=0)
+    assert sizes(encoded) == [(50, 40), (100, 100)]
+
+
+def test_message_parts_are_data_urls():
+    part, = image_message_parts(png(64, 64), format='JPEG')
+    url = part['image_url']['url']
+    assert part['type'] == 'image_url' and url.startswith('data:image/jpeg;base64,')
+    assert decode_image(base64.b64decode(url.split(',', 1)[1])).size == (64, 64)
+    assert to_data_url(b'x', 'webp') == 'data:image/webp;base64,eA=='
@@ -0,0 +1,95 @@
+"""
+内存预算测试：采样间隔、浏览器回收、本进程整理内存后仍超限，以及没有malloc_trim时的回退
+"""
+
+import pytest
+
+import memory
+from memory import MB, MemoryGuard
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """本进程RSS依次取 values['agent'] 中的值，浏览器进程树RSS取 values['browser']"""
+    values = {'agent': [100 * MB], 'browser': None, 'trims': 0}
+
+    def rss_bytes(pid=None):
+        return values['agent'].pop(0) if len(values['agent']) > 1 else values['agent'][0]
+
+    def trim_memory():
+        values['trims'] += 1
+        return 0
+
+    monkeypatch.setattr(memory, 'rss_bytes', rss_bytes)
+    monkeypatch.setattr(memory, 'process_tree_rss', lambda pids: values['browser'])
+    monkeypatch.setattr(memory, 'trim_memory', trim_memory)
+    return values
+
+
+def test_samples_only_after_interval(rss):
+    clock = Clock()
+    guard = MemoryGuard(max_rss=500 * MB, check_interval=30, clock=clock)
+    assert guard.check().rss == 100 * MB
+    clock.now = 10
+    assert guard.check() is None
+    assert guard.check(force=True) is not None
+    clock.now = 45
+    assert guard.check() is not None
+    assert guard.stats['samples'] == 3
+
+
+def test_browser_over_budget_is_recycled(rss):
+    recycled = []
+    rss['browser'] = 900 * MB
+    guard = MemoryGuard(browser_max_rss=800 * MB, browser_pids=lambda: [1234],
+                        recycle_browsers=lambda: recycled.append(True))
+    status = guard.check()
+    assert status.browser_rss == 900 * MB and not status.exceeded
+    assert recycled == [True] and guard.stats['browser_recycles'] == 1
+
+    rss['browser'] = 300 * MB
+    guard.check(force=True)
+    assert recycled == [True]
+
+
+def test_trim_brings_process_back_under_limit(rss):
+    rss['agent'] = [600 * MB, 400 * MB]
+    guard = MemoryGuard(max_rss=500 * MB)
+    status = guard.check()
+    assert rss['trims'] == 1 and guard.stats['trims'] == 1
+    assert status.rss == 400 * MB and not status.exceeded
+
+
+def test_still_over_limit_after_trim_marks_exceeded(rss):
+    rss['agent'] = [600 * MB, 550 * MB]
+    guard = MemoryGuard(max_rss=500 * MB)
+    assert guard.check().exceeded
+    assert guard.exceeded and guard.report()['exceeded']
+
+
+def test_no_limits_only_samples(rss):
+    rss['agent'] = [10 ** 12]
+    rss['browser'] = 10 ** 12
+    guard = MemoryGuard(max_rss=0, browser_pids=lambda: [1], recycle_browsers=pytest.fail)
+    assert not guard.check().exceeded
+    assert rss['trims'] == 0
+
+
+def test_trim_memory_without_malloc_trim(monkeypatch):
+    def missing(name):
+        raise OSError('no libc')
+
+    monkeypatch.setattr(memory, '_libc', None)
+    monkeypatch.setattr(memory.ctypes, 'CDLL', missing)
+    assert memory.trim_memory() >= 0
+    assert memory._libc is False
+    # 之后不再尝试加载
+    assert memory.trim_memory() >= 0
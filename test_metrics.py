@@ -0,0 +1,104 @@
+"""
+指标测试：计数器和仪表、分阶段耗时、直方图的Prometheus输出，以及JSON Lines事件日志
+"""
+
+import json
+import urllib.request
+
+import pytest
+
+from metrics import Metrics
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    metrics = Metrics(prefix='t', event_log=str(tmp_path / 'events.jsonl'))
+    yield metrics
+    metrics.close()
+
+
+def events(tmp_path):
+    with open(tmp_path / 'events.jsonl', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_counters_and_gauges(metrics):
+    metrics.incr('checks_total', outcome='analyzed')
+    metrics.incr('checks_total', 2, outcome='analyzed')
+    metrics.incr('checks_total', outcome='cache_hit')
+    metrics.set_gauge('memory_rss_bytes', 100, process='agent')
+    metrics.set_gauge('memory_rss_bytes', 200, process='agent')
+    assert metrics.snapshot()[('checks_total', (('outcome', 'analyzed'),))] == 3
+    text = metrics.render_prometheus()
+    assert text.count('# TYPE t_checks_total counter') == 1
+    assert 't_checks_total{outcome="cache_hit"} 1' in text
+    assert '# TYPE t_memory_rss_bytes gauge\nt_memory_rss_bytes{process="agent"} 200' in text
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    for value in (0.5, 2, 2, 100):
+        metrics.observe('tokens', value, buckets=(1, 5, 10), model='m')
+    metrics.set_help('tokens', '模型token用量')
+    text = metrics.render_prometheus()
+    assert '# HELP t_tokens 模型token用量\n# TYPE t_tokens histogram' in text
+    for line in ('t_tokens_bucket{model="m",le="1"} 1', 't_tokens_bucket{model="m",le="5"} 3',
+                 't_tokens_bucket{model="m",le="10"} 3', 't_tokens_bucket{model="m",le="+Inf"} 4',
+                 't_tokens_sum{model="m"} 104.5', 't_tokens_count{model="m"} 4'):
+        assert line in text
+
+
+def test_label_values_are_escaped(metrics):
+    metrics.incr('errors_total', error='say "hi"\\')
+    assert 't_errors_total{error="say \\"hi\\"\\\\"} 1' in metrics.render_prometheus()
+
+
+def test_spans_record_timings_errors_and_events(metrics, tmp_path):
+    with metrics.trace() as timings:
+        with metrics.span('fetch', 'http://example.com/'):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.span('analyze', 'http://example.com/'):
+                raise ValueError('模型超时')
+        with metrics.span('fetch'):
+            pass
+    assert set(timings) == {'fetch', 'analyze'}
+    # trace之外的阶段不会写入上一次的记录
+    with metrics.span('encode'):
+        pass
+    assert 'encode' not in timings
+
+    text = metrics.render_prometheus()
+    assert 't_stage_seconds_count{stage="fetch"} 2' in text
+    assert 't_stage_errors_total{stage="analyze"} 1' in text
+    spans = [e for e in events(tmp_path) if e['event'] == 'span']
+    assert [e['stage'] for e in spans] == ['fetch', 'analyze', 'fetch', 'encode']
+    assert spans[1]['error'] == "ValueError('模型超时')" and spans[0]['url'] == 'http://example.com/'
+
+
+def test_event_log_lines(metrics, tmp_path):
+    metrics.event('check', url='http://example.com/', outcome='analyzed', elapsed=1.5)
+    record, = events(tmp_path)
+    assert record['event'] == 'check' and record['outcome'] == 'analyzed' and 'ts' in record
+
+
+def test_without_event_log_events_are_ignored():
+    metrics = Metrics()
+    metrics.event('check', url='http://example.com/')
+    with metrics.span('fetch'):
+        pass
+    metrics.close()
+
+
+def test_write_prometheus_file(metrics, tmp_path):
+    metrics.incr('checks_total')
+    path = tmp_path / 'metrics.prom'
+    metrics.write_prometheus(str(path))
+    assert path.read_text(encoding='utf-8') == metrics.render_prometheus()
+    assert not (tmp_path / 'metrics.prom.tmp').exists()
+
+
+def test_http_endpoint(metrics):
+    metrics.incr('checks_total')
+    port = metrics.serve(0, host='127.0.0.1')
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+        assert 't_checks_total 1' in response.read().decode('utf-8')
@@ -0,0 +1,71 @@
+"""
+告警通知测试：去重、汇总、恢复后重新通知，以及无法解析的结果不算恢复
+"""
+
+import pytest
+
+from alerts import UNPARSED_PREFIX, parse_analysis
+from notifier import MemorySink, Notifier
+
+URL = 'http://example.com/status'
+
+DISK = parse_analysis('告警级别：严重\n告警内容：磁盘使用率95%')
+DISK_LATER = parse_analysis('告警级别：严重\n告警内容：磁盘使用率97%')
+CPU = parse_analysis('告警级别：警告\n告警内容：CPU使用率过高')
+NORMAL = parse_analysis('页面正常')
+UNPARSED = parse_analysis(UNPARSED_PREFIX + '\n模型输出了无关的内容')
+
+
+@pytest.fixture
+def notify():
+    """依次提交 (url, result)，关闭通知器后返回内存渠道收到的汇总"""
+    def run(*submissions, **options):
+        sink = MemorySink()
+        notifier = Notifier([sink], **dict({'digest_window': 0.05}, **options)).start()
+        for url, result in submissions:
+            notifier.submit(url, result)
+        notifier.close(timeout=5)
+        return sink.digests, notifier.stats
+    return run
+
+
+def alerts(digests):
+    return [(item.url, item.alert.content) for digest in digests for item in digest.items]
+
+
+def test_repeated_alert_is_deduplicated(notify):
+    digests, stats = notify((URL, DISK), (URL, DISK_LATER), (URL, DISK))
+    # 只有数字不同的告警视为同一条
+    assert alerts(digests) == [(URL, '磁盘使用率95%')]
+    assert stats['submitted'] == 3 and stats['suppressed'] == 2
+
+
+def test_alerts_in_window_are_one_digest_sorted_by_severity(notify):
+    other = 'http://example.com/other'
+    digests, stats = notify((other, CPU), (URL, DISK), digest_window=1)
+    digest, = digests
+    assert [item.severity for item in digest.items] == ['严重', '警告']
+    assert stats['digests'] == 1 and stats['delivered'] == 1
+
+
+def test_digest_max_splits_digests(notify):
+    urls = [f'http://site{i}.example.com/' for i in range(5)]
+    digests, _ = notify(*[(url, DISK) for url in urls], digest_window=1, digest_max=2)
+    assert [len(digest.items) for digest in digests] == [2, 2, 1]
+
+
+def test_recovery_allows_notifying_again(notify):
+    digests, _ = notify((URL, DISK), (URL, NORMAL), (URL, DISK))
+    assert alerts(digests) == [(URL, '磁盘使用率95%')] * 2
+
+
+def test_unparsed_result_is_not_a_recovery(notify):
+    assert UNPARSED.unparsed and not UNPARSED.is_alert
+    digests, stats = notify((URL, DISK), (URL, UNPARSED), (URL, DISK))
+    assert alerts(digests) == [(URL, '磁盘使用率95%')]
+    assert stats['suppressed'] == 1
+
+
+def test_min_severity_filters_alerts(notify):
+    digests, _ = notify((URL, CPU), (URL, DISK), min_severity='严重')
+    assert alerts(digests) == [(URL, '磁盘使用率95%')]
@@ -0,0 +1,54 @@
+"""
+本地预筛测试：关键词/变化判定，以及模型出错后不把未分析的内容当作比较基准
+"""
+
+from prefilter import PreFilter
+
+URL = 'http://example.com/status'
+PAGE = '\n'.join(f'服务{i} 运行中' for i in range(20))
+
+
+def make_prefilter():
+    return PreFilter(['告警', 'error'], regexes=[r'失败\d+次'], min_change_ratio=0.1)
+
+
+def test_first_check_escalates():
+    verdict = make_prefilter().triage(URL, PAGE)
+    assert verdict.escalate and verdict.changed
+
+
+def test_unchanged_page_is_suppressed():
+    prefilter = make_prefilter()
+    prefilter.triage(URL, PAGE)
+    verdict = prefilter.triage(URL, PAGE.replace('运行中', '运行中 '))
+    assert not verdict.escalate
+    assert prefilter.stats == {'escalated': 1, 'suppressed': 1}
+
+
+def test_keywords_and_regexes_escalate():
+    prefilter = make_prefilter()
+    prefilter.triage(URL, PAGE)
+    assert prefilter.triage(URL, PAGE + '\nERROR: disk full').keywords
+    assert prefilter.triage(URL, PAGE + '\n同步失败3次').patterns
+
+
+def test_forget_resets_baseline():
+    prefilter = make_prefilter()
+    prefilter.triage(URL, PAGE)
+    prefilter.forget(URL)
+    assert prefilter.triage(URL, PAGE).escalate
+
+
+def test_model_error_does_not_suppress_next_check(make_agent):
+    agent = make_agent()
+    results = iter(['分析文本时出错: 超时', '页面正常'])
+    agent.get_webpage = lambda url, conditional=True, deadline=None: ('text', PAGE)
+    agent.analyze_text = lambda text, url=None, deadline=None: next(results)
+
+    agent._check_website(URL)
+    assert agent.last_observation(URL).error
+    # 同样的内容上次没有分析成功，这次仍然要交给模型，而不是在本地判定为没有变化
+    assert agent._check_website(URL) == '页面正常'
+    outcomes = {dict(labels)['outcome']: value for (name, labels), value in agent.metrics.snapshot().items()
+                if name == 'checks_total'}
+    assert outcomes == {'model_error': 1, 'analyzed': 1}
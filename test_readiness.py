@@ -0,0 +1,28 @@
+"""
+页面就绪策略测试：配置文件中留空的屏蔽列表不会关闭内置列表
+"""
+
+from readiness import DEFAULT_BLOCK_HOSTS, DEFAULT_BLOCK_TYPES, ReadinessConfig
+
+URL = 'http://example.com/dashboard'
+
+
+def test_empty_block_lists_keep_defaults(make_agent):
+    agent = make_agent("[readiness]\nBLOCK_TYPES =\nBLOCK_HOSTS =\n")
+    readiness = agent.readiness_for(URL)
+    assert readiness.block_types == set(DEFAULT_BLOCK_TYPES)
+    assert readiness.block_hosts == DEFAULT_BLOCK_HOSTS
+    assert readiness.should_block('script', 'https://www.google-analytics.com/analytics.js')
+
+
+def test_empty_per_url_value_keeps_section_value(make_agent):
+    agent = make_agent("[readiness]\nBLOCK_HOSTS = ads.example.net\n\n"
+                       f"[readiness:{URL}]\nBLOCK_HOSTS =\nBLOCK_TYPES = image\n")
+    readiness = agent.readiness_for(URL)
+    assert readiness.block_hosts == ('ads.example.net',)
+    assert readiness.block_types == {'image'}
+
+
+def test_explicit_empty_list_disables_blocking():
+    readiness = ReadinessConfig(block_types=[], block_hosts=[])
+    assert not readiness.should_block('font', 'https://doubleclick.net/x.js')
@@ -0,0 +1,93 @@
+"""
+熔断器和截止时间测试
+"""
+
+from resilience import ALLOW, CLOSED, HALF_OPEN, OPEN, PROBE, REJECT, CircuitBreaker, CircuitBreakers, Deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    assert not breaker.failure()
+    assert not breaker.failure()
+    assert breaker.acquire() == ALLOW
+    assert breaker.failure()
+    assert breaker.state == OPEN
+    assert breaker.acquire() == REJECT
+    assert breaker.retry_in() == 30
+
+
+def test_breaker_probe_success_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.acquire() == PROBE
+    assert breaker.state == HALF_OPEN
+    # 探测进行中时其它调用跳过
+    assert breaker.acquire() == REJECT
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.acquire() == ALLOW
+
+
+def test_breaker_probe_failure_doubles_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, max_reset_timeout=100, clock=clock)
+    breaker.failure()
+    for expected in (60, 100, 100):
+        clock.now += breaker.open_timeout
+        assert breaker.acquire() == PROBE
+        assert breaker.failure()
+        assert breaker.state == OPEN
+        assert breaker.open_timeout == expected
+    assert breaker.trips == 4
+
+
+def test_breakers_are_per_host():
+    clock = FakeClock()
+    breakers = CircuitBreakers(failure_threshold=1, clock=clock)
+    breakers.record('http://a.example.com/x', False)
+    assert breakers.acquire('http://a.example.com/y') == REJECT
+    assert breakers.acquire('http://b.example.com/x') == ALLOW
+    assert breakers.report()['a.example.com']['state'] == OPEN
+
+
+def test_deadline_caps_timeout():
+    clock = FakeClock()
+    deadline = Deadline(20, clock=clock)
+    assert deadline.timeout(10) == 10
+    assert deadline.timeout() == 20
+    clock.now += 15
+    assert deadline.timeout(10) == 5
+    clock.now += 10
+    assert deadline.expired() and deadline.timeout(10) == 0
+
+
+def test_unlimited_deadline():
+    deadline = Deadline(None)
+    assert deadline.remaining() is None and not deadline.expired()
+    assert deadline.timeout(10) == 10 and deadline.timeout() is None
+
+
+def test_fetch_timeout_is_capped_by_http_timeout(make_agent):
+    agent = make_agent("[http]\nTIMEOUT = 7\n\n[resilience]\nCHECK_DEADLINE = 120\n")
+    timeouts = []
+
+    def fetch(url, conditional=True, timeout=None):
+        timeouts.append(timeout)
+        raise ConnectionError('refused')
+
+    agent.fetcher.fetch = fetch
+    assert agent.get_webpage('http://example.com/', deadline=Deadline(120))[0] == 'error'
+    assert agent.get_webpage('http://example.com/', deadline=Deadline(3))[0] == 'error'
+    assert timeouts[0] == 7
+    assert 0 < timeouts[1] <= 3
@@ -0,0 +1,102 @@
+"""
+分析结果缓存测试：命中后304复用的结果，以及模型出错后不复用旧结果
+"""
+
+from result_cache import ResultCache
+
+URL = 'http://example.com/status'
+
+
+def test_text_hit_becomes_last_result():
+    cache = ResultCache()
+    key_a, _ = cache.lookup_text(URL, '内容A')
+    cache.store(URL, key_a, '结果A')
+    key_b, _ = cache.lookup_text(URL, '内容B')
+    cache.store(URL, key_b, '结果B')
+    assert cache.last_result(URL) == '结果B'
+
+    # 页面变回A时命中A的缓存，之后304复用的应是A的结果
+    _, cached = cache.lookup_text(URL, '内容A')
+    assert cached == '结果A'
+    assert cache.last_result(URL) == '结果A'
+
+
+def test_text_ignores_volatile_content():
+    cache = ResultCache()
+    key, _ = cache.lookup_text(URL, '更新于 2024-05-01 10:00:00 一切正常')
+    cache.store(URL, key, '正常')
+    _, cached = cache.lookup_text(URL, '更新于 2024-05-02 11:30:00 一切正常')
+    assert cached == '正常'
+    assert cache.stats['hits'] == 1
+
+
+def test_miss_keeps_last_result():
+    cache = ResultCache()
+    key, _ = cache.lookup_text(URL, '内容A')
+    cache.store(URL, key, '结果A')
+    _, cached = cache.lookup_text(URL, '内容C')
+    assert cached is None
+    assert cache.last_result(URL) == '结果A'
+
+
+def test_model_error_forgets_validators(make_agent):
+    agent = make_agent("[prefilter]\nENABLED = false\n")
+    agent.fetcher.validators.update(URL, {'ETag': '"v2"'}, 100)
+    agent.get_webpage = lambda url, conditional=True, deadline=None: ('text', '新的页面内容')
+    agent.analyze_text = lambda text, url=None, deadline=None: '分析文本时出错: 超时'
+
+    agent._check_website(URL)
+
+    # 下次检查不再带条件头，不会因为304复用这次没有分析出来的内容对应的旧结果
+    assert agent.fetcher.validators.conditional_headers(URL) == {}
+    assert agent.last_observation(URL).error
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {'Last-Modified': 'Wed, 01 May 2024 00:00:00 GMT'}
+
+    def raise_for_status(self):
+        pass
+
+
+def fake_fetcher(agent, html):
+    """记录每次请求是否带条件头；带条件头时返回304"""
+    calls = []
+
+    def fetch(url, conditional=True, timeout=None):
+        calls.append(conditional)
+        return FakeResponse(304) if conditional else FakeResponse(200, html)
+
+    agent.fetcher.fetch = fetch
+    return calls
+
+
+def test_rendered_pages_are_not_short_circuited_by_304(make_agent):
+    agent = make_agent("[prefilter]\nENABLED = false\n")
+    html = '<html><body>' + '<script>var x;</script>' * 12 + '<div id="app"></div></body></html>'
+    calls = fake_fetcher(agent, html)
+    renders = []
+    agent.capture_dom = lambda url, dom, conditional=True, timeout=None: (
+        renders.append(url) or ('text', f'渲染后的内容{len(renders)}'))
+    agent.analyze_text = lambda text, url=None, deadline=None: '页面正常'
+
+    for _ in range(3):
+        agent._check_website(URL)
+    # 外壳HTML没有变化，但每次都重新渲染
+    assert calls == [False, False, False]
+    assert len(renders) == 3
+
+
+def test_simple_pages_use_conditional_requests(make_agent):
+    agent = make_agent("[prefilter]\nENABLED = false\n")
+    calls = fake_fetcher(agent, '<html><body><p>一切正常</p></body></html>')
+    analyzed = []
+    agent.analyze_text = lambda text, url=None, deadline=None: analyzed.append(text) or '页面正常'
+
+    agent._check_website(URL)
+    assert agent._check_website(URL) == '页面正常'
+    assert calls == [False, True]
+    assert len(analyzed) == 1
@@ -0,0 +1,116 @@
+"""
+分片队列测试：一致性哈希、领取/完成、租约续期，重启的工作进程释放旧租约，以及队列只能在本机使用
+"""
+
+import time
+
+import pytest
+
+import cli
+from sharding import HashRing, QueueHostError, WorkQueue
+
+URLS = [f'http://site{i}.example.com/' for i in range(200)]
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # 首次检查不随机错开，写入后立即到期
+    monkeypatch.setattr('sharding.random.uniform', lambda a, b: 0)
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    yield queue
+    queue.close()
+
+
+def assign(queue, urls, workers):
+    queue.sync_targets({url: 60 for url in urls})
+    queue.assign_shards(HashRing(workers))
+
+
+def lease(queue, url):
+    return queue._read('SELECT lease_owner, lease_expires FROM targets WHERE url = ?', (url,))[0]
+
+
+def test_hash_ring_moves_only_removed_nodes_keys():
+    ring = HashRing(['w0', 'w1', 'w2', 'w3'])
+    before = {url: ring.get(url) for url in URLS}
+    assert set(before.values()) == {'w0', 'w1', 'w2', 'w3'}
+    ring.remove('w2')
+    after = {url: ring.get(url) for url in URLS}
+    moved = [url for url in URLS if before[url] != after[url]]
+    assert moved and all(before[url] == 'w2' for url in moved)
+    assert 'w2' not in after.values()
+    assert HashRing().get(URLS[0]) is None
+
+
+def test_claim_only_own_shard_and_unleased(queue):
+    assign(queue, URLS[:20], ['w0', 'w1'])
+    claimed = queue.claim('w0', 100, lease_ttl=60)
+    assert claimed and all(HashRing(['w0', 'w1']).get(url) == 'w0' for url in claimed)
+    # 已领取的目标有有效租约，不会被再次领取
+    assert queue.claim('w0', 100, lease_ttl=60) == []
+
+
+def test_complete_releases_lease_and_reschedules(queue):
+    assign(queue, URLS[:1], ['w0'])
+    url, = queue.claim('w0', 1, lease_ttl=60)
+    queue.complete('w0', url, 'ok', jitter=0)
+    owner, expires = lease(queue, url)
+    assert owner is None and expires is None
+    next_due, status = queue._read('SELECT next_due, last_status FROM targets WHERE url = ?', (url,))[0]
+    assert status == 'ok' and next_due > time.time() + 50
+
+
+def test_complete_by_other_worker_is_ignored(queue):
+    assign(queue, URLS[:1], ['w0'])
+    url, = queue.claim('w0', 1, lease_ttl=60)
+    queue.complete('w1', url, 'ok')
+    assert lease(queue, url)[0] == 'w0'
+
+
+def test_renew_extends_only_live_leases(queue):
+    assign(queue, URLS[:2], ['w0'])
+    first, second = queue.claim('w0', 2, lease_ttl=60)
+    # second的租约已经过期：可能已被其它工作进程接手，不能再续
+    queue._write(lambda db: db.execute('UPDATE targets SET lease_expires = ? WHERE url = ?',
+                                       (time.time() - 1, second)))
+    queue.renew_leases('w0', lease_ttl=300)
+    assert lease(queue, first)[1] > time.time() + 250
+    assert lease(queue, second)[1] < time.time()
+
+
+def test_register_releases_previous_incarnations_leases(queue):
+    assign(queue, URLS[:3], ['w0'])
+    queue.heartbeat('w0', node='host', pid=100)
+    claimed = queue.claim('w0', 3, lease_ttl=600)
+    # 进程崩溃后以同一ID重启
+    assert queue.register('w0', node='host', pid=200) == 3
+    assert sorted(queue.claim('w0', 3, lease_ttl=600)) == sorted(claimed)
+    assert queue._read('SELECT pid FROM workers WHERE worker_id = ?', ('w0',)) == [(200,)]
+
+
+def test_dead_workers_are_removed(queue):
+    queue.register('w0')
+    queue.register('w1')
+    queue._write(lambda db: db.execute('UPDATE workers SET heartbeat = ? WHERE worker_id = ?',
+                                       (time.time() - 100, 'w1')))
+    assert queue.remove_dead_workers(timeout=30) == ['w1']
+    assert queue.live_workers(timeout=30) == ['w0']
+
+
+def test_queue_refuses_other_hosts(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    WorkQueue(path, host='node1').close()
+    # 同一主机可以反复打开
+    queue = WorkQueue(path, host='node1')
+    assert queue.host == 'node1'
+    queue.close()
+    with pytest.raises(QueueHostError, match='node1'):
+        WorkQueue(path, host='node2')
+
+
+def test_cli_exits_on_foreign_queue(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    WorkQueue(path, host='another-host').close()
+    with pytest.raises(SystemExit) as info:
+        cli.main(['status', '--db', path])
+    assert 'another-host' in str(info.value.code)
@@ -0,0 +1,99 @@
+"""
+监控目标文件测试：校验、按URL的间隔，以及命令行把间隔和目标文件传给各种运行方式
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import cli
+from async_scheduler import AsyncMonitorScheduler
+from targets import TargetsError, load_targets, parse_targets, target_intervals
+
+
+def test_defaults_and_string_targets():
+    targets = parse_targets({
+        'defaults': {'interval': 60, 'mode': 'text', 'keywords': '离线'},
+        'targets': ['https://a.example.com/',
+                    {'url': 'https://b.example.com/', 'interval': 30, 'mode': 'dom', 'selectors': ['#list']}],
+    })
+    a, b = targets
+    assert (a.interval, a.mode, a.keywords) == (60.0, 'text', ['离线'])
+    assert (b.interval, b.mode, b.selectors) == (30.0, 'dom', ['#list'])
+
+
+def test_all_errors_are_reported_together():
+    with pytest.raises(TargetsError) as info:
+        parse_targets({'targets': [
+            {'url': 'ftp://a.example.com/', 'interval': 0},
+            {'url': 'https://b.example.com/', 'mode': 'video', 'roi': [0, 0, 0, 10], 'regexes': ['(']},
+            {'url': 'https://b.example.com/'},
+            {'url': 'https://c.example.com/', 'colour': 'red', 'capture': 'pdf',
+             'readiness': {'strategy': 'selector', 'timeout_ms': -1}},
+        ]})
+    errors = '\n'.join(info.value.errors)
+    for expected in ('targets[0].url', 'targets[0].interval', 'targets[1].mode', 'targets[1].roi',
+                     'targets[1].regexes', 'targets[2].url: 与 targets[1] 重复', 'targets[3].colour',
+                     'targets[3].capture', 'targets[3].readiness.timeout_ms'):
+        assert expected in errors
+
+
+def test_top_level_must_have_targets():
+    with pytest.raises(TargetsError):
+        parse_targets({'defaults': {'interval': 60}})
+    with pytest.raises(TargetsError):
+        parse_targets({'defaults': {'url': 'https://a.example.com/'}, 'targets': []})
+
+
+def test_target_intervals_fall_back_to_global_interval():
+    targets = parse_targets(['https://a.example.com/', {'url': 'https://b.example.com/', 'interval': 15}])
+    urls = ['https://a.example.com/', 'https://b.example.com/', 'https://c.example.com/']
+    assert target_intervals(targets, urls, 60) == {
+        'https://a.example.com/': 60, 'https://b.example.com/': 15.0, 'https://c.example.com/': 60,
+    }
+
+
+def test_async_scheduler_uses_per_url_intervals(monkeypatch):
+    # 首轮之后的第一次检查固定在一个完整间隔之后，慢的URL不会在测试时间内被随机提前
+    monkeypatch.setattr('async_scheduler.random.uniform', lambda a, b: b)
+    counts = {'fast': 0, 'slow': 0}
+
+    def check(url):
+        counts[url] += 1
+
+    scheduler = AsyncMonitorScheduler(check, interval=10, jitter=0, intervals={'fast': 0.05})
+    asyncio.run(scheduler.run(['fast', 'slow'], duration=0.6))
+    assert counts['slow'] == 1
+    assert counts['fast'] >= 5
+
+
+@pytest.fixture
+def targets_file(tmp_path):
+    path = tmp_path / 'targets.json'
+    path.write_text(json.dumps({'targets': [
+        {'url': 'https://a.example.com/', 'interval': 15, 'mode': 'text'},
+        'https://b.example.com/',
+    ]}), encoding='utf-8')
+    return str(path)
+
+
+def test_load_targets_from_file(targets_file):
+    assert [t.url for t in load_targets(targets_file)] == ['https://a.example.com/', 'https://b.example.com/']
+
+
+def test_local_passes_intervals_and_targets_file(targets_file, monkeypatch):
+    calls = {}
+    monkeypatch.setattr('sharding.run_local', lambda db_path, urls, **kwargs: calls.update(urls=urls, **kwargs))
+    cli.main(['local', '--targets', targets_file, '--interval', '90', '--workers', '2'])
+    assert calls['urls'] == {'https://a.example.com/': 15.0, 'https://b.example.com/': 90.0}
+    assert calls['targets_file'] == targets_file
+
+
+def test_coordinator_uses_target_intervals(targets_file, tmp_path, monkeypatch):
+    from sharding import Coordinator
+    synced = {}
+    monkeypatch.setattr(Coordinator, 'run', lambda self: synced.update(
+        self.queue._read('SELECT url, interval FROM targets')))
+    cli.main(['coordinator', '--db', str(tmp_path / 'queue.db'), '--targets', targets_file])
+    assert synced == {'https://a.example.com/': 15.0, 'https://b.example.com/': 60.0}
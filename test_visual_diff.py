@@ -0,0 +1,102 @@
+"""
+截图差异检测测试：小面积变化不被感知哈希缓存吞掉，ROI之外的变化被忽略
+"""
+
+import io
+
+import pytest
+
+pytest.importorskip('numpy')
+from PIL import Image, ImageDraw  # noqa: E402
+
+from image_pipeline import clip_boxes, decode_image, prepare_regions  # noqa: E402
+from result_cache import ResultCache, hamming_distance, perceptual_hash  # noqa: E402
+from visual_diff import VisualDiff  # noqa: E402
+
+URL = 'http://example.com/dashboard'
+
+
+def screenshot(lamp='green', clock='10:00'):
+    """320x240的白色页面：中间一个状态灯，右上角一块会变化的区域"""
+    image = Image.new('RGB', (320, 240), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((150, 110, 170, 130), fill=lamp)
+    draw.rectangle((280, 0, 319, 20), fill='black' if clock == '10:00' else 'gray')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_lamp_change_has_nearly_identical_phash():
+    distance = hamming_distance(perceptual_hash(screenshot('green')), perceptual_hash(screenshot('red')))
+    assert distance <= 4
+
+
+def test_lookup_image_without_reuse_never_hits():
+    cache = ResultCache()
+    key, _ = cache.lookup_image(URL, screenshot('green'))
+    cache.store(URL, key, '正常')
+    assert cache.lookup_image(URL, screenshot('red'))[1] == '正常'
+    same_key, cached = cache.lookup_image(URL, screenshot('red'), reuse=False)
+    assert cached is None and same_key == key
+
+
+def test_visual_diff_sees_the_lamp():
+    diff = VisualDiff()
+    _, candidate = diff.compare(URL, screenshot('green'))
+    diff.accept(URL, candidate)
+    result, _ = diff.compare(URL, screenshot('red'))
+    assert result.status == 'changed'
+    (x, y, w, h), = result.boxes
+    assert x <= 150 and y <= 110 and x + w >= 170 and y + h >= 130
+
+
+def test_changed_screenshot_is_analyzed_not_cache_hit(make_agent):
+    agent = make_agent()
+    pages = iter([screenshot('green'), screenshot('red')])
+    agent.get_webpage = lambda url, conditional=True, deadline=None: ('image', next(pages))
+    analyzed = []
+
+    def analyze_image(image_data, url=None, regions=None, deadline=None, dom_text=None):
+        analyzed.append(regions)
+        return '页面正常' if len(analyzed) == 1 else '告警级别：严重\n告警内容：状态灯变红'
+
+    agent.analyze_image = analyze_image
+    agent._check_website(URL)
+    assert '状态灯变红' in agent._check_website(URL)
+    assert len(analyzed) == 2 and analyzed[1]
+    assert agent.last_observation(URL).alert
+
+
+# 状态灯所在的区域，不包含右上角的时钟
+ROI = (100, 60, 120, 120)
+
+
+def test_changes_outside_roi_are_ignored():
+    diff = VisualDiff()
+    _, candidate = diff.compare(URL, screenshot(clock='10:00'), roi=ROI)
+    diff.accept(URL, candidate)
+    result, _ = diff.compare(URL, screenshot(clock='10:01'), roi=ROI)
+    assert result.status == 'unchanged'
+    assert diff.compare(URL, screenshot(clock='10:01'))[0].status == 'resized'
+
+
+def test_boxes_inside_roi_use_screenshot_coordinates():
+    diff = VisualDiff()
+    diff.set_masks(URL, [(0, 0, 110, 240)])
+    _, candidate = diff.compare(URL, screenshot('green'), roi=ROI)
+    diff.accept(URL, candidate)
+    result, _ = diff.compare(URL, screenshot('red'), roi=ROI)
+    assert result.status == 'changed'
+    (x, y, w, h), = result.boxes
+    assert x <= 150 and y <= 110 and x + w >= 170 and y + h >= 130
+    # 上下文不会超出ROI
+    assert x >= 100 and y >= 60 and x + w <= 220 and y + h <= 180
+
+
+def test_regions_are_clipped_to_roi():
+    assert clip_boxes([(90, 50, 40, 40), (280, 0, 40, 20)], ROI, 320, 240) == [(100, 60, 30, 30)]
+    assert clip_boxes([(280, 0, 40, 20)], None, 320, 240) == [(280, 0, 40, 20)]
+
+    encoded = prepare_regions(screenshot(), [(280, 0, 40, 20)], roi=ROI, format='PNG', max_bytes=0)
+    assert [decode_image(data).size for data, _ in encoded] == [(120, 120)]
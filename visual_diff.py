@@ -0,0 +1,183 @@
+"""
+截图差异检测
+============
+与每个URL上一次被分析过的截图做分块比较（NumPy向量化）：
+- 截图字节完全相同时直接跳过
+- 按块比较各颜色通道的均值和标准差，差异超过容差的块视为变化
+  （红绿状态灯这类颜色变化在灰度上几乎没有差别）
+- 时钟、滚动行情等区域可以配置为忽略区域；配置了ROI时只比较ROI内的部分
+- 相邻的变化块合并为矩形区域，加上少量上下文后只把这些区域交给视觉模型
+
+每个URL只保存分块特征（每块两个浮点数）而不是整张截图，内存占用很小。
+"""
+
+import hashlib
+import io
+import threading
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from image_pipeline import roi_box
+
+DiffResult = namedtuple('DiffResult', [
+    'status',           # 'first' 无基准 / 'identical' 完全相同 / 'unchanged' 无明显变化 / 'changed' / 'resized'
+    'boxes',            # 变化区域 [(x, y, w, h)]
+    'changed_ratio',    # 变化块占比
+    'size',             # 截图尺寸 (宽, 高)
+])
+
+
+class _Baseline:
+    def __init__(self, digest, size, means, stds):
+        self.digest = digest
+        self.size = size
+        self.means = means
+        self.stds = stds
+
+
+def block_signature(pixels, block_size):
+    """按块计算均值和标准差，边缘不足一块的部分用边缘像素填充
+
+    pixels 为 (高, 宽) 的灰度数组或 (高, 宽, 通道) 的彩色数组，彩色时每个通道分别计算。
+    """
+    height, width = pixels.shape[:2]
+    pad_h = (-height) % block_size
+    pad_w = (-width) % block_size
+    if pad_h or pad_w:
+        pixels = np.pad(pixels, ((0, pad_h), (0, pad_w)) + ((0, 0),) * (pixels.ndim - 2), mode='edge')
+    rows, cols = pixels.shape[0] // block_size, pixels.shape[1] // block_size
+    blocks = pixels.reshape((rows, block_size, cols, block_size) + pixels.shape[2:])
+    return blocks.mean(axis=(1, 3)), blocks.std(axis=(1, 3))
+
+
+def _components(mask):
+    """变化块的8连通分量，返回每个分量的块坐标范围 (row0, col0, row1, col1)"""
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    boxes = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        stack = [(r, c)]
+        seen[r, c] = True
+        r0, c0, r1, c1 = r, c, r, c
+        while stack:
+            y, x = stack.pop()
+            r0, c0, r1, c1 = min(r0, y), min(c0, x), max(r1, y), max(c1, x)
+            for ny in range(max(0, y - 1), min(rows, y + 2)):
+                for nx in range(max(0, x - 1), min(cols, x + 2)):
+                    if mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+        boxes.append((int(r0), int(c0), int(r1), int(c1)))
+    return boxes
+
+
+def _merge_boxes(boxes):
+    """合并相互重叠的矩形 (x0, y0, x1, y1)"""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while boxes:
+            x0, y0, x1, y1 = boxes.pop()
+            for i, (a0, b0, a1, b1) in enumerate(result):
+                if x0 <= a1 and a0 <= x1 and y0 <= b1 and b0 <= y1:
+                    result[i] = (min(x0, a0), min(y0, b0), max(x1, a1), max(y1, b1))
+                    merged = True
+                    break
+            else:
+                result.append((x0, y0, x1, y1))
+        boxes = result
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+class VisualDiff:
+    """按URL保存上一次被接受的截图特征，计算变化区域"""
+
+    def __init__(self, block_size=16, tolerance=2.0, padding=24):
+        self.block_size = block_size
+        self.tolerance = tolerance
+        self.padding = padding
+        self._baselines = {}
+        self._masks = {}
+        self._lock = threading.Lock()
+
+    def set_masks(self, url, masks):
+        """设置某个URL的忽略区域 [(x, y, w, h)]"""
+        self._masks[url] = list(masks)
+
+    def _mask_blocks(self, url, shape, origin=(0, 0)):
+        """忽略区域对应的块掩码（True表示忽略）；origin为比较区域左上角在整张截图中的坐标"""
+        ignore = np.zeros(shape, dtype=bool)
+        for x, y, w, h in self._masks.get(url, []):
+            x, y = x - origin[0], y - origin[1]
+            if x + w <= 0 or y + h <= 0:
+                continue
+            w, h = w + min(0, x), h + min(0, y)
+            x, y = max(0, x), max(0, y)
+            bs = self.block_size
+            ignore[max(0, y // bs):(y + h + bs - 1) // bs, max(0, x // bs):(x + w + bs - 1) // bs] = True
+        return ignore
+
+    def _signature(self, image_data, roi=None):
+        """ROI内的分块特征，返回 (尺寸, 均值, 标准差, ROI左上角在整张截图中的坐标)"""
+        with Image.open(io.BytesIO(image_data)) as image:
+            box = roi_box(roi, image.width, image.height)
+            if box is not None:
+                image = image.crop(box)
+            pixels = np.asarray(image.convert('RGB'), dtype=np.float32)
+        means, stds = block_signature(pixels, self.block_size)
+        origin = box[:2] if box is not None else (0, 0)
+        return (pixels.shape[1], pixels.shape[0]), means, stds, origin
+
+    def compare(self, url, image_data, roi=None):
+        """与上一次接受的截图比较，返回 (DiffResult, 新截图的特征)；特征在accept()时使用
+
+        roi 为 (x, y, w, h) 时只比较这部分，忽略区域和返回的变化区域仍使用整张截图的坐标。
+        """
+        digest = hashlib.sha1(image_data).digest()
+        with self._lock:
+            baseline = self._baselines.get(url)
+        if baseline is not None and baseline.digest == digest:
+            return DiffResult('identical', [], 0.0, baseline.size), None
+
+        size, means, stds, origin = self._signature(image_data, roi)
+        candidate = _Baseline(digest, size, means, stds)
+        if baseline is None:
+            return DiffResult('first', [], 1.0, size), candidate
+        if baseline.size != size:
+            return DiffResult('resized', [], 1.0, size), candidate
+
+        changed = ((np.abs(means - baseline.means) > self.tolerance)
+                   | (np.abs(stds - baseline.stds) > self.tolerance)).any(axis=2)
+        changed &= ~self._mask_blocks(url, changed.shape, origin)
+        ratio = float(changed.mean()) if changed.size else 0.0
+        if not changed.any():
+            return DiffResult('unchanged', [], 0.0, size), candidate
+
+        width, height = size
+        bs, pad = self.block_size, self.padding
+        pixel_boxes = [
+            (max(0, c0 * bs - pad), max(0, r0 * bs - pad),
+             min(width, (c1 + 1) * bs + pad), min(height, (r1 + 1) * bs + pad))
+            for r0, c0, r1, c1 in _components(changed)
+        ]
+        # 换算回整张截图的坐标，区域（含上下文）不会超出ROI
+        ox, oy = origin
+        boxes = [(x0 + ox, y0 + oy, x1 - x0, y1 - y0) for x0, y0, x1, y1 in _merge_boxes(pixel_boxes)]
+        return DiffResult('changed', boxes, ratio, size), candidate
+
+    def accept(self, url, candidate):
+        """把新截图设为该URL的比较基准（通常在分析成功之后）"""
+        if candidate is None:
+            return
+        with self._lock:
+            self._baselines[url] = candidate
+
+    def forget(self, url):
+        with self._lock:
+            self._baselines.pop(url, None)